@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import utils.map_all_includes as mai
+
+
+def generate_project(root: str, files_count: int, functions_per_file: int = 5) -> str:
+    """Generate a synthetic project: every header includes the previous one, every source file implements its header.
+
+    Args:
+        root (str): directory to generate the project in
+        files_count (int): number of .c files (and headers) to generate
+        functions_per_file (int, optional): number of functions declared in every header. Defaults to 5.
+
+    Returns:
+        str: the path of the generated main file
+    """
+
+    for i in range(files_count):
+        functions = [f"func_{i}_{j}" for j in range(functions_per_file)]
+        with open(os.path.join(root, f"file_{i}.h"), "w") as fd:
+            if i > 0:
+                fd.write(f"#include \"file_{i - 1}.h\"\n")
+            fd.writelines(f"int {function}(int x);\n" for function in functions)
+
+        with open(os.path.join(root, f"file_{i}.c"), "w") as fd:
+            fd.write(f"#include \"file_{i}.h\"\n")
+            for function in functions:
+                fd.write(f"int {function}(int x)\n{{\n    return x;\n}}\n")
+
+    main_path = os.path.join(root, "main.c")
+    with open(main_path, "w") as fd:
+        fd.write(f"#include \"file_{files_count - 1}.h\"\nint main()\n{{\n    return 0;\n}}\n")
+
+    return main_path
+
+
+def bench_graph_build(files_count: int) -> float:
+    """Time the construction of a ProjectGraph over a synthetic project.
+
+    Args:
+        files_count (int): number of .c files in the project
+
+    Returns:
+        float: build time in seconds
+    """
+
+    with tempfile.TemporaryDirectory() as root:
+        main_path = generate_project(root, files_count)
+        start = time.perf_counter()
+        mai.ProjectGraph(main_path, root)
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser('graph build benchmark')
+    argparser.add_argument('sizes', nargs='*', type=int, default=[25, 50, 100, 200, 400],
+                           help='number of files in every generated project')
+    args = argparser.parse_args()
+
+    print(f"{'files':>8} {'seconds':>10} {'ms/file':>10}")
+    for files_count in args.sizes:
+        seconds = bench_graph_build(files_count)
+        print(f"{files_count:>8} {seconds:>10.3f} {seconds * 1000 / files_count:>10.2f}")
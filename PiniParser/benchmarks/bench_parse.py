@@ -0,0 +1,87 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pycparser import c_ast, parse_file
+from pini_parser import PiniParser
+from scope_tree import DELIMITER
+from utils.flat_ast import FlatAst
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources", "main.c")
+
+
+def count_nodes(ast: c_ast.Node) -> int:
+    """Count the nodes of a syntax tree.
+
+    Args:
+        ast (c_ast.Node): the syntax tree
+
+    Returns:
+        int: number of nodes
+    """
+
+    count = 0
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(child for _, child in node.children())
+
+    return count
+
+
+def bench_parse(filename: str, repeat: int) -> float:
+    """Measure how many syntax tree nodes per second PiniParser.parse goes over.
+    Every function in the file is parsed once as the start function, with its parameters marked.
+
+    Args:
+        filename (str): the C file to parse (it must be parsable without cpp)
+        repeat (int): number of times to parse, the best time is used
+
+    Returns:
+        float: nodes per second
+    """
+
+    ast = parse_file(filename)
+    flat = FlatAst.lower(ast)
+    # if a name is defined more than once the first definition is kept, like the parser does
+    definitions = dict()
+    for ext in ast.ext:
+        if type(ext) is c_ast.FuncDef:
+            definitions.setdefault(ext.decl.name, ext)
+    nodes = sum(count_nodes(definition) for definition in definitions.values())
+    best = None
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for _ in range(repeat):
+            elapsed = 0
+            for function_name, definition in definitions.items():
+                seeds = {filename + DELIMITER + function_name + DELIMITER + str(param)
+                         for param in PiniParser.get_func_def_params(definition)}
+                parser = PiniParser(seeds, function_name, filename,
+                                    debug_file=os.path.join(log_dir, "functions_not_found.log"))
+                # the parser prints debug information, it is not part of the measurement
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    parser.parse(flat, "")
+                    elapsed += time.perf_counter() - start
+
+            best = elapsed if best is None else min(best, elapsed)
+
+    return nodes / best
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser('parse benchmark')
+    argparser.add_argument('filenames', nargs='*', default=[DEFAULT_FILE], help='C files to parse')
+    argparser.add_argument('--repeat', type=int, default=20, help='number of runs per file')
+    args = argparser.parse_args()
+
+    for filename in args.filenames:
+        print(f"{filename}: {bench_parse(filename, args.repeat):,.0f} nodes/s")
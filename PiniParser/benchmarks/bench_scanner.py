@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.source_scanner import scan_source
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ffmpeg-h264-dec", "ffmpeg-src")
+
+# inputs that make backtracking patterns blow up, by the number of repetitions
+SYNTHETIC_INPUTS: Dict[str, Callable[[int], str]] = {
+    "word run": lambda count: "a " * count + "\n",
+    "nested calls": lambda count: "x = f(" + "g(a), " * count + ");\n",
+    "table": lambda count: "static const uint8_t table[] = {\n" + "    0x12, 0x34, 0x56, 0x78,\n" * count + "};\n",
+    "open comment": lambda count: "/* (" * count + "\n",
+}
+
+
+def time_scan(data: str, repeat: int) -> float:
+    """Time the scan of a text, the best of a few runs.
+
+    Args:
+        data (str): the text to scan
+        repeat (int): number of runs
+
+    Returns:
+        float: seconds
+    """
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan_source(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def find_largest_files(root: str, count: int) -> List[str]:
+    """Find the largest .c and .h files under a directory.
+
+    Args:
+        root (str): the directory
+        count (int): number of files
+
+    Returns:
+        List[str]: the paths of the files, largest first
+    """
+
+    paths = [os.path.join(path, filename) for path, _, files in os.walk(root)
+             for filename in files if filename.endswith((".c", ".h"))]
+    return sorted(paths, key=os.path.getsize, reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser('source scanner benchmark')
+    argparser.add_argument('--root', default=DEFAULT_ROOT, help='directory to take the largest sources from')
+    argparser.add_argument('--files', type=int, default=10, help='number of files to scan')
+    argparser.add_argument('--repeat', type=int, default=3, help='runs per input, the best one is reported')
+    argparser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 100000],
+                           help='repetitions in every synthetic input')
+    args = argparser.parse_args()
+
+    worst = 0.0
+    print(f"{'file':<40} {'KB':>8} {'ms':>10} {'s/MB':>8}")
+    for path in find_largest_files(args.root, args.files):
+        with open(path, "rb") as fd:
+            data = fd.read().decode(errors="replace")
+        seconds = time_scan(data, args.repeat)
+        per_mb = seconds / (len(data) / 1e6)
+        worst = max(worst, per_mb)
+        print(f"{os.path.relpath(path, args.root):<40} {len(data) / 1024:>8.1f} {seconds * 1000:>10.2f} {per_mb:>8.3f}")
+
+    print()
+    print(f"{'input':<40} {'KB':>8} {'ms':>10} {'s/MB':>8}")
+    for name, generate in SYNTHETIC_INPUTS.items():
+        for size in args.sizes:
+            data = generate(size)
+            seconds = time_scan(data, args.repeat)
+            per_mb = seconds / (len(data) / 1e6)
+            worst = max(worst, per_mb)
+            print(f"{name + ' x' + str(size):<40} {len(data) / 1024:>8.1f} {seconds * 1000:>10.2f} {per_mb:>8.3f}")
+
+    print()
+    print(f"worst case: {worst:.3f} s/MB")
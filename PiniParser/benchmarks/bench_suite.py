@@ -0,0 +1,208 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import utils.map_all_includes as mai
+from pini_parser import PiniParser, make_ast_cache
+
+PINI_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_OUTPUT = os.path.join(PINI_ROOT, "output", "bench_results.json")
+
+# the graded inputs, smallest first: name -> start file (its directory is the project root, as in mark_project)
+INPUTS = {
+    "c_files": os.path.join(PINI_ROOT, "tests", "c_files", "Test_if_1.c"),
+    "parser.c": os.path.join(PINI_ROOT, "resources", "parser.c"),
+    "include_tests": os.path.join(PINI_ROOT, "tests", "include_tests", "main.c"),
+    "ffmpeg-h264-dec": os.path.join(PINI_ROOT, "..", "ffmpeg-h264-dec", "main.c"),
+}
+
+PHASES = ("graph", "strip", "parse", "taint")
+
+# differences smaller than these are noise, whatever the threshold
+MIN_SECONDS_DELTA = 0.01
+MIN_RSS_DELTA_KB = 1024
+
+
+def get_peak_rss() -> int:
+    """Get the peak resident set size of this process so far, in KB."""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_phase(results: Dict[str, dict], phase: str, function: Callable[[], Tuple[int, dict]]):
+    """Run and measure a phase. A phase that fails is recorded with its error and the next phases go on without it.
+
+    Args:
+        results (Dict[str, dict]): the results of the input, the phase is added to it
+        phase (str): the name of the phase
+        function (Callable[[], Tuple[int, dict]]): runs the phase, returns the number of syntax tree nodes it went over and extra counters
+    """
+
+    start = time.perf_counter()
+    try:
+        # the parser prints debug information, it is not part of the measurement
+        with contextlib.redirect_stdout(io.StringIO()):
+            nodes, counters = function()
+    except Exception as e:
+        results[phase] = {"error": f"{type(e).__name__}: {e}"[:300]}
+        return
+
+    seconds = time.perf_counter() - start
+    results[phase] = {"seconds": seconds, "peak_rss_kb": get_peak_rss(), "nodes": nodes,
+                      "nodes_per_second": nodes / seconds if nodes and seconds else None, **counters}
+
+
+def bench_input(start_file: str, use_cpp: bool = False, fake_libc_dir: str = None) -> Dict[str, dict]:
+    """Run the phases of mark_project on an input (this runs in a process of its own, so the peak RSS is of this input only).
+    The peak RSS of a phase is the peak of the process until the end of the phase.
+
+    Args:
+        start_file (str): the start file of the project
+        use_cpp (bool, optional): parse the files with cpp (the parse phase includes preprocessing). Defaults to False.
+        fake_libc_dir (str, optional): headers to use for cpp instead of the system headers. Defaults to None.
+
+    Returns:
+        Dict[str, dict]: the results of every phase
+    """
+
+    start_file = os.path.abspath(start_file)
+    project_root = os.path.dirname(start_file)
+    results = dict()
+    state = dict()
+    cache = make_ast_cache(project_root, use_cpp=use_cpp, fake_libc_dir=fake_libc_dir)
+
+    def build_graph():
+        state["graph"] = mai.ProjectGraph(start_file, project_root)
+        return 0, {"files": len(state["graph"].file_records), "edges": state["graph"].g.number_of_edges()}
+
+    def strip_includes():
+        stripped = 0
+        for path, _, files in os.walk(project_root):
+            for filename in files:
+                if filename.endswith((".c", ".h")):
+                    with open(os.path.join(path, filename), "rb") as fd:
+                        stripped += len(mai.ProjectGraph.remove_static_includes(fd.read().decode(errors="replace")))
+        return 0, {"bytes": stripped}
+
+    def parse_files():
+        cache.clear()
+        c_files = [os.path.join(path, filename) for path, _, files in os.walk(project_root)
+                   for filename in files if filename.endswith(".c")]
+        nodes, failed = 0, 0
+        # the files are parsed and lowered, like mark_project does when it links them
+        for filename in c_files:
+            try:
+                nodes += len(cache.lower_file(filename))
+            except Exception:
+                failed += 1
+        return nodes, {"files": len(c_files), "failed": failed}
+
+    def propagate():
+        if "graph" not in state:
+            raise Exception("the include graph was not built")
+
+        # the lowered trees are taken from the cache filled by the parse phase
+        flat = cache.lower_file(start_file)
+        with tempfile.TemporaryDirectory() as log_dir:
+            parser = PiniParser({start_file + "@main@x"}, filename=start_file, graph_manager=state["graph"],
+                                debug_file=os.path.join(log_dir, "functions_not_found.log"), cache=cache)
+            parser.parse(flat, "")
+        return len(flat), {"marked": len(parser.get_marked())}
+
+    for phase, function in zip(PHASES, [build_graph, strip_includes, parse_files, propagate]):
+        run_phase(results, phase, function)
+
+    return results
+
+
+def find_regressions(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Compare results to a baseline.
+
+    Args:
+        results (Dict[str, dict]): the results, by input and phase
+        baseline (Dict[str, dict]): the baseline, by input and phase
+        threshold (float): the relative slowdown (or growth of the peak RSS) that is a regression, for example 0.2 for 20%
+
+    Returns:
+        List[str]: a description of every regression
+    """
+
+    regressions = []
+    for name, phases in results.items():
+        for phase, result in phases.items():
+            expected = baseline.get(name, dict()).get(phase)
+            if expected is None:
+                continue
+
+            if "error" in result and "error" not in expected:
+                regressions.append(f"{name}/{phase}: fails now ({result['error']})")
+                continue
+
+            for metric, min_delta in (("seconds", MIN_SECONDS_DELTA), ("peak_rss_kb", MIN_RSS_DELTA_KB)):
+                if metric not in result or metric not in expected:
+                    continue
+
+                if result[metric] > expected[metric] * (1 + threshold) and result[metric] - expected[metric] > min_delta:
+                    regressions.append(f"{name}/{phase}: {metric} {expected[metric]:.3f} -> {result[metric]:.3f}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser('benchmark suite')
+    argparser.add_argument('inputs', nargs='*', default=list(INPUTS), help=f'inputs to run ({", ".join(INPUTS)})')
+    argparser.add_argument('--output', default=DEFAULT_OUTPUT, help='write the results to this json file')
+    argparser.add_argument('--baseline', default=None,
+                           help='compare the results to this json file and exit with 1 on a regression. No baseline is kept in the repository, '
+                                'timings depend on the machine: save one with --save-baseline before a change, compare after it')
+    argparser.add_argument('--save-baseline', action='store_true', help='save the results as the baseline (needs --baseline)')
+    argparser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown that is a regression')
+    argparser.add_argument('--cpp', dest='use_cpp', action='store_true', help='parse the files with cpp')
+    argparser.add_argument('--fake-libc', dest='fake_libc_dir', default=None,
+                           help='use the headers in this directory for cpp instead of the system headers')
+    args = argparser.parse_args()
+    if args.save_baseline and args.baseline is None:
+        argparser.error("--save-baseline needs --baseline")
+    if args.baseline is not None and not args.save_baseline and not os.path.exists(args.baseline):
+        argparser.error(f"baseline {args.baseline} not found, save it with --save-baseline first")
+
+    results = dict()
+    for name in args.inputs:
+        # every input runs in a fresh process, so it starts from an empty cache and its own peak RSS
+        with ProcessPoolExecutor(1) as executor:
+            results[name] = executor.submit(bench_input, INPUTS[name], args.use_cpp, args.fake_libc_dir).result()
+
+    print(f"{'input':<18} {'phase':<7} {'seconds':>9} {'peak MB':>9} {'nodes/s':>12}")
+    for name, phases in results.items():
+        for phase, result in phases.items():
+            if "error" in result:
+                print(f"{name:<18} {phase:<7} {'error: ' + result['error'][:60]}")
+                continue
+
+            nodes_per_second = f"{result['nodes_per_second']:,.0f}" if result["nodes_per_second"] else "-"
+            print(f"{name:<18} {phase:<7} {result['seconds']:>9.3f} {result['peak_rss_kb'] / 1024:>9.1f} {nodes_per_second:>12}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as fd:
+        json.dump(results, fd, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fd:
+            json.dump(results, fd, indent=4)
+    elif args.baseline is not None:
+        with open(args.baseline, "r") as fd:
+            regressions = find_regressions(results, json.load(fd), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
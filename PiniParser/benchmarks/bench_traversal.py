@@ -0,0 +1,70 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pycparser import c_parser
+from bench_parse import count_nodes
+from pini_parser import PiniParser
+
+# synthetic functions nested by the number of levels, x is the marked variable
+SYNTHETIC_INPUTS: Dict[str, Callable[[int], str]] = {
+    "else if chain": lambda depth: "int main() {\n    int x;\n    int y;\n    if (x == 0) { y = x; }\n"
+                                   + "".join(f"    else if (x == {i}) {{ y = x + {i}; }}\n" for i in range(1, depth))
+                                   + "    return y;\n}\n",
+    "nested expression": lambda depth: "int main() {\n    int x;\n    int y = " + "(x + " * depth + "1" + ")" * depth + ";\n    return y;\n}\n",
+    "nested blocks": lambda depth: "int main() {\n    int x;\n    int y;\n" + "{" * depth + "y = x;" + "}" * depth + "\n    return y;\n}\n",
+    "flat statements": lambda depth: "int main() {\n    int x;\n" + "".join(f"    int y{i} = x + {i};\n" for i in range(depth))
+                                     + "    return x;\n}\n",
+}
+
+
+def bench_traversal(source: str, repeat: int) -> float:
+    """Measure how many syntax tree nodes per second PiniParser.parse goes over in a synthetic function.
+
+    Args:
+        source (str): the C source, main is parsed with x marked
+        repeat (int): number of runs, the best one is used
+
+    Returns:
+        float: nodes per second
+    """
+
+    ast = c_parser.CParser().parse(source, "bench.c")
+    nodes = count_nodes(ast)
+    best = None
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for _ in range(repeat):
+            parser = PiniParser({"bench.c@main@x"}, filename="bench.c",
+                                debug_file=os.path.join(log_dir, "functions_not_found.log"))
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                parser.parse(ast, "")
+                elapsed = time.perf_counter() - start
+
+            best = elapsed if best is None else min(best, elapsed)
+
+    return nodes / best
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser('traversal benchmark')
+    argparser.add_argument('depths', nargs='*', type=int, default=[100, 1000, 10000], help='nesting depths to run')
+    argparser.add_argument('--repeat', type=int, default=5, help='number of runs per input')
+    args = argparser.parse_args()
+
+    print(f"{'input':<30} {'nodes/s':>12}")
+    for name, generate in SYNTHETIC_INPUTS.items():
+        for depth in args.depths:
+            try:
+                result = f"{bench_traversal(generate(depth), args.repeat):>12,.0f}"
+            except RecursionError:
+                result = f"{'RecursionError':>12}"
+            print(f"{name + ' x' + str(depth):<30} {result}")
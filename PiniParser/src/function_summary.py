@@ -0,0 +1,272 @@
+from typing import FrozenSet, Set, Tuple
+
+from scope_tree import Scope, ScopedNames
+
+
+class FunctionSummary():
+    """What analysing a called function found: which of its parameters are marked and whether it returns a marked value.
+
+    The summary depends on the marks of a few units (the function itself, the globals it sees and the functions it called),
+    it can be applied to another call instead of analysing the function again as long as none of them got new marks.
+    A partial summary used the result of a recursive call that was cut short: it depends on the function that was cut too,
+    and it is what analysing the function finds only while that function is still being analysed
+    (and none of the functions the summary analysed is, their calls would be cut short too).
+    """
+
+    __slots__ = ("marked_params", "returns_pini", "dependencies", "version", "inputs", "added", "cut", "calls")
+
+    def __init__(self, marked_params: FrozenSet[int], returns_pini: bool, dependencies: Set[Scope], version: int):
+        self.marked_params = marked_params
+        self.returns_pini = returns_pini
+        self.dependencies = dependencies
+        self.version = version
+        # only kept when tracking inputs: the marks and declarations the analysis started from, and the ones it added
+        self.inputs = None
+        self.added = None
+        # the functions (definition scopes) whose recursive calls were cut short, empty if the summary is complete
+        self.cut = frozenset()
+        # the functions analysed to make the summary
+        self.calls = frozenset()
+
+    def is_valid(self, marked: ScopedNames) -> bool:
+        """Checks whether the summary is still what analysing the function would find.
+
+        Args:
+            marked (ScopedNames): the marked variables
+
+        Returns:
+            bool: True if none of the units the summary depends on got new marks, False otherwise
+        """
+
+        return marked.get_version(self.dependencies) == self.version
+
+
+class FunctionSummaries():
+    """Summaries of the functions analysed so far, by (definition scope, positions of the marked parameters).
+
+    While a function is analysed the summaries also collect the units it depends on:
+    analysing (or applying the summary of) a called function adds the dependencies of the callee to the caller.
+
+    When track_inputs is set, summaries also keep what the analysis started from and what it added,
+    so they can be applied in a later run on new marks (see start_run). A function can be analysed a few times
+    with the same key (until it adds no marks), all these summaries are kept and applied in the same order.
+    Partial summaries are applied only while the functions they were cut against are being analysed.
+    """
+
+    def __init__(self, track_inputs: bool = False):
+        self.summaries = dict()
+        self.previous = dict()
+        self.active = []
+        self.track_inputs = track_inputs
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(def_context: Scope, def_params: list, marked: ScopedNames) -> Tuple[Scope, FrozenSet[int]]:
+        """Get the key of a function summary.
+
+        Args:
+            def_context (Scope): the scope of the function definition
+            def_params (list): the names of the parameters of the function
+            marked (ScopedNames): the marked variables
+
+        Returns:
+            Tuple[Scope, FrozenSet[int]]: (definition scope, positions of the marked parameters)
+        """
+
+        return def_context, frozenset(index for index, param in enumerate(def_params)
+                                      if marked.has_name(def_context, param))
+
+    def find(self, key: Tuple[Scope, FrozenSet[int]], marked: ScopedNames, decl_history: ScopedNames) -> FunctionSummary:
+        """Find a summary that can be applied.
+
+        Args:
+            key (Tuple[Scope, FrozenSet[int]]): the key of the summary
+            marked (ScopedNames): the marked variables
+            decl_history (ScopedNames): the declared variables
+
+        Returns:
+            FunctionSummary: the summary if found and still valid, None otherwise
+        """
+
+        summary = self.summaries.get(key)
+        if summary is None or not summary.is_valid(marked) or not self.has_same_cuts(summary):
+            summary = self.apply_previous(key, marked, decl_history)
+
+        if summary is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.add_dependencies(summary.dependencies)
+        if self.active:
+            self.active[-1][4].update(summary.cut)
+            self.active[-1][5].update(summary.calls)
+        return summary
+
+    def has_same_cuts(self, summary: FunctionSummary) -> bool:
+        """Checks whether analysing the function now would cut short the same recursive calls the summary's analysis did.
+
+        Args:
+            summary (FunctionSummary): the summary
+
+        Returns:
+            bool: True if all the functions the summary was cut against are being analysed, and none of the ones it analysed
+        """
+
+        if not self.active:
+            return not summary.cut
+        active = {active[0] for active in self.active}
+        return summary.cut <= active and active.isdisjoint(summary.calls)
+
+    def apply_previous(self, key: Tuple[Scope, FrozenSet[int]], marked: ScopedNames, decl_history: ScopedNames) -> FunctionSummary:
+        """Apply the summary an earlier analysis made (in this run or a previous one), if the analysis would start from the same marks and declarations.
+
+        Args:
+            key (Tuple[Scope, FrozenSet[int]]): the key of the summary
+            marked (ScopedNames): the marked variables
+            decl_history (ScopedNames): the declared variables
+
+        Returns:
+            FunctionSummary: the summary applied, None if there is none or it can't be applied
+        """
+
+        # analysing the function now would cut short the calls to the functions being analysed
+        active_units = {active[0].unit for active in self.active}
+        for summary in self.previous.get(key, ()):
+            marked_inputs, decl_inputs = summary.inputs
+            if marked.get_unit_symbols(summary.dependencies) == marked_inputs and \
+                    decl_history.get_unit_symbols(summary.dependencies) == decl_inputs and \
+                    active_units.isdisjoint(summary.dependencies):
+                break
+        else:
+            return None
+
+        # like a summary made now, it is valid only if applying it added no marks
+        summary.version = marked.get_version(summary.dependencies)
+        added_marks, added_decls = summary.added
+        for symbol in added_marks:
+            marked.add_symbol(symbol)
+        for symbol in added_decls:
+            decl_history.add_symbol(symbol)
+
+        self.summaries[key] = summary
+        return summary
+
+    def start_run(self, changed_files: Set[str]):
+        """Start a new run of the analysis (on new marks). Summaries of this run and of the runs before it can be applied in the new run,
+        except the ones that depend on a function or globals of a changed file.
+
+        Args:
+            changed_files (Set[str]): the files changed since this run
+        """
+
+        previous = dict()
+        for key, summaries in self.previous.items():
+            kept = [summary for summary in summaries
+                    if not any(unit.depth > 0 and FunctionSummaries.get_unit_file(unit) in changed_files
+                               for unit in summary.dependencies)]
+            if kept:
+                previous[key] = kept
+
+        self.previous = previous
+        self.summaries = dict()
+        self.active = []
+
+    def get_files(self) -> Set[str]:
+        """Get the files of all the functions summarised (the files the analysis went through)."""
+
+        return {FunctionSummaries.get_unit_file(unit) for summary in self.summaries.values()
+                for unit in summary.dependencies if unit.depth > 0}
+
+    @staticmethod
+    def get_unit_file(unit: Scope) -> str:
+        """Get the file of a unit (a file or a function scope)."""
+
+        return unit.label if unit.depth == 1 else unit.parent.label
+
+    def is_active(self, def_context: Scope) -> bool:
+        """Checks whether a function is being analysed (it was called again, recursively)."""
+
+        return any(active[0] is def_context for active in self.active)
+
+    def begin(self, def_context: Scope, marked: ScopedNames, decl_history: ScopedNames):
+        """Start analysing a function.
+
+        Args:
+            def_context (Scope): the scope of the function definition
+            marked (ScopedNames): the marked variables
+            decl_history (ScopedNames): the declared variables
+        """
+
+        # the function depends on itself and on the globals it sees
+        dependencies = set()
+        scope = def_context
+        while scope is not None:
+            dependencies.add(scope.unit)
+            scope = scope.parent
+
+        self.active.append([def_context, dependencies, len(marked.journal), len(decl_history.journal), set(), {def_context}])
+
+    def recursive_call(self, key: Tuple[Scope, FrozenSet[int]]) -> FunctionSummary:
+        """Get the summary of a recursive call to a function being analysed, the marks it would add are found by the analysis already running.
+        The analysis that made the call (and the ones enclosing it) end with a partial summary, cut against the called function.
+
+        Args:
+            key (Tuple[Scope, FrozenSet[int]]): the key of the summary
+
+        Returns:
+            FunctionSummary: an empty summary
+        """
+
+        # the caller depends on what the running analysis of the called function depends on
+        dependencies = set(next(active[1] for active in self.active if active[0] is key[0]))
+        self.add_dependencies(dependencies)
+        self.active[-1][4].add(key[0])
+        return FunctionSummary(key[1], False, dependencies, 0)
+
+    def end(self, key: Tuple[Scope, FrozenSet[int]], marked_params: FrozenSet[int], returns_pini: bool,
+            marked: ScopedNames, decl_history: ScopedNames) -> FunctionSummary:
+        """Finish analysing the function that was analysed last and save its summary.
+
+        Args:
+            key (Tuple[Scope, FrozenSet[int]]): the key the function was analysed with
+            marked_params (FrozenSet[int]): positions of the parameters marked after the analysis
+            returns_pini (bool): whether the function returns a marked value
+            marked (ScopedNames): the marked variables
+            decl_history (ScopedNames): the declared variables
+
+        Returns:
+            FunctionSummary: the summary
+        """
+
+        def_context, dependencies, marked_start, decl_start, cut, calls = self.active.pop()
+        added_marks = marked.journal[marked_start:]
+        # the version the units had when the analysis started: if the analysis added marks it may not have seen
+        # all of them (a mark found late in the function is only used by the next pass), so the next call analyses again
+        symbols = marked.table.symbols
+        version = marked.get_version(dependencies) - sum(1 for symbol in added_marks if symbols[symbol][0].unit in dependencies)
+        summary = FunctionSummary(marked_params, returns_pini, dependencies, version)
+        # a recursive call to a function that is no longer analysed was cut short inside the summary's analysis,
+        # analysing it again cuts it the same way
+        summary.cut = frozenset(function for function in cut if self.is_active(function))
+        summary.calls = frozenset(calls)
+        if self.active:
+            # the function that called this one used the (partial) result
+            self.active[-1][4].update(summary.cut)
+            self.active[-1][5].update(calls)
+        if self.track_inputs and not summary.cut:
+            added_decls = decl_history.journal[decl_start:]
+            summary.added = (added_marks, added_decls)
+            summary.inputs = (marked.get_unit_symbols(dependencies) - set(added_marks),
+                              decl_history.get_unit_symbols(dependencies) - set(added_decls))
+            self.previous.setdefault(key, []).append(summary)
+
+        self.summaries[key] = summary
+        self.add_dependencies(dependencies)
+        return summary
+
+    def add_dependencies(self, dependencies: Set[Scope]):
+        # only the innermost function is updated, the ones enclosing it get its dependencies when it ends
+        if self.active:
+            self.active[-1][1].update(dependencies)
@@ -1,28 +1,58 @@
 import argparse
-import copy
+import contextlib
+import json
 import sys
-from typing import Dict, List, Set, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heapify, heappop, heappush
+from typing import Callable, Dict, List, Set, Tuple, Union
 import os
-from pycparser import c_ast, c_parser, parse_file
+from pycparser import c_ast
 import utils.map_all_includes as mai
-from scope_record import ScopeRecord, ScopesList
+from utils.ast_cache import AstCache, ast_cache
+import utils.flat_ast as flat_ast
+from utils.flat_ast import KIND_OF, KINDS, NO_NODE, SLOT_NAMES, FlatAst
+from utils.preprocessor import Preprocessor
+from utils.stats import collect, stats
+from scope_record import ScopesList
+from scope_tree import DELIMITER, Scope, ScopedNames
+from function_summary import FunctionSummaries, FunctionSummary
 from log import Log
 
 
 sys.path.insert(1, 'C:\\Users\\User\\Documents\\Code\\PiniParser\\pycparser')
 DEBUG_FILE = "output/functions_not_found.log"
-DELIMITER = "@"
+
+# the node kinds the passes look at (see flat_ast.KINDS)
+ARRAY_REF = KIND_OF[c_ast.ArrayRef]
+BINARY_OP = KIND_OF[c_ast.BinaryOp]
+DECL = KIND_OF[c_ast.Decl]
+FILE_AST = KIND_OF[c_ast.FileAST]
+FUNC_CALL = KIND_OF[c_ast.FuncCall]
+ID = KIND_OF[c_ast.ID]
+RETURN = KIND_OF[c_ast.Return]
+STRUCT_REF = KIND_OF[c_ast.StructRef]
 
 
 class PiniParser():
-    def __init__(self, marked: Set[str], start_func: str = "main", filename: str = "", graph_manager=None, debug_file=DEBUG_FILE):
-        self.marked = marked
+    def __init__(self, marked: Set[str], start_func: str = "main", filename: str = "", graph_manager=None, debug_file=DEBUG_FILE, decl_history: ScopedNames = None, summaries: FunctionSummaries = None,
+                 cache: AstCache = None):
+        # linked parsers share the marked variables, declarations (and so the scope tree), function summaries and AST cache of the parser that linked them
+        self.marked = marked if type(marked) is ScopedNames else ScopedNames(names=marked)
+        self.decl_history = ScopedNames(self.marked.root) if decl_history is None else decl_history
+        self.summaries = FunctionSummaries() if summaries is None else summaries
+        self.cache = ast_cache if cache is None else cache
+        self.root_scope = self.marked.root
         self.start_func = start_func
+        # function name to its definition, as (the lowered tree, the FuncDef node)
         self.functions = dict()
         self.filename = filename
         self.linked_functions = dict()
         self.graph_manager = graph_manager
         self.logger = Log(debug_file)
+        # the lowered tree being parsed, and the subtrees handlers asked to descend into while parse is running (see descend)
+        self.flat = None
+        self.pending = None
 
     def get_marked(self):
         """Returns all marked variables"""
@@ -32,558 +62,692 @@ class PiniParser():
         """Returns a set of all functions found"""
         return self.functions.keys()
 
-    def parse(self, ast: c_ast.Node, context: str, scopes: ScopesList = ScopesList(), decl_history: Set[str] = set()) -> List[str]:
-        children = ast.children()
+    def get_scope(self, context: str) -> Scope:
+        """Get the scope of a context string (for example "file.c@main@if[1]@", the root scope is "").
+
+        Args:
+            context (str): the context string
+
+        Returns:
+            Scope: the scope
+        """
+
+        return self.root_scope.descend(context.split(DELIMITER)[:-1])
 
+    def parse(self, ast: Union[c_ast.Node, FlatAst], context: Scope, scopes: ScopesList = ScopesList()) -> List[str]:
         """ Parses a given syntax tree and marks all pini-variables.
         The marked variables will be appended into self.marked with their full path.
+        A c_ast tree is lowered first (see FlatAst), the passes run over the lowered tree.
 
         :type self: PiniParser
         :param self: The object of the class
 
-        :type ast: c_ast.Node 
-        :param ast: the syntax tree given for parsing
+        :type ast: Union[c_ast.Node, FlatAst]
+        :param ast: the syntax tree given for parsing (its root is parsed, for a FlatAst node 0)
 
-        :type context: string
-        :param context: the current context of the parsing (scopes)
+        :type context: Scope
+        :param context: the current context of the parsing (scopes), a context string is also accepted
 
         :type scopes: ScopesList
         :param scopes: a list of counter for [if/for/while/else] so we could know which scope are we in.
 
         :rtype: bool
         """
-        if len(children) == 0:
-            return True
-
-        for name, child in children:
-            if type(child) is c_ast.Typedef:
-                continue
-
-            elif type(child) is c_ast.Decl:
-                self.handle_decl(child, context, decl_history)
-
-            elif type(child) is c_ast.FuncDef:
-                if child.decl.name == self.start_func:
-                    self.parse(child, PiniParser.contextify(PiniParser.contextify_list(
-                        [self.filename, self.start_func]), context), copy.deepcopy(scopes))
-                else:
-                    self.functions[child.decl.name] = child
-
-            elif type(child) is c_ast.Compound:
-                new_scopes = copy.deepcopy(scopes)
-                new_context = context
-
-                if name == "iftrue":
-                    new_scopes["if"].append(1)
-                    new_context = context + f"if[{str(scopes['if'])}]@"
-
-                elif name == "iffalse":
-                    new_scopes["else"].append(1)
-                    new_context = context + f"else[{str(scopes['else'])}]@"
-
-                self.parse(child, new_context, new_scopes)
-
-                if name == "iffalse" or name == "iftrue":
-                    scopes["if"] += 1
-
-            elif type(child) is c_ast.FuncCall:
-                self.parse_called_function(child, context, dict)
-
-            elif type(child) is c_ast.Assignment:
-                self.handle_decl(child, context, decl_history)
-
-            elif type(child) is c_ast.If:
-                self.handle_if(child, context, scopes, decl_history)
-                scopes["if"] += 1
-
-            elif type(child) is c_ast.BinaryOp:
-                self.handle_binary_op(child, context, decl_history)
-
-            elif type(child) is c_ast.For:
-                print(scopes["for"])
-                self.handle_loop(child, context,  copy.deepcopy(
-                    scopes), "for", decl_history)
-                scopes["for"] += 1
-
-            elif type(child) is c_ast.While:
-                print(scopes["while"])
-                self.handle_loop(
-                    child, context,  copy.deepcopy(scopes), "while", decl_history)
-                scopes["while"] += 1
-
-            elif type(child) is c_ast.DoWhile:
-                print(scopes["dowhile"])
-                self.handle_loop(
-                    child, context,  copy.deepcopy(scopes), "dowhile", decl_history)
-                scopes["dowhile"] += 1
-
-            elif type(child) is c_ast.DeclList:
-                self.parse(child, context, copy.deepcopy(scopes), decl_history)
-
-            elif type(child) is c_ast.Switch:
-                self.parse(child, context, copy.deepcopy(scopes), decl_history)
+        flat = ast if type(ast) is FlatAst else flat_ast.lower(ast)
+        return self.parse_flat(flat, 0, context, scopes)
 
-            elif type(child) is c_ast.Case:
-                self.parse(child, context, copy.deepcopy(scopes), decl_history)
+    def parse_flat(self, flat: FlatAst, index: int, context: Scope, scopes: ScopesList = ScopesList()) -> bool:
+        """Parse a node of a lowered syntax tree and mark all pini-variables (see parse).
+        Every child is handled by the handler registered for its node type (see register_handler), node types with no handler are skipped.
+        The tree is walked with an explicit stack, so nested scopes and else-if chains don't grow the Python stack (see descend).
 
-            # @===================@
-            # |   CONTINUE ZONE   |
-            # @===================@
-
-            elif type(child) is c_ast.UnaryOp:
-                continue
-
-            elif type(child) is c_ast.Break:
-                continue
-
-            elif type(child) is c_ast.Constant:
-                continue
-
-            elif type(child) is c_ast.Continue:
-                continue
+        Args:
+            flat (FlatAst): the lowered syntax tree
+            index (int): the node to parse the children of
+            context (Scope): the current context (scopes) of the parsing, a context string is also accepted
+            scopes (ScopesList, optional): the scope counters to start with. Defaults to ScopesList().
 
-            elif type(child) is c_ast.FuncDecl:
-                continue
+        Returns:
+            bool: True
+        """
 
-            # this may cause problems, check if needed
-            elif type(child) is c_ast.Goto:
-                continue
+        if type(context) is str:
+            context = self.get_scope(context)
 
-            elif type(child) is c_ast.EmptyStatement:
-                continue
+        first_child = flat.first_child[index]
+        if first_child == NO_NODE:
+            return True
 
-            # I have no idea what a type decl is
-            elif type(child) is c_ast.TypeDecl:
-                print("Type declare found wtf is that?")
-                continue
+        if flat.kinds[index] == FILE_AST:
+            self.register_functions(flat)
+
+        # a frame is [the next child, context, scopes], the scopes are replaced by what the handler of every child returns
+        stack = [[first_child, context, scopes]]
+        outer_flat, outer_pending = self.flat, self.pending
+        self.flat = flat
+        self.pending = pending = []
+        kind_handlers = self.kind_handlers
+        kinds, next_sibling, slots = flat.kinds, flat.next_sibling, flat.slots
+        try:
+            while stack:
+                frame = stack[-1]
+                child, context, scopes = frame
+                while child != NO_NODE:
+                    handler = kind_handlers[kinds[child]]
+                    if handler is None:
+                        child = next_sibling[child]
+                        continue
+
+                    scopes = handler(self, SLOT_NAMES[slots[child]], child, context, scopes)
+                    child = next_sibling[child]
+                    if pending:
+                        # the subtrees are parsed before the next child, in the order they were asked for
+                        frame[0] = child
+                        frame[2] = scopes
+                        for sub_index, sub_context, sub_scopes in reversed(pending):
+                            if kinds[sub_index] == FILE_AST:
+                                self.register_functions(flat)
+                            stack.append([flat.first_child[sub_index], sub_context, sub_scopes])
+                        pending.clear()
+                        break
+                else:
+                    stack.pop()
+        finally:
+            self.flat, self.pending = outer_flat, outer_pending
 
-            elif type(child) is c_ast.Label:
-                continue
+        return True
 
-            elif type(child) is c_ast.Cast:
-                continue
+    def register_functions(self, flat: FlatAst):
+        """Register the functions of a translation unit, so functions defined anywhere in it can be called, not only the ones defined above.
 
-            elif type(child) is c_ast.Struct:
-                continue
+        Args:
+            flat (FlatAst): the lowered syntax tree of the translation unit
+        """
 
-            elif type(child) is c_ast.TernaryOp:
-                continue
+        for function_name, definition in flat.definitions.items():
+            if function_name != self.start_func and function_name not in self.functions:
+                self.functions[function_name] = (flat, definition)
 
-            elif type(child) is c_ast.Union:
-                continue
+    def descend(self, index: int, context: Scope, scopes: ScopesList):
+        """Parse a subtree (of the tree being parsed) from a handler. While parse is running the subtree is pushed on its stack instead of being parsed right away,
+        it is parsed after the handler returns and before the next child. So a handler should not use the marks of the subtree after descending,
+        a handler that needs them calls parse_flat (which goes one Python call deeper).
 
-            elif type(child) is c_ast.ArrayRef:
-                continue
+        Args:
+            index (int): the node of the subtree in self.flat
+            context (Scope): the context (scopes) of the subtree
+            scopes (ScopesList): the scope counters the subtree starts with
+        """
 
-            elif type(child) is c_ast.ArrayDecl:
-                continue
+        if self.pending is None:
+            self.parse_flat(self.flat, index, context, scopes)
+        else:
+            self.pending.append((index, context, scopes))
 
-            elif type(child) is c_ast.Enum:
-                continue
+    @classmethod
+    def register_handler(cls, node_type: type, handler: Callable) -> None:
+        """Register the handler parse uses for a node type (replacing the current one, if any).
+        A handler is called as handler(parser, name, index, context, scopes), with the node at index in parser.flat
+        and name the attribute of its parent it hangs from (for example "iftrue"). It returns the scopes to continue with,
+        so a handler that opens a scope can count it for the children that follow. A handler parses the children of its node with descend.
+        Registering on a subclass does not change the handlers of PiniParser.
 
-            elif type(child) is c_ast.PtrDecl:
-                print("ptr declare found")
-                continue
+        Args:
+            node_type (type): the c_ast node class
+            handler (Callable): the handler, None to skip nodes of this type
+        """
 
-            # We handle every variadic param as
-            elif type(child) is c_ast.EllipsisParam:
-                continue
+        if "handlers" not in cls.__dict__:
+            cls.handlers = dict(cls.handlers)
+            cls.kind_handlers = list(cls.kind_handlers)
 
-    def stringify_lvalue(self, ast: c_ast.Node) -> str:
-        """given an lvalue, return a string value representing this lvalue.
+        if handler is None:
+            cls.handlers.pop(node_type, None)
+        else:
+            cls.handlers[node_type] = handler
+        cls.kind_handlers[KIND_OF[node_type]] = handler
+
+    def visit_decl(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        self.handle_decl(self.flat, index, context)
+        return scopes
+
+    def visit_func_def(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        function_name = self.flat.get_identifier(index)
+        if function_name == self.start_func:
+            self.descend(index, context.child(self.filename).child(
+                self.start_func), scopes)
+        else:
+            self.functions[function_name] = (self.flat, index)
+
+        return scopes
+
+    def visit_compound(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        new_scopes = scopes
+        new_context = context
+
+        if name == "iftrue":
+            new_scopes = scopes.enter("if")
+            new_context = context.child(f"if[{str(scopes['if'])}]")
+
+        elif name == "iffalse":
+            new_scopes = scopes.enter("else")
+            new_context = context.child(f"else[{str(scopes['else'])}]")
+
+        self.descend(index, new_context, new_scopes)
+
+        if name == "iffalse" or name == "iftrue":
+            return scopes.increment("if")
+
+        return scopes
+
+    def visit_func_call(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        self.parse_called_function(self.flat, index, context)
+        return scopes
+
+    def visit_if(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        self.handle_if(index, context, scopes)
+        return scopes.increment("if")
+
+    def visit_binary_op(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        self.handle_binary_op(self.flat, index, context)
+        return scopes
+
+    def visit_for(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        print(scopes["for"])
+        self.handle_loop(index, context, scopes, "for")
+        return scopes.increment("for")
+
+    def visit_while(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        print(scopes["while"])
+        self.handle_loop(index, context, scopes, "while")
+        return scopes.increment("while")
+
+    def visit_do_while(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        print(scopes["dowhile"])
+        self.handle_loop(index, context, scopes, "dowhile")
+        return scopes.increment("dowhile")
+
+    def visit_nested(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        self.descend(index, context, scopes)
+        return scopes
+
+    # I have no idea what a type decl is
+    def visit_type_decl(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        print("Type declare found wtf is that?")
+        return scopes
+
+    def visit_ptr_decl(self, name: str, index: int, context: Scope, scopes: ScopesList) -> ScopesList:
+        print("ptr declare found")
+        return scopes
+
+    # node types that are not here are skipped (Typedef, UnaryOp, Break, Constant, Cast, Struct, TernaryOp, ArrayRef...)
+    handlers = {
+        c_ast.Decl: visit_decl,
+        c_ast.Assignment: visit_decl,
+        c_ast.FuncDef: visit_func_def,
+        c_ast.Compound: visit_compound,
+        c_ast.FuncCall: visit_func_call,
+        c_ast.If: visit_if,
+        c_ast.BinaryOp: visit_binary_op,
+        c_ast.For: visit_for,
+        c_ast.While: visit_while,
+        c_ast.DoWhile: visit_do_while,
+        c_ast.DeclList: visit_nested,
+        c_ast.Switch: visit_nested,
+        c_ast.Case: visit_nested,
+        c_ast.TypeDecl: visit_type_decl,
+        c_ast.PtrDecl: visit_ptr_decl,
+    }
+    # the handlers by node kind (see flat_ast.KINDS), what parse_flat looks up
+    kind_handlers = list(map(handlers.get, KINDS))
+
+    def handle_decl(self, flat: FlatAst, index: int, context: Scope) -> None:
+        """Handle a declaration of a variable (or an assignment), mark all variables that appreas in line.
 
         Args:
-            ast (c_ast.Node): the abstract syntax tree of the given lvalue
-
-        Returns:
-            str: a string represents the given lvalue
+            flat (FlatAst): the lowered syntax tree
+            index (int): the Decl or Assignment node
+            context (Scope): the current context (scopes) of the parsing
         """
 
-        if type(ast) is c_ast.StructRef:
-            return self.stringify_lvalue(ast.name) + ast.type + self.stringify_lvalue(ast.field)
-        if type(ast) is c_ast.ID:
-            return ast.name
-        if type(ast) is str:
-            return ast
-        if type(ast) is c_ast.ArrayRef:
-            return self.stringify_lvalue(ast.name)
+        lvalue = flat.get_identifier(index)
+        if lvalue is not None and flat.kinds[index] == DECL:
+            self.decl_history.add_name(context, lvalue)
 
-    def handle_decl(self, ast: c_ast.Node, context: str, decl_history: Set[str]) -> None:
-        """Handle a declaration of a variable, mark all variables that appreas in line.
+        if self.is_pini_var_exists(flat, index, context):
+            if lvalue is not None and not self.is_variable_marked(context, lvalue):
+                self.marked.add_name(
+                    self.find_definition_scope(context, lvalue), lvalue)
 
-        Args:
-            ast (c_ast.Node): the abstract syntax tree of the input
-            context (str): the current context (scopes) of the parsing 
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
-        """
+            self.mark_subtree(flat, index, context)
 
-        if hasattr(ast, "name"):
-            decl_history.add(PiniParser.get_contexted_name(
-                self.stringify_lvalue(ast.name), context))
-
-        if self.is_pini_var_exists(ast,  context, decl_history):
-            if hasattr(ast, "name"):
-                context_name = PiniParser.get_contexted_name(
-                    self.stringify_lvalue(ast.name), context)
-                if not self.is_variable_marked(context_name):
-                    self.marked.add(self.find_definition_scope(
-                        context_name, decl_history))
-            elif hasattr(ast, "lvalue"):
-                context_name = PiniParser.get_contexted_name(
-                    self.stringify_lvalue(ast.lvalue), context)
-                if not self.is_variable_marked(context_name):
-                    self.marked.add(self.find_definition_scope(
-                        context_name, decl_history))
-
-            self.mark_subtree(ast, context, decl_history)
-
-    def handle_if(self, ast: c_ast.Node, context: str, scopes: ScopesList, decl_history: Set[str]) -> None:
+    def handle_if(self, index: int, context: Scope, scopes: ScopesList) -> None:
         """Parse an if statement and mark all variables.
 
         Args:
-            ast (c_ast.Node): ast of the if statement
-            context (str): the current context (scopes) of the parsing 
+            index (int): the if statement in self.flat
+            context (Scope): the current context (scopes) of the parsing
             scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
         """
 
-        self.parse(ast, context, copy.deepcopy(scopes), decl_history)
+        self.descend(index, context, scopes)
 
-    def handle_binary_op(self, ast: c_ast.Node, context: str, decl_history) -> None:
+    def handle_binary_op(self, flat: FlatAst, index: int, context: Scope) -> None:
         """Handle a binary op and mark all variables that should be marked.
 
         Args:
-            ast (c_ast.Node): syntax tree of the binary op
-            scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
+            flat (FlatAst): the lowered syntax tree
+            index (int): the binary op
+            context (Scope): the current context (scopes) of the parsing
         """
 
-        if type(ast) is not c_ast.BinaryOp:
+        if flat.kinds[index] != BINARY_OP:
             return
 
-        if self.is_pini_var_exists(ast, context, decl_history):
-            self.mark_subtree(ast, context, decl_history)
+        if self.is_pini_var_exists(flat, index, context):
+            self.mark_subtree(flat, index, context)
 
-    def handle_loop(self, ast: c_ast.Node, context: str, scopes: ScopesList, loop_name: str, decl_history: Set[str]) -> None:
+    def handle_loop(self, index: int, context: Scope, scopes: ScopesList, loop_name: str) -> None:
         """Handle any loop (while/for) and mark all variables inside
 
         Args:
-            ast (c_ast.Node): syntax tree of the loop
-            context (str): the current context (scopes) of the parsing 
+            index (int): the loop in self.flat
+            context (Scope): the current context (scopes) of the parsing
             scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
             loop_name (str): this is a generic function that can parse either for or while, so we need to specify which one for context purposes.
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
         """
 
         self.loop_parse_wrapper(
-            ast, context + f"{loop_name}[{str(scopes[f'{loop_name}'])}]@", copy.deepcopy(scopes), loop_name, decl_history)
+            index, context.child(f"{loop_name}[{str(scopes[f'{loop_name}'])}]"), scopes, loop_name)
 
-    def loop_parse_wrapper(self, ast: c_ast.Node, context: str, scopes: ScopesList, loop_name: str, decl_history: Set[str]) -> List[str]:
+    def loop_parse_wrapper(self, index: int, context: Scope, scopes: ScopesList, loop_name: str) -> List[str]:
         """A wrapper function for parsing loops, this function increases the loop scopes cell (we have a new loop and hence need to increase this loop counter by 1).
 
         Args:
-            ast (c_ast.Node): syntax tree of the loop
-            context (str): the current context (scopes) of the parsing 
+            index (int): the loop in self.flat
+            context (Scope): the current context (scopes) of the parsing
             scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
             loop_name (str): this is a generic function that can parse either for or while, so we need to specify which one for context purposes.
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
         """
 
-        scopes[f"{loop_name}"].append(1)
-        self.parse(ast, context, scopes, decl_history)
+        self.descend(index, context, scopes.enter(loop_name))
 
-    def is_pini_var_exists(self, ast: c_ast.Node, context: str, decl_history: Set[str]) -> bool:
+    def is_pini_var_exists(self, flat: FlatAst, index: int, context: Scope) -> bool:
         """Check wheter some pini var exists in the given syntax tree.
 
         Args:
-            ast (c_ast.Node): input syntax tree
-            context (str): the current context (scopes) of the parsing 
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
+            flat (FlatAst): the lowered syntax tree
+            index (int): the root of the subtree to check
+            context (Scope): the current context (scopes) of the parsing
 
         Returns:
             bool: True if pini var exists and False otherwise
         """
 
-        children = ast.children()
-
-        if len(children) == 0:
-            if type(ast) is c_ast.ID:
-                if self.is_variable_marked(context + ast.name):
+        if stats.enabled:
+            stats.count("pini_var_checks")
+
+        kinds, first_child, next_sibling = flat.kinds, flat.first_child, flat.next_sibling
+        # the nodes are checked in pre-order (the calls in the tree are analysed in that order),
+        # the next sibling of a node is pushed before its first child
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            if node != index and next_sibling[node] != NO_NODE:
+                stack.append(next_sibling[node])
+            kind = kinds[node]
+
+            if kind == ID:
+                if self.is_variable_marked(context, flat.get_identifier(node)):
                     return True
-                return False
+                continue
 
-        if type(ast) is c_ast.FuncCall:
-            if hasattr(ast.name, "name"):
-                func_name = ast.name.name
-                if func_name == "va_arg":
+            if kind == FUNC_CALL:
+                if flat.get_identifier(node) == "va_arg":
                     return True
 
-            if not self.parse_called_function(ast, context, decl_history):
-                return False
-
-            if ast.name.name in self.linked_functions:
-                return self.linked_functions[ast.name.name].is_there_pini_return(self.functions[ast.name.name], PiniParser.contextify(ast.name.name, self.linked_functions[ast.name.name].filename + DELIMITER), decl_history)
-            else:
-                return self.is_there_pini_return(self.functions[ast.name.name], PiniParser.contextify(self.filename, ast.name.name), decl_history)
+                summary = self.analyse_called_function(flat, node, context)
+                if summary is not None and summary.returns_pini:
+                    return True
+                continue
 
-        if type(ast) is c_ast.StructRef:
-            if self.is_variable_marked(context + self.stringify_lvalue(ast)):
-                return True
-            return False
+            if kind == STRUCT_REF:
+                lvalue = flat.get_identifier(node)
+                if lvalue is not None and self.is_variable_marked(context, lvalue):
+                    return True
+                continue
 
-        for _, child in children:
-            if self.is_pini_var_exists(child, context, decl_history):
-                return True
+            if first_child[node] != NO_NODE:
+                stack.append(first_child[node])
 
         return False
 
-    def mark_subtree(self, ast: c_ast.Node, context: str, decl_history: Set[str]):
+    def mark_subtree(self, flat: FlatAst, index: int, context: Scope):
         """Mark all variables in a syntex tree. variables in function calls will not be marked.
 
         Args:
-            ast (c_ast.Node): input syntax tree
-            context (str): the current context (scopes) of the parsing 
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
+            flat (FlatAst): the lowered syntax tree
+            index (int): the root of the subtree to mark
+            context (Scope): the current context (scopes) of the parsing
         """
-        children = ast.children()
-
-        if len(children) == 0:
-            if type(ast) is c_ast.ID:
-                context_name = PiniParser.get_contexted_name(ast.name, context)
-                if not self.is_variable_marked(context_name):
-                    self.marked.add(self.find_definition_scope(
-                        context_name, decl_history))
 
-        if type(ast) is c_ast.FuncCall:
-            return
-
-        if type(ast) is c_ast.StructRef:
-            return
+        kinds, first_child, next_sibling = flat.kinds, flat.first_child, flat.next_sibling
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            if node != index and next_sibling[node] != NO_NODE:
+                stack.append(next_sibling[node])
+            kind = kinds[node]
+
+            if kind == ID:
+                name = flat.get_identifier(node)
+                if not self.is_variable_marked(context, name):
+                    self.marked.add_name(
+                        self.find_definition_scope(context, name), name)
+                continue
 
-        if type(ast) is c_ast.ArrayRef:
-            return
+            if kind == FUNC_CALL or kind == STRUCT_REF or kind == ARRAY_REF:
+                continue
 
-        for _, child in children:
-            self.mark_subtree(child, context, decl_history)
+            if first_child[node] != NO_NODE:
+                stack.append(first_child[node])
 
-    def link_non_local_function(self,  ast: c_ast.Node) -> Tuple[str, str, c_ast.Node]:
+    def link_non_local_function(self, function_name: str) -> Tuple[str, str, FlatAst]:
         """If a function was called, and can't be found locally, we would like to link it from the project.
         In order to do that, we build an include graph for the project and try to find a path from the current file to the called function.
 
         Args:
-            ast (c_ast.Node): input syntax tree
+            function_name (str): the name of the called function
 
         Returns:
             in case of success:
-                Tuple[str, PiniParser, c_ast.Node]: [the name of the file declaring the function found, the parser for the function, the ast of the function]
+                Tuple[str, PiniParser, FlatAst]: [the name of the file declaring the function found, the parser for the function, the lowered tree of the file]
             in case of failure:
-                Tuple[str, PiniParser, c_ast.Node]: "", None, None
+                Tuple[str, PiniParser, FlatAst]: "", None, None
         """
-        if ast.name.name not in self.graph_manager.function_counter:
+        if self.graph_manager is None or function_name not in self.graph_manager.function_counter:
             # function was not found in graph and hence can't be linked
-            self.logger.log(f"{ast.name.name} || Function can't be found")
+            self.logger.log(f"{function_name} || Function can't be found")
             return "", None, None
 
-        is_path_exist, found_index = self.graph_manager.is_path_exists_to_function(self.filename, ast.name.name)
+        is_path_exist, found_index = self.graph_manager.is_path_exists_to_function(self.filename, function_name)
 
         if not is_path_exist:
             # function exists in graph, but there is no legal include path from current file to function.
             self.logger.log(
-                f"{ast.name.name} || Function exists, but was not linked")
+                f"{function_name} || Function exists, but was not linked")
             return "", None, None
 
         # get the name of the file in which the function is declared
         file_declaring_function_name = self.graph_manager.get_function_declaring_parent(
-            self.graph_manager.gca, ast.name.name, found_index)
-        file_found_ast = parse_file(
-            file_declaring_function_name, use_cpp=False)
+            self.graph_manager.gca, function_name, found_index)
+        file_found_flat = self.cache.lower_file(file_declaring_function_name)
 
         # get the funciton definition syntex tree
-        definition = self.find_function_def_in_tree(
-            file_found_ast, ast.name.name)
+        definition = file_found_flat.definitions.get(function_name)
         if definition is None:
             self.logger.log(
-                f"{ast.name.name} || Function is declared, but definition not found")
+                f"{function_name} || Function is declared, but definition not found")
             return "", None, None
 
         # save the definition into a dictionary for future use
-        self.functions[ast.name.name] = definition
+        self.functions[function_name] = (file_found_flat, definition)
 
         linked_function_parser = PiniParser(
-            self.marked, ast.name.name, file_declaring_function_name, self.graph_manager)
+            self.marked, function_name, file_declaring_function_name, self.graph_manager,
+            decl_history=self.decl_history, summaries=self.summaries, cache=self.cache)
 
-        self.linked_functions[ast.name.name] = linked_function_parser
-        return file_declaring_function_name, linked_function_parser, file_found_ast
+        self.linked_functions[function_name] = linked_function_parser
+        stats.count("functions_linked")
+        return file_declaring_function_name, linked_function_parser, file_found_flat
 
-    def parse_called_function(self, ast: c_ast.Node, call_context: str, decl_history: Set[str], scopes: ScopesList = ScopesList()) -> bool:
+    def parse_called_function(self, flat: FlatAst, index: int, call_context: Scope, scopes: ScopesList = ScopesList()) -> bool:
         """Parse and mark a call to function. This requires to identify all pini variables from call so we could parse the function.
 
         Args:
-            ast (c_ast.Node): input syntax tree of called function
-            context (str): the current context (scopes) of the parsing 
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
+            flat (FlatAst): the lowered syntax tree
+            index (int): the FuncCall node
+            call_context (Scope): the current context (scopes) of the parsing
             scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
 
         Returns:
             bool: True if success, False if failure
         """
-        file_context = self.filename
-        if ast.name.name not in self.functions:
-            name, linked_function_parser, file_found_ast = self.link_non_local_function(ast)
+
+        return self.analyse_called_function(flat, index, call_context, scopes) is not None
+
+    def analyse_called_function(self, flat: FlatAst, index: int, call_context: Scope, scopes: ScopesList = ScopesList()) -> FunctionSummary:
+        """Mark the parameters of a called function from the call, then analyse the function.
+        A function is analysed once per set of marked parameters, later calls apply its summary
+        (as long as nothing the function depends on got new marks in between).
+
+        Args:
+            flat (FlatAst): the lowered syntax tree
+            index (int): the FuncCall node
+            call_context (Scope): the current context (scopes) of the parsing
+            scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
+
+        Returns:
+            FunctionSummary: the summary of the called function, None if the function can't be found (or is not called by name)
+        """
+        function_name = flat.get_identifier(index)
+        if function_name is None:
+            return None
+
+        if function_name not in self.functions:
+            with stats.timer("link_non_local_function"):
+                name, _, _ = self.link_non_local_function(function_name)
             if not name:
-                return False
+                return None
 
-            file_context = name
+        # linked functions are parsed by the parser of the file declaring them
+        function_parser = self.linked_functions.get(function_name, self)
 
         # get the context of the definition
-        def_context = PiniParser.contextify(
-            ast.name.name, file_context + DELIMITER)
+        def_context = self.root_scope.child(function_parser.filename).child(function_name)
 
         # find the params that needs to be marked in the called function (derived from call and pre-marked params)
-        def_params = [PiniParser.get_contexted_name(param_name, def_context)
-                      for param_name in PiniParser.get_func_def_params(self.functions[ast.name.name])]
+        def_flat, definition = self.functions[function_name]
+        def_params = def_flat.params[definition]
         boolean_pini_call_params = self.get_pini_param_map(
-            ast, call_context, def_params, decl_history)
+            flat, index, call_context, def_context, def_params)
+
+        for param_name, is_pini in zip(def_params, boolean_pini_call_params):
+            if is_pini:
+                self.marked.add_name(def_context, param_name)
+
+        key = FunctionSummaries.get_key(def_context, def_params, self.marked)
+        summary = self.summaries.find(key, self.marked, self.decl_history)
+        if summary is not None:
+            stats.count("summaries_applied")
+            return summary
 
-        params_marked = [param_name for param_name, is_pini in zip(
-            def_params, boolean_pini_call_params) if is_pini]
-        self.marked.update(params_marked)
+        if self.summaries.is_active(def_context):
+            return self.summaries.recursive_call(key)
 
-        if not ast.name.name in self.linked_functions:
-            self.parse(self.functions[ast.name.name].body, def_context, scopes)
+        stats.count("functions_analysed")
+        self.summaries.begin(def_context, self.marked, self.decl_history)
+        if function_parser is self:
+            self.parse_flat(def_flat, def_flat.find_child(definition, "body"), def_context, scopes)
         else:
-            linked_function_parser.parse(file_found_ast, "")
+            function_parser.parse(self.cache.lower_file(function_parser.filename), self.root_scope)
 
-        return True
+        returns_pini = function_parser.is_there_pini_return(def_flat, definition, def_context)
+        _, marked_params = FunctionSummaries.get_key(def_context, def_params, self.marked)
+        return self.summaries.end(key, marked_params, returns_pini, self.marked, self.decl_history)
 
-    def find_function_def_in_tree(self, ast: c_ast.Node, function_name: str) -> c_ast.Node:
-        """Find a function definition in a file.
-        Ths is mainly used for finding where a function is defined in order to parse it.
+    def get_pini_param_map(self, flat: FlatAst, index: int, context: Scope, def_context: Scope, def_params: List[str]) -> List[bool]:
+        """This function returns which of the variables used in the function call are pini.
 
         Args:
-            ast (c_ast.Node): input syntax tree
-            function_name (str): the name of the function we are trying to find.
+            flat (FlatAst): the lowered syntax tree
+            index (int): the FuncCall node
+            context (Scope): the current context (scopes) of the parsing
+            def_context (Scope): the context of the called function definition
+            def_params (List[str]): the names of the parameters of the called function
 
         Returns:
-            c_ast.Node: the function definition found if found otherwise None
+            List[bool]: a list of booleans such that cell i is true if argument i is pini.
         """
 
-        if type(ast) is c_ast.FuncDef and ast.decl.name == function_name:
-            return ast
+        params_indices = flat.get_call_args(index)
+        result = [False] * len(params_indices)
+
+        # what an argument without calls finds changes only when one of the names it checks gets marked,
+        # so those arguments are indexed by their names (and the name of the parameter they are passed to)
+        users = dict()
+        calling_params = []
+        for param_index, param_node in enumerate(params_indices):
+            names = PiniParser.get_checked_names(flat, param_node)
+            if names is None:
+                calling_params.append(param_index)
+                continue
+            if param_index < len(def_params):
+                names.add(def_params[param_index])
+            for name in names:
+                users.setdefault(name, []).append(param_index)
+
+        # the arguments are checked in rounds, in order, until a round finds no new pini argument.
+        # an argument is checked in a round only if it calls a function (a call can depend on any mark, and analysing it
+        # again can add marks), or if one of its names got marked since it was checked last: in this round if it comes
+        # after the argument that marked the name, in the next round otherwise
+        symbols, journal = self.marked.table.symbols, self.marked.journal
+        queued = set(range(len(params_indices)))
+        pini_count = 0
+        trues_count = -1
+        while trues_count != pini_count:
+            trues_count = pini_count
+            worklist = list(queued.union(calling_params))
+            heapify(worklist)
+            in_round = set(worklist)
+            queued = set()
+            while worklist:
+                param_index = heappop(worklist)
+                param_node = params_indices[param_index]
+
+                marked_count = len(journal)
+                # a call can pass more arguments than the definition names (variadic functions)
+                is_pini_exists = self.is_pini_var_exists(flat, param_node, context) or (
+                    param_index < len(def_params) and self.marked.has_name(def_context, def_params[param_index]))
+                if is_pini_exists:
+                    self.mark_subtree(flat, param_node, context)
 
-        for _, child in ast.children():
-            found = self.find_function_def_in_tree(child, function_name)
-            if found:
-                return found
+                pini_count += is_pini_exists - result[param_index]
+                result[param_index] = is_pini_exists
 
-        return None
+                for symbol in journal[marked_count:]:
+                    for user in users.get(symbols[symbol][1], ()):
+                        if result[user]:
+                            continue
+                        if user < param_index:
+                            queued.add(user)
+                        elif user not in in_round:
+                            in_round.add(user)
+                            heappush(worklist, user)
 
-    def get_pini_param_map(self, ast: c_ast.Node, context: str, def_params: List[str], decl_history: Set[str]) -> List[bool]:
-        """This function returns which of the variables used in the function call are pini.
+        return result
+
+    @staticmethod
+    def get_checked_names(flat: FlatAst, index: int) -> Set[str]:
+        """Get the names is_pini_var_exists checks in a syntax tree.
 
         Args:
-            ast (c_ast.Node): input syntax tree
-            context (str): the current context (scopes) of the parsing 
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
-            scopes (ScopesList): a list of counter for [if/for/while/else] so we could know which scope are we in.
+            flat (FlatAst): the lowered syntax tree
+            index (int): the root of the subtree
 
         Returns:
-            List[bool]: a list of booleans such that cell i is true if argument i is pini.
+            Set[str]: the names of the variables and struct references, None if the tree calls a function
         """
 
-        params_asts = PiniParser.get_func_call_params(ast)
-        result = [False] * len(params_asts)
-        trues_count = -1
+        kinds, first_child, next_sibling = flat.kinds, flat.first_child, flat.next_sibling
+        names = set()
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            if node != index and next_sibling[node] != NO_NODE:
+                stack.append(next_sibling[node])
+            kind = kinds[node]
+
+            if kind == ID:
+                names.add(flat.get_identifier(node))
+                continue
 
-        while trues_count != sum(result):
-            trues_count = sum(result)
-            for param_index, param_ast in enumerate(params_asts):
-                is_pini_exists = self.is_pini_var_exists(
-                    param_ast, context, decl_history) or def_params[param_index] in self.marked
-                if is_pini_exists:
-                    self.mark_subtree(param_ast, context, decl_history)
-                result[param_index] = is_pini_exists
+            if kind == FUNC_CALL:
+                return None
 
-        return result
+            if kind == STRUCT_REF:
+                lvalue = flat.get_identifier(node)
+                if lvalue is not None:
+                    names.add(lvalue)
+                continue
+
+            if first_child[node] != NO_NODE:
+                stack.append(first_child[node])
+
+        return names
 
-    def is_there_pini_return(self, ast: c_ast.Node, context: str, decl_history: Set[str]) -> bool:
+    def is_there_pini_return(self, flat: FlatAst, index: int, context: Scope) -> bool:
         """Checks whether there is a return in the function that returns a marked variable (pini-var).
 
         Args:
-            ast (c_ast.Node): input syntax tree
-            context (str): the current context (scopes) of the parsing 
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
+            flat (FlatAst): the lowered syntax tree
+            index (int): the function definition
+            context (Scope): the current context (scopes) of the parsing
 
         Returns:
             bool: [description]
         """
-        children = ast.children()
 
-        if type(ast) is c_ast.Return:
-            if self.is_pini_var_exists(ast, context, decl_history):
+        kinds, first_child, next_sibling = flat.kinds, flat.first_child, flat.next_sibling
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            if node != index and next_sibling[node] != NO_NODE:
+                stack.append(next_sibling[node])
+            if kinds[node] == RETURN and self.is_pini_var_exists(flat, node, context):
                 return True
 
-        if len(children) == 0:
-            return False
-
-        for _, child in children:
-            if self.is_there_pini_return(child, context, decl_history):
-                return True
+            if first_child[node] != NO_NODE:
+                stack.append(first_child[node])
 
         return False
 
-    def is_variable_marked(self, var_name: str) -> bool:
+    def is_variable_marked(self, context: Scope, var_name: str) -> bool:
         """Check if a variable is marked.
         This is not a trivial task since we only know the current context, but it might have been defined in an upper scope.
 
         Args:
+            context (Scope): the current context (scopes) of the parsing
             var_name (str): The name of the variable to check
 
         Returns:
             bool: True if marked, false otherwise
         """
 
-        return self.is_defined_in_upper_scope(var_name, self.marked)[0]
+        if stats.enabled:
+            stats.count("upper_scope_lookups")
+
+        return self.marked.is_in_upper_scope(context, var_name)
 
-    def find_definition_scope(self, var_name: str, decl_history: Set[str]) -> str:
+    def find_definition_scope(self, context: Scope, var_name: str) -> Scope:
         """find the definition scope of a variable, this is used in order to check whether a variable is marked.
 
         Args:
+            context (Scope): the current context (scopes) of the parsing
             var_name (str): the name of the variable to find
-            decl_history (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
 
         Returns:
-            str: the name of the variable definition
+            Scope: the scope in which the variable is defined (the current scope if no definition was found)
         """
-        _, var_names = self.is_defined_in_upper_scope(var_name, decl_history)
 
-        for name in var_names:
-            for defined_var in decl_history:
-                if name == defined_var:
-                    return defined_var
+        if stats.enabled:
+            stats.count("definition_scope_lookups")
 
-        return var_name
+        definition_scope = self.decl_history.find_outermost_scope(context, var_name)
+        if definition_scope is None:
+            return context
 
-    def is_defined_in_upper_scope(self, var_name: str, set_to_check: Set[str]) -> bool:
-        """Check if a variable is declared in an upper scope. 
-
-        Args:
-            var_name (str): the name of the variable to find
-            set_to_check (Set[str]): a set that contains all declarations of variables (so we could know what variable to mark)
-
-        Returns:
-            bool: True if defined, False otherwise.
-        """
-        scopes = var_name.split(DELIMITER)
-        var_name = scopes[-1]
-        scopes = scopes[:-1]
-
-        preficies = [DELIMITER.join(scope) for scope in [scopes[:i+1]
-                                                         for i, _ in enumerate(scopes)]]
-        var_names = [prefix + DELIMITER +
-                     var_name for prefix in preficies] + [var_name]
-
-        return any([var_name in self.marked for var_name in var_names]), var_names
+        return definition_scope
 
     @staticmethod
     def get_func_def_params(ast: c_ast.Node) -> List[str]:
@@ -595,31 +759,7 @@ class PiniParser():
         Returns:
             List[str]: the list of parameters.
         """
-        if type(ast) is not c_ast.FuncDef:
-            return []
-
-        if ast.decl.type.args is None:
-            return []
-
-        return [param.name for param in ast.decl.type.args.params]
-
-    @staticmethod
-    def get_func_call_params(ast: c_ast.Node) -> List[str]:
-        """Get a list of params of the function call
-
-        Args:
-            ast (c_ast.Node): input syntax tree
-
-        Returns:
-            List[str]: the list of parameters.
-        """
-        if type(ast) is not c_ast.FuncCall:
-            return []
-
-        if ast.args is None:
-            return []
-
-        return [param for param in ast.args.exprs]
+        return flat_ast.get_params(ast)
 
     @staticmethod
     def contextify(name: str, context: str, delimiter: str = DELIMITER) -> str:
@@ -664,57 +804,321 @@ class PiniParser():
         return context + name
 
 
-def remove_project_static_includes(root: str):
-    """Remove all static include from all files in a dir.
-    The pycparser can't parse any preprocess syntax and therefore after we build the include graph we need to remove it.
+def make_ast_cache(project_root: str, include_paths: List[str] = None, ast_cache_dir: str = None,
+                   use_cpp: bool = False, defines: List[str] = None, fake_libc_dir: str = None) -> AstCache:
+    """Make the AST cache of a project (see mark_project for the arguments).
 
     Args:
-        root (str): the root directory to start from.
+        project_root (str): the directory of the start file, searched for included files after include_paths
+
+    Returns:
+        AstCache: a cache of its own, the options of a project never change the cache other projects use
     """
 
-    for path, _, files in os.walk(root):
-        for file in files:
-            full_path = os.path.join(path, file)
-            with open(full_path, "r") as fd:
-                data = fd.read()
-                static_removed = mai.ProjectGraph.remove_static_includes(data)
+    preprocessor = None
+    if use_cpp:
+        cpp_cache_dir = None if ast_cache_dir is None else os.path.join(ast_cache_dir, "cpp")
+        preprocessor = Preprocessor(list(include_paths or []) + [project_root], defines, cpp_cache_dir, fake_libc_dir)
 
-            with open(full_path, "w") as fd:
-                fd.write(static_removed)
+    return AstCache(cache_dir=ast_cache_dir, preprocessor=preprocessor)
 
 
-def mark_project(start_file_name: str, marked: List[str]) -> Set[str]:
+def load_project(start_file_name: str, include_paths: List[str] = None, ast_cache_dir: str = None, jobs: int = 1, index_dir: str = None,
+                 use_cpp: bool = False, defines: List[str] = None, fake_libc_dir: str = None) -> Tuple[mai.ProjectGraph, AstCache]:
+    """Build the include graph of a project and its AST cache (see mark_project for the arguments).
+
+    Returns:
+        Tuple[mai.ProjectGraph, AstCache]: the include graph of the project and the cache to parse its files with
+    """
+
+    project_root = "/".join(start_file_name.split("/")[:-1])
+    project_graph_manager = mai.ProjectGraph(
+        start_file_name, project_root, include_paths, jobs, index_dir)
+    cache = make_ast_cache(project_root, include_paths, ast_cache_dir, use_cpp, defines, fake_libc_dir)
+
+    if jobs > 1:
+        # parse all the c files of the project up front, the files linked while marking are then taken from the cache
+        c_files = []
+        project_graph_manager.find_all_c_files(c_files)
+        with stats.timer("parse_files"):
+            cache.parse_files(c_files, jobs, lowered=True)
+
+    return project_graph_manager, cache
+
+
+def mark_project(start_file_name: str, marked: List[str], include_paths: List[str] = None, ast_cache_dir: str = None, jobs: int = 1, index_dir: str = None,
+                 export_graph: str = None, export_sources: List[str] = None, export_depth: int = None,
+                 use_cpp: bool = False, defines: List[str] = None, fake_libc_dir: str = None) -> Set[str]:
     """Mark all variables in a project.
 
     Args:
         file_name (str): The name of the file to mark
         marked (List[str]): A list of already marked variables.
+        include_paths (List[str], optional): extra directories to search included files in (like -I). Defaults to None.
+        ast_cache_dir (str, optional): directory to keep parsed syntax trees in between runs. Defaults to None.
+        jobs (int, optional): number of processes to scan and parse the project with, 1 parses the files one by one when they are linked. Defaults to 1.
+        index_dir (str, optional): directory to keep the include graph of the project in between runs. Defaults to None.
+        export_graph (str, optional): write the include graph to this file (.dot, .json or .graphml). Defaults to None.
+        export_sources (List[str], optional): export only the part of the graph reachable from these files. Defaults to None.
+        export_depth (int, optional): export only nodes up to this number of edges from the sources. Defaults to None.
+        use_cpp (bool, optional): run the files through cpp instead of removing their includes, the output is kept in ast_cache_dir. Defaults to False.
+        defines (List[str], optional): macros to define for cpp (like -D). Defaults to None.
+        fake_libc_dir (str, optional): headers to use for cpp instead of the system headers. Defaults to None.
 
     Returns:
         Set[str]: The marked variables found in the project
     """
 
-    project_root = "/".join(start_file_name.split("/")[:-1])
-    project_graph_manager = mai.ProjectGraph(start_file_name, project_root)
-
-    remove_project_static_includes(project_root)
+    project_graph_manager, cache = load_project(start_file_name, include_paths, ast_cache_dir, jobs, index_dir, use_cpp, defines, fake_libc_dir)
+    if export_graph is not None:
+        project_graph_manager.export(export_graph, export_sources, export_depth)
 
-    ast = parse_file(start_file_name, use_cpp=False)
+    flat = cache.lower_file(start_file_name)
 
     pp = PiniParser(set(marked), filename=start_file_name,
-                    graph_manager=project_graph_manager)
-    pp.parse(ast, "")
+                    graph_manager=project_graph_manager, cache=cache)
+    with stats.timer("mark"):
+        pp.parse(flat, "")
     return sorted(list(pp.get_marked()))
 
 
+class BatchAnalysis():
+    """Mark many sets of seeds against one project (for example one set per input field).
+
+    The include graph, the syntax trees and the scope tree are built once and shared by all the queries.
+    The function summaries are shared too: a called function is analysed again only if it starts from other marks than in an earlier query
+    (or if its analysis went through a recursive call, then it depends on the calls that led to it and not only on the marks).
+    """
+
+    def __init__(self, start_file_name: str, include_paths: List[str] = None, ast_cache_dir: str = None, jobs: int = 1,
+                 index_dir: str = None, use_cpp: bool = False, defines: List[str] = None, fake_libc_dir: str = None):
+        self.start_file_name = start_file_name
+        self.graph_manager, self.cache = load_project(start_file_name, include_paths, ast_cache_dir, jobs, index_dir, use_cpp, defines, fake_libc_dir)
+        self.root_scope = Scope()
+        self.summaries = FunctionSummaries(track_inputs=True)
+
+    def mark(self, marked: List[str]) -> List[str]:
+        """Mark the project from a set of seeds.
+
+        Args:
+            marked (List[str]): the marked variables to start from
+
+        Returns:
+            List[str]: the marked variables found in the project
+        """
+
+        self.summaries.start_run(set())
+        pp = PiniParser(ScopedNames(self.root_scope, marked), filename=self.start_file_name,
+                        graph_manager=self.graph_manager, summaries=self.summaries, cache=self.cache)
+        with stats.timer("mark"):
+            pp.parse(self.cache.lower_file(self.start_file_name), "")
+        return sorted(pp.get_marked())
+
+    def mark_all(self, seed_sets: List[List[str]], jobs: int = 1) -> List[List[str]]:
+        """Mark the project from every set of seeds.
+        With more than one job the queries are split between processes, every process keeps its own summaries.
+
+        Args:
+            seed_sets (List[List[str]]): the sets of seeds
+            jobs (int, optional): number of processes. Defaults to 1.
+
+        Returns:
+            List[List[str]]: the marked variables found from every set of seeds, in the same order
+        """
+
+        if jobs <= 1:
+            return [self.mark(seeds) for seeds in seed_sets]
+
+        with ProcessPoolExecutor(jobs, initializer=init_batch_worker, initargs=(self,)) as executor:
+            chunksize = max(1, len(seed_sets) // (jobs * 4))
+            return list(executor.map(mark_in_batch_worker, seed_sets, chunksize=chunksize))
+
+
+# the analysis of a worker process of BatchAnalysis.mark_all
+batch_worker_analysis = None
+
+
+def init_batch_worker(analysis: BatchAnalysis):
+    global batch_worker_analysis
+    batch_worker_analysis = analysis
+
+
+def mark_in_batch_worker(marked: List[str]) -> List[str]:
+    return batch_worker_analysis.mark(marked)
+
+
+class IncrementalAnalysis():
+    """Mark a project again and again (for example whenever a file is saved), analysing again only what the edits can change.
+
+    The function summaries are kept between runs: a called function is analysed again only if it (or a function it called)
+    is in an edited file, or if the marks it starts from are different this time, otherwise its summary is applied.
+    If the include graph changed, or no file the last run went through was edited, nothing is reused or nothing is analysed.
+    The include graph is kept between runs too, only the edited files are scanned again (see ProjectGraph.refresh).
+    """
+
+    def __init__(self, start_file_name: str, marked: List[str], include_paths: List[str] = None, ast_cache_dir: str = None,
+                 jobs: int = 1, index_dir: str = None, use_cpp: bool = False, defines: List[str] = None, fake_libc_dir: str = None):
+        self.start_file_name = start_file_name
+        self.seeds = list(marked)
+        self.include_paths = include_paths
+        self.jobs = jobs
+        self.index_dir = index_dir
+        self.cache = make_ast_cache("/".join(start_file_name.split("/")[:-1]), include_paths, ast_cache_dir,
+                                    use_cpp, defines, fake_libc_dir)
+
+        # the scope tree is kept between runs, so the summaries of a run can be used in the next one
+        self.root_scope = Scope()
+        self.summaries = FunctionSummaries(track_inputs=True)
+        self.graph_manager = None
+        self.edges = None
+        self.file_shas = dict()
+        self.marked = []
+
+    def run(self) -> Tuple[List[str], List[str]]:
+        """Mark the project again.
+
+        Returns:
+            Tuple[List[str], List[str]]: the variables marked now and not in the previous run, and the ones no longer marked
+        """
+
+        if self.graph_manager is None:
+            project_root = "/".join(self.start_file_name.split("/")[:-1])
+            self.graph_manager = mai.ProjectGraph(
+                self.start_file_name, project_root, self.include_paths, self.jobs, self.index_dir, track_changes=True)
+            graph_changed = True
+        else:
+            graph_changed = self.graph_manager.refresh()
+
+        if graph_changed:
+            # a graph built again can still link the functions the same way
+            edges = set(self.graph_manager.g.edges)
+            graph_changed = edges != self.edges
+            self.edges = edges
+
+        changed_files = {filename for filename, sha in self.file_shas.items()
+                         if not os.path.exists(filename) or self.get_sha(filename) != sha}
+
+        if not graph_changed and not changed_files:
+            return [], []
+
+        if graph_changed:
+            # functions can be linked differently now, so no summary can be trusted
+            self.summaries = FunctionSummaries(track_inputs=True)
+        else:
+            self.summaries.start_run(changed_files)
+
+        pp = PiniParser(ScopedNames(self.root_scope, self.seeds), filename=self.start_file_name,
+                        graph_manager=self.graph_manager, summaries=self.summaries, cache=self.cache)
+        with stats.timer("mark"):
+            pp.parse(self.cache.lower_file(self.start_file_name), "")
+
+        analysed_files = self.summaries.get_files() | {self.start_file_name}
+        self.file_shas = {filename: self.get_sha(filename) for filename in analysed_files}
+
+        previous = set(self.marked)
+        self.marked = sorted(pp.get_marked())
+        return sorted(set(self.marked) - previous), sorted(previous - set(self.marked))
+
+    def get_sha(self, filename: str) -> str:
+        """Get the sha of the text a file is parsed from (with cpp, an edited header changes the files including it)."""
+
+        return self.cache.read_source(filename)[0][3]
+
+    def get_project_files(self) -> List[str]:
+        """Get the files of the project (as found by the last run)."""
+
+        return list(self.graph_manager.file_index.known_paths.values())
+
+
+def watch_project(analysis: IncrementalAnalysis, interval: float = 1.0):
+    """Mark a project, then mark it again whenever one of its files changes and print the variables that are marked or no longer marked.
+
+    Args:
+        analysis (IncrementalAnalysis): the analysis of the project
+        interval (float, optional): seconds between checks for changed files. Defaults to 1.0.
+    """
+
+    def get_mtimes() -> Dict[str, int]:
+        mtimes = dict()
+        for filename in analysis.get_project_files():
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    while True:
+        start = time.perf_counter()
+        added, removed = analysis.run()
+        for marked_var in added:
+            print(f"+ {marked_var}")
+        for marked_var in removed:
+            print(f"- {marked_var}")
+        print(f"marked {len(analysis.marked)} variables in {time.perf_counter() - start:.3f}s")
+
+        mtimes = get_mtimes()
+        while get_mtimes() == mtimes:
+            time.sleep(interval)
+
+
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser('pini parser')
     argparser.add_argument('filename', help='name of file to parse')
+    argparser.add_argument('-I', dest='include_paths', action='append', default=[],
+                           help='add a directory to the include search path')
+    argparser.add_argument('--ast-cache-dir', default=None,
+                           help='keep parsed syntax trees in this directory between runs')
+    argparser.add_argument('-j', '--jobs', type=int, default=1,
+                           help='number of processes to scan and parse the project with (and to answer the queries of --seeds-file)')
+    argparser.add_argument('--index-dir', default=None,
+                           help='keep the include graph of the project in this directory between runs (for example output/index)')
+    argparser.add_argument('--export-graph', default=None,
+                           help='write the include graph to this file (.dot, .json or .graphml)')
+    argparser.add_argument('--export-from', dest='export_sources', action='append', default=None,
+                           help='export only the part of the include graph reachable from this file')
+    argparser.add_argument('--export-depth', type=int, default=None,
+                           help='export only nodes up to this number of includes from the start')
+    argparser.add_argument('--cpp', dest='use_cpp', action='store_true',
+                           help='run the files through cpp instead of removing their includes')
+    argparser.add_argument('-D', dest='defines', action='append', default=[],
+                           help='define a macro for cpp')
+    argparser.add_argument('--fake-libc', dest='fake_libc_dir', default=None,
+                           help='use the headers in this directory for cpp instead of the system headers (like pycparser/utils/fake_libc_include)')
+    argparser.add_argument('--watch', action='store_true',
+                           help='keep running, mark the project again whenever a file changes and print the difference')
+    argparser.add_argument('--seeds-file', default=None,
+                           help='mark the project once for every line of this file (the marked variables to start from, separated by spaces), '
+                                'print a json line with the marked variables of every query')
+    argparser.add_argument('--stats', default=None,
+                           help='write the time of every phase and the counters of the run to this json file')
+    argparser.add_argument('--profile', default=None,
+                           help='run under cProfile and write its output to this file (read it with python -m pstats)')
     args = argparser.parse_args()
 
-    print("@=======================@")
-    print("| Marked variables are: |")
-    print("@=======================@")
-
-    for marked_var in mark_project(args.filename, [str(args.filename) + "@main@x"]):
-        print(marked_var)
+    # the stats and the profile are written when the run ends, also when --watch is stopped
+    with collect(args.stats, args.profile):
+        if args.seeds_file is not None:
+            with open(args.seeds_file, "r") as fd:
+                seed_sets = [line.split() for line in fd if line.strip()]
+
+            analysis = BatchAnalysis(args.filename, args.include_paths, args.ast_cache_dir, args.jobs, args.index_dir,
+                                     args.use_cpp, args.defines, args.fake_libc_dir)
+            # the parser prints debug lines, keep them out of the json lines
+            with contextlib.redirect_stdout(sys.stderr):
+                results = analysis.mark_all(seed_sets, args.jobs)
+            for seeds, marked in zip(seed_sets, results):
+                print(json.dumps({"seeds": seeds, "marked": marked}))
+            sys.exit(0)
+
+        if args.watch:
+            watch_project(IncrementalAnalysis(args.filename, [str(args.filename) + "@main@x"], args.include_paths,
+                                              args.ast_cache_dir, args.jobs, args.index_dir,
+                                              args.use_cpp, args.defines, args.fake_libc_dir))
+
+        print("@=======================@")
+        print("| Marked variables are: |")
+        print("@=======================@")
+
+        for marked_var in mark_project(args.filename, [str(args.filename) + "@main@x"], args.include_paths, args.ast_cache_dir, args.jobs, args.index_dir,
+                                       args.export_graph, args.export_sources, args.export_depth, args.use_cpp, args.defines, args.fake_libc_dir):
+            print(marked_var)
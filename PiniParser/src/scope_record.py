@@ -1,35 +1,82 @@
+SCOPE_KINDS = ("for", "while", "if", "else", "dowhile")
+SCOPE_KIND_INDEX = {kind: index for index, kind in enumerate(SCOPE_KINDS)}
+
+
 class ScopeRecord():
-    def __init__(self):
-        self.scope_array = [1]
-    
-    def __iadd__(self, other):
-        if len(self.scope_array) == 0:
-            raise Exception("Empty Record")
-
-        self.scope_array[-1] += 1
-        return self
-    
-    def append(self, other):
+    """An immutable list of scope counters, for example 1-2 is the second scope inside the first one.
+
+    The record is a linked list from the innermost counter outwards, so appending or increasing a counter
+    creates a single new record that shares the rest of the list with the record it was created from.
+    """
+
+    __slots__ = ("prefix", "last")
+
+    def __init__(self, prefix: "ScopeRecord" = None, last: int = 1):
+        self.prefix = prefix
+        self.last = last
+
+    def __add__(self, other: int) -> "ScopeRecord":
+        if type(other) is not int:
+            raise Exception("Cannot add non int")
+
+        return ScopeRecord(self.prefix, self.last + other)
+
+    def append(self, other: int) -> "ScopeRecord":
         if type(other) is not int:
             raise Exception("Cannot append non int")
 
-        self.scope_array.append(other)
-    
+        return ScopeRecord(self, other)
+
     def __str__(self):
-        return "-".join([str(i) for i in self.scope_array])
-    
+        counters = []
+        record = self
+        while record is not None:
+            counters.append(str(record.last))
+            record = record.prefix
+
+        return "-".join(reversed(counters))
+
+
 class ScopesList():
-    def __init__(self):
-        self.scopes = dict({"for": ScopeRecord(), "while": ScopeRecord(), "if": ScopeRecord(), "else": ScopeRecord(), "dowhile": ScopeRecord()})
-    
-    def __getitem__(self, key: str):
-        if key not in self.scopes:
-            raise Exception("Loop is not recognized")
+    """Immutable counters for [if/for/while/else/dowhile] scopes, so we could know which scope are we in.
+    Entering or counting a scope returns a new ScopesList, the original one can be kept by the caller without copying it.
+    """
+
+    __slots__ = ("records",)
 
+    def __init__(self, records: tuple = None):
+        self.records = tuple(ScopeRecord() for _ in SCOPE_KINDS) if records is None else records
+
+    def __getitem__(self, key: str) -> ScopeRecord:
         if type(key) != str:
             raise Exception("Key type needs to be str")
 
-        return self.scopes[key]
-    
-    def __setitem__(self, key: str, value: ScopeRecord):
-        self.scopes[key] = value
\ No newline at end of file
+        if key not in SCOPE_KIND_INDEX:
+            raise Exception("Loop is not recognized")
+
+        return self.records[SCOPE_KIND_INDEX[key]]
+
+    def replace(self, key: str, record: ScopeRecord) -> "ScopesList":
+        """Get a new list with the record of one scope kind replaced.
+
+        Args:
+            key (str): the scope kind (for/while/if/else/dowhile)
+            record (ScopeRecord): the new record
+
+        Returns:
+            ScopesList: the new list
+        """
+
+        records = list(self.records)
+        records[SCOPE_KIND_INDEX[key]] = record
+        return ScopesList(tuple(records))
+
+    def increment(self, key: str) -> "ScopesList":
+        """Count another scope of a kind in the current level (for example the next if in the same block)."""
+
+        return self.replace(key, self[key] + 1)
+
+    def enter(self, key: str) -> "ScopesList":
+        """Start counting scopes of a kind inside a new nested scope."""
+
+        return self.replace(key, self[key].append(1))
@@ -0,0 +1,342 @@
+import sys
+from typing import Iterable, Iterator, Set, Tuple
+
+
+DELIMITER = "@"
+# scopes up to this depth (the root, files and functions) are units, deeper scopes belong to the unit enclosing them
+UNIT_DEPTH = 2
+
+
+class Scope():
+    """A node in the scope tree (a file, a function, an if/else/loop body...).
+
+    Scopes are interned: asking a scope for the same child label twice returns the same object,
+    so scopes can be compared and hashed by identity and a name is never rebuilt as a string while parsing.
+    Every scope tree has a SymbolTable, a scope keeps the symbols of the names in it by name.
+    """
+
+    __slots__ = ("parent", "label", "children", "rendered", "depth", "unit", "table", "symbols")
+
+    def __init__(self, parent: "Scope" = None, label: str = None):
+        self.parent = parent
+        self.label = label
+        self.children = dict()
+        self.rendered = None
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.unit = self if self.depth <= UNIT_DEPTH else parent.unit
+        self.table = SymbolTable() if parent is None else parent.table
+        self.symbols = dict()
+
+    def child(self, label: str) -> "Scope":
+        """Get (or create) the child scope with the given label.
+
+        Args:
+            label (str): the label of the scope, for example "main" or "if[1]"
+
+        Returns:
+            Scope: the child scope
+        """
+
+        scope = self.children.get(label)
+        if scope is None:
+            scope = Scope(self, label)
+            self.children[label] = scope
+
+        return scope
+
+    def descend(self, labels: Iterable[str]) -> "Scope":
+        """Get (or create) a nested scope.
+
+        Args:
+            labels (Iterable[str]): the labels of the scopes from this scope down
+
+        Returns:
+            Scope: the innermost scope
+        """
+
+        scope = self
+        for label in labels:
+            scope = scope.child(label)
+
+        return scope
+
+    def find(self, labels: Iterable[str]) -> "Scope":
+        """Find a nested scope without creating it.
+
+        Args:
+            labels (Iterable[str]): the labels of the scopes from this scope down
+
+        Returns:
+            Scope: the innermost scope, None if it was never created
+        """
+
+        scope = self
+        for label in labels:
+            scope = scope.children.get(label)
+            if scope is None:
+                return None
+
+        return scope
+
+    def __str__(self) -> str:
+        """Render the scope as a context string, for example "file.c@main@for[1]@" (the root is "")."""
+
+        if self.rendered is None:
+            # the enclosing scopes that were not rendered yet are rendered outermost first, without recursion
+            unrendered = []
+            scope = self
+            while scope is not None and scope.rendered is None:
+                unrendered.append(scope)
+                scope = scope.parent
+
+            for scope in reversed(unrendered):
+                scope.rendered = "" if scope.parent is None else scope.parent.rendered + scope.label + DELIMITER
+
+        return self.rendered
+
+    def __repr__(self) -> str:
+        return f"Scope({str(self)!r})"
+
+
+class SymbolTable():
+    """Integer ids (symbols) for the (scope, name) pairs of a scope tree.
+
+    A symbol is given once per pair, to all the ScopedNames of the tree, so marks and declarations are kept, compared
+    and copied as ints. A symbol is rendered as a contexted string ("main@for[1]@i") only for output.
+    Names are interned, so looking a name up in a scope hashes it once.
+    """
+
+    def __init__(self):
+        self.symbols = []
+
+    def get_symbol(self, scope: Scope, name: str) -> int:
+        """Get (or create) the symbol of a name in a scope.
+
+        Args:
+            scope (Scope): the scope (of this tree)
+            name (str): the name
+
+        Returns:
+            int: the symbol
+        """
+
+        symbol = scope.symbols.get(name)
+        if symbol is None:
+            name = sys.intern(name)
+            symbol = scope.symbols[name] = len(self.symbols)
+            self.symbols.append((scope, name))
+
+        return symbol
+
+    def get_scope(self, symbol: int) -> Scope:
+        return self.symbols[symbol][0]
+
+    def get_name(self, symbol: int) -> str:
+        return self.symbols[symbol][1]
+
+    def render(self, symbol: int) -> str:
+        """Render a symbol as a contexted name, for example "main@for[1]@i"."""
+
+        scope, name = self.symbols[symbol]
+        return str(scope) + name
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+
+class ScopedNames():
+    """A set of names declared in scopes, stored as symbols (see SymbolTable) instead of by full string.
+
+    Whether a symbol was added is a flag indexed by the symbol, the journal and the names of every unit are kept as symbols.
+    "Is this name in the current scope or any enclosing scope" is an upward walk on the scope tree, comparing scopes by identity.
+    The set can still be used as a set of contexted strings ("main@for[1]@i"), they are rendered only when iterating.
+    Every unit (the root, a file or a function scope) has a version that grows whenever a name is added inside it.
+    The symbols are also kept in the order they were added (the journal), so the names added since some point can be found.
+    """
+
+    def __init__(self, root: Scope = None, names: Iterable[str] = ()):
+        self.root = Scope() if root is None else root
+        self.table = self.root.table
+        # flags[symbol] is set if the symbol was added (symbols created after the last add are past the end)
+        self.flags = bytearray()
+        self.scopes_by_name = dict()
+        self.symbols_by_unit = dict()
+        self.journal = []
+        self.update(names)
+
+    def add_name(self, scope: Scope, name: str):
+        """Add a name declared in a scope.
+
+        Args:
+            scope (Scope): the scope of the name
+            name (str): the name
+        """
+
+        self.add_symbol(self.table.get_symbol(scope, name))
+
+    def add_symbol(self, symbol: int):
+        """Add a symbol (of the table of this tree).
+
+        Args:
+            symbol (int): the symbol
+        """
+
+        flags = self.flags
+        if symbol < len(flags):
+            if flags[symbol]:
+                return
+        else:
+            flags.extend(bytes(len(self.table) - len(flags)))
+
+        flags[symbol] = 1
+        self.journal.append(symbol)
+        scope, name = self.table.symbols[symbol]
+        # most names are added in one scope, the scope is kept as is until the name is added in a second one
+        scopes = self.scopes_by_name.get(name)
+        if scopes is None:
+            self.scopes_by_name[name] = scope
+        elif type(scopes) is Scope:
+            self.scopes_by_name[name] = {scopes, scope}
+        else:
+            scopes.add(scope)
+
+        unit_symbols = self.symbols_by_unit.get(scope.unit)
+        if unit_symbols is None:
+            unit_symbols = self.symbols_by_unit[scope.unit] = []
+        unit_symbols.append(symbol)
+
+    def has_symbol(self, symbol: int) -> bool:
+        return symbol < len(self.flags) and self.flags[symbol] == 1
+
+    def has_name(self, scope: Scope, name: str) -> bool:
+        """Checks whether a name was added in exactly this scope.
+
+        Args:
+            scope (Scope): the scope of the name
+            name (str): the name
+
+        Returns:
+            bool: True if added, False otherwise
+        """
+
+        symbol = scope.symbols.get(name)
+        return symbol is not None and self.has_symbol(symbol)
+
+    def is_in_upper_scope(self, scope: Scope, name: str) -> bool:
+        """Checks whether a name was added in the given scope or in one of the scopes enclosing it.
+
+        Args:
+            scope (Scope): the current scope
+            name (str): the name
+
+        Returns:
+            bool: True if found, False otherwise
+        """
+
+        scopes = self.scopes_by_name.get(name)
+        if scopes is None:
+            return False
+
+        if type(scopes) is Scope:
+            while scope is not None:
+                if scope is scopes:
+                    return True
+                scope = scope.parent
+            return False
+
+        while scope is not None:
+            if scope in scopes:
+                return True
+            scope = scope.parent
+
+        return False
+
+    def find_outermost_scope(self, scope: Scope, name: str) -> Scope:
+        """Find the outermost scope, out of the given scope and its enclosing scopes, in which a name was added.
+        The root scope is checked last, it is returned only if the name was not added in any other of the scopes.
+
+        Args:
+            scope (Scope): the current scope
+            name (str): the name
+
+        Returns:
+            Scope: the scope found, None if the name was not added in any of them
+        """
+
+        scopes = self.scopes_by_name.get(name)
+        if scopes is None:
+            return None
+        if type(scopes) is Scope:
+            scopes = (scopes,)
+
+        found = None
+        while scope.parent is not None:
+            if scope in scopes:
+                found = scope
+            scope = scope.parent
+
+        if found is None and scope in scopes:
+            return scope
+
+        return found
+
+    def get_version(self, units: Iterable[Scope]) -> int:
+        """Get the combined version of some units. Versions only grow, so the combined version stays the same
+        as long as no name was added in any of the units.
+
+        Args:
+            units (Iterable[Scope]): the units
+
+        Returns:
+            int: the combined version
+        """
+
+        return sum(len(self.symbols_by_unit.get(unit, ())) for unit in units)
+
+    def get_unit_symbols(self, units: Iterable[Scope]) -> Set[int]:
+        """Get all the symbols added in some units.
+
+        Args:
+            units (Iterable[Scope]): the units
+
+        Returns:
+            Set[int]: the symbols
+        """
+
+        symbols = set()
+        for unit in units:
+            symbols.update(self.symbols_by_unit.get(unit, ()))
+
+        return symbols
+
+    def split(self, contexted_name: str) -> Tuple[Scope, str]:
+        """Split a contexted name ("main@for[1]@i") into its scope and name.
+
+        Args:
+            contexted_name (str): the contexted name
+
+        Returns:
+            Tuple[Scope, str]: the scope and the name
+        """
+
+        labels = contexted_name.split(DELIMITER)
+        return self.root.descend(labels[:-1]), labels[-1]
+
+    def add(self, contexted_name: str):
+        self.add_name(*self.split(contexted_name))
+
+    def update(self, contexted_names: Iterable[str]):
+        for contexted_name in contexted_names:
+            self.add(contexted_name)
+
+    def __contains__(self, contexted_name: str) -> bool:
+        labels = contexted_name.split(DELIMITER)
+        scope = self.root.find(labels[:-1])
+        return scope is not None and self.has_name(scope, labels[-1])
+
+    def __iter__(self) -> Iterator[str]:
+        for symbol in self.journal:
+            yield self.table.render(symbol)
+
+    def __len__(self) -> int:
+        return len(self.journal)
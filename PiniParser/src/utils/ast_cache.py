@@ -0,0 +1,410 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Union
+
+import pycparser
+from pycparser import c_ast, c_parser
+from utils.flat_ast import FlatAst
+from utils.map_all_includes import ProjectGraph
+from utils.preprocessor import Preprocessor
+from utils.stats import stats
+
+
+# rough size of a parsed c_ast node in memory (measured on a few of the project sources)
+AST_NODE_SIZE = 300
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+
+class AstCache():
+    """A cache of parsed syntax trees, so a file is parsed by pycparser only once per process.
+
+    Entries are keyed by (path, size, mtime, sha) and evicted in LRU order once their estimated size exceeds the memory budget.
+    When cache_dir is given, parsed trees are also pickled into it so later runs can skip parsing files that did not change.
+    Static includes are removed from the text before it is parsed (the file itself is never changed) unless strip_includes is unset,
+    the setting should not be changed once files were parsed.
+    When a preprocessor is given, files are run through cpp instead, and their trees are keyed by the sha of the preprocessed text.
+    The analysis uses the lowered trees (see lower_file), which are cached (and pickled) apart from the syntax trees.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, cache_dir: str = None, strip_includes: bool = True,
+                 preprocessor: Preprocessor = None):
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.strip_includes = strip_includes
+        self.preprocessor = preprocessor
+        self.entries = OrderedDict()
+        self.used_memory = 0
+        self.digests = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, filename: str) -> Tuple[str, int, int, str]:
+        """Get the cache key of a file. The sha is computed again only if the size or mtime of the file changed.
+
+        Args:
+            filename (str): path of the file
+
+        Returns:
+            Tuple[str, int, int, str]: (path, size, mtime, sha)
+        """
+
+        return self.read_key(filename)[0]
+
+    def read_key(self, filename: str) -> Tuple[Tuple[str, int, int, str], bytes]:
+        """Get the cache key of a file, and its content if it had to be read to compute the sha.
+
+        Args:
+            filename (str): path of the file
+
+        Returns:
+            Tuple[Tuple[str, int, int, str], bytes]: (path, size, mtime, sha), and the content of the file (None if it was not read)
+        """
+
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        stat_key = (path, stat.st_size, stat.st_mtime_ns)
+
+        data = None
+        if stat_key not in self.digests:
+            with open(path, "rb") as fd:
+                data = fd.read()
+            self.digests[stat_key] = hashlib.sha1(data).hexdigest()
+
+        return stat_key + (self.digests[stat_key],), data
+
+    def read_source(self, filename: str) -> Tuple[Tuple[str, int, int, str], str]:
+        """Get the cache key of a file, and the text to parse if it was already read.
+        With a preprocessor the text is the preprocessed one, and the key holds its size and sha (the tree depends on the headers too).
+
+        Args:
+            filename (str): path of the file
+
+        Raises:
+            Exception: if cpp fails
+
+        Returns:
+            Tuple[Tuple[str, int, int, str], str]: (path, size, mtime, sha), and the text of the file (None if it was not read)
+        """
+
+        if self.preprocessor is not None:
+            text = self.preprocessor.preprocess(filename)
+            return (os.path.abspath(filename), len(text), 0, hashlib.sha1(text.encode()).hexdigest()), text
+
+        key, data = self.read_key(filename)
+        return key, None if data is None else data.decode()
+
+    def parse_file(self, filename: str) -> c_ast.FileAST:
+        """Parse a file (with cpp if the cache has a preprocessor) or return its cached syntax tree.
+        The returned tree is shared between all the callers and should not be modified.
+
+        Args:
+            filename (str): path of the file to parse
+
+        Returns:
+            c_ast.FileAST: the syntax tree of the file
+        """
+
+        key, text = self.read_source(filename)
+        return self.parse_source(filename, key, text)
+
+    def parse_source(self, filename: str, key: Tuple[str, int, int, str], text: str, keep: bool = True) -> c_ast.FileAST:
+        """Parse a file whose key was already read (see read_source) or return its cached syntax tree.
+
+        Args:
+            filename (str): path of the file to parse
+            key (Tuple[str, int, int, str]): the key of the file
+            text (str): the text to parse, None to read it from the file
+            keep (bool, optional): keep a tree that had to be parsed or loaded in the cache (in memory and on disk). Defaults to True.
+
+        Returns:
+            c_ast.FileAST: the syntax tree of the file
+        """
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if stats.enabled:
+                stats.count("ast_cache_hits")
+            return self.entries[key][0]
+
+        self.misses += 1
+        with stats.timer("parse_file"):
+            ast = self.load_from_disk(key)
+            if ast is None:
+                # the content read for the sha is parsed, so a new file is read only once
+                if text is None:
+                    with open(filename, "rb") as fd:
+                        text = fd.read().decode()
+                ast = parse_text(text, filename, self.strip_includes and self.preprocessor is None)
+                if keep:
+                    self.save_to_disk(key, ast)
+                stats.count("asts_parsed")
+            else:
+                stats.count("asts_loaded")
+
+        if keep:
+            self.add(key, ast)
+        return ast
+
+    def lower_file(self, filename: str) -> FlatAst:
+        """Get the lowered syntax tree of a file (see FlatAst), parsing the file if needed.
+        If the file has to be parsed, only the lowered tree is kept.
+
+        Args:
+            filename (str): path of the file
+
+        Returns:
+            FlatAst: the lowered syntax tree of the file
+        """
+
+        key, text = self.read_source(filename)
+        flat_key = key + ("flat",)
+        if flat_key in self.entries:
+            self.entries.move_to_end(flat_key)
+            self.hits += 1
+            if stats.enabled:
+                stats.count("ast_cache_hits")
+            return self.entries[flat_key][0]
+
+        self.misses += 1
+        flat = self.load_from_disk(key, lowered=True)
+        if flat is None:
+            ast = self.parse_source(filename, key, text, keep=False)
+            with stats.timer("lower"):
+                flat = FlatAst.lower(ast)
+            self.save_to_disk(key, flat, lowered=True)
+            stats.count("asts_lowered")
+        else:
+            stats.count("asts_loaded")
+
+        self.add(flat_key, flat, flat.estimate_size())
+        return flat
+
+    def parse_files(self, filenames: List[str], jobs: int, lowered: bool = False):
+        """Parse files in a pool of processes and keep their syntax trees, so parse_file finds them in the cache.
+        With a preprocessor, the files are preprocessed in the pool first.
+        Files that can't be preprocessed or parsed are skipped (parse_file raises the error if one of them is needed).
+
+        Args:
+            filenames (List[str]): paths of the files to parse
+            jobs (int): number of processes
+            lowered (bool, optional): keep the lowered trees instead (for lower_file), the workers lower them. Defaults to False.
+        """
+
+        if self.preprocessor is not None:
+            self.preprocessor.preprocess_files(filenames, jobs)
+
+        missing = []
+        for filename in filenames:
+            try:
+                key, text = self.read_source(filename)
+            except Exception:
+                continue
+
+            if (key + ("flat",) if lowered else key) not in self.entries:
+                # only preprocessed text is sent to the workers, they read other files themselves
+                missing.append((filename, key, text if self.preprocessor is not None else None))
+
+        if not missing:
+            return
+
+        with ProcessPoolExecutor(jobs) as executor:
+            # the trees come back pickled, big chunks keep the number of round trips low
+            chunksize = max(1, len(missing) // (jobs * 4))
+            disk_paths = [None if self.cache_dir is None else self.get_disk_path(key, lowered) for _, key, _ in missing]
+            results = executor.map(parse_to_pickle, [filename for filename, _, _ in missing], disk_paths,
+                                   [self.strip_includes and self.preprocessor is None] * len(missing),
+                                   [text for _, _, text in missing], [lowered] * len(missing), chunksize=chunksize)
+
+            for (_, key, _), (data, from_disk) in zip(missing, results):
+                if data is None:
+                    continue
+
+                self.misses += 1
+                if not from_disk:
+                    self.write_to_disk(key, data, lowered)
+                stats.count("asts_loaded" if from_disk else "asts_parsed")
+                if lowered:
+                    flat = pickle.loads(data)
+                    self.add(key + ("flat",), flat, flat.estimate_size())
+                else:
+                    self.add(key, pickle.loads(data))
+
+    def add(self, key: tuple, ast: Union[c_ast.FileAST, FlatAst], size: int = None):
+        """Add a syntax tree to the memory cache and evict the least recently used trees if the budget is exceeded.
+
+        Args:
+            key (tuple): the key of the file (with "flat" at the end for a lowered tree)
+            ast (Union[c_ast.FileAST, FlatAst]): the syntax tree of the file
+            size (int, optional): the memory used by the tree, None to estimate it. Defaults to None.
+        """
+
+        if size is None:
+            size = AstCache.estimate_size(ast)
+        self.entries[key] = (ast, size)
+        self.used_memory += size
+
+        while self.used_memory > self.memory_budget and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.used_memory -= evicted_size
+
+    def clear(self):
+        """Drop all the trees kept in memory (the on-disk cache is kept)."""
+
+        self.entries.clear()
+        self.digests.clear()
+        self.used_memory = 0
+
+    def get_disk_path(self, key: Tuple[str, int, int, str], lowered: bool = False) -> str:
+        """Get the path of the pickle of a file in the on-disk cache.
+        Only the path and the content are used, so touching a file without changing it keeps the cached tree valid.
+
+        Args:
+            key (Tuple[str, int, int, str]): the key of the file
+            lowered (bool, optional): the pickle of the lowered tree. Defaults to False.
+
+        Returns:
+            str: the path of the pickle
+        """
+
+        path, _, _, sha = key[:4]
+        name = hashlib.sha1(f"{pycparser.__version__}:{path}:{sha}:{self.strip_includes}:{self.preprocessor is not None}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, name + (".flat.pickle" if lowered else ".pickle"))
+
+    def load_from_disk(self, key: Tuple[str, int, int, str], lowered: bool = False) -> Union[c_ast.FileAST, FlatAst]:
+        """Load a syntax tree from the on-disk cache.
+
+        Args:
+            key (Tuple[str, int, int, str]): the key of the file
+            lowered (bool, optional): load the lowered tree. Defaults to False.
+
+        Returns:
+            Union[c_ast.FileAST, FlatAst]: the syntax tree if found, None otherwise
+        """
+
+        if self.cache_dir is None:
+            return None
+
+        try:
+            with open(self.get_disk_path(key, lowered), "rb") as fd:
+                return pickle.load(fd)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def save_to_disk(self, key: Tuple[str, int, int, str], ast: Union[c_ast.FileAST, FlatAst], lowered: bool = False):
+        """Save a syntax tree into the on-disk cache. Trees too deep to be pickled are not saved (lowered trees always are).
+
+        Args:
+            key (Tuple[str, int, int, str]): the key of the file
+            ast (Union[c_ast.FileAST, FlatAst]): the syntax tree of the file
+            lowered (bool, optional): the tree is a lowered one. Defaults to False.
+        """
+
+        if self.cache_dir is None:
+            return
+
+        try:
+            data = pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+
+        self.write_to_disk(key, data, lowered)
+
+    def write_to_disk(self, key: Tuple[str, int, int, str], data: bytes, lowered: bool = False):
+        """Write a pickled syntax tree into the on-disk cache.
+
+        Args:
+            key (Tuple[str, int, int, str]): the key of the file
+            data (bytes): the pickled syntax tree
+            lowered (bool, optional): the tree is a lowered one. Defaults to False.
+        """
+
+        if self.cache_dir is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        disk_path = self.get_disk_path(key, lowered)
+
+        # write and rename, so a concurrent run never reads half a pickle
+        temp_path = f"{disk_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as fd:
+            fd.write(data)
+        os.replace(temp_path, disk_path)
+
+    @staticmethod
+    def estimate_size(ast: c_ast.Node) -> int:
+        """Estimate the memory used by a syntax tree.
+
+        Args:
+            ast (c_ast.Node): the syntax tree
+
+        Returns:
+            int: estimated size in bytes
+        """
+
+        nodes_count = 0
+        stack = [ast]
+        while stack:
+            node = stack.pop()
+            nodes_count += 1
+            stack.extend(child for _, child in node.children())
+
+        return nodes_count * AST_NODE_SIZE
+
+
+def parse_text(text: str, filename: str, strip_includes: bool = False) -> c_ast.FileAST:
+    """Parse the text of a file (without cpp).
+
+    Args:
+        text (str): the text of the file
+        filename (str): path of the file (for the coordinates of the nodes)
+        strip_includes (bool, optional): remove the static includes from the text before parsing. Defaults to False.
+
+    Returns:
+        c_ast.FileAST: the syntax tree
+    """
+
+    if strip_includes:
+        text = ProjectGraph.remove_static_includes(text)
+
+    return c_parser.CParser().parse(text, filename)
+
+
+def parse_to_pickle(filename: str, disk_path: str = None, strip_includes: bool = True, text: str = None,
+                    lowered: bool = False) -> Tuple[bytes, bool]:
+    """Parse a file in a worker process of AstCache.parse_files.
+
+    Args:
+        filename (str): path of the file to parse
+        disk_path (str, optional): the pickle of the file in the on-disk cache, to look in before parsing. Defaults to None.
+        strip_includes (bool, optional): remove the static includes from the text before parsing. Defaults to True.
+        text (str, optional): the text to parse (for example the preprocessed text), None to read the file. Defaults to None.
+        lowered (bool, optional): lower the syntax tree and pickle the lowered tree (see FlatAst). Defaults to False.
+
+    Returns:
+        Tuple[bytes, bool]: the pickled syntax tree (None if the file can't be parsed or pickled), and whether it came from the on-disk cache
+    """
+
+    if disk_path is not None:
+        try:
+            with open(disk_path, "rb") as fd:
+                return fd.read(), True
+        except OSError:
+            pass
+
+    try:
+        if text is None:
+            with open(filename, "r") as fd:
+                text = fd.read()
+        ast = parse_text(text, filename, strip_includes)
+        if lowered:
+            ast = FlatAst.lower(ast)
+        return pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL), False
+    except (c_parser.ParseError, RecursionError, UnicodeDecodeError):
+        return None, False
+
+
+ast_cache = AstCache()
@@ -0,0 +1,124 @@
+import os
+from typing import List
+
+
+class FileIndex():
+    """An index of all the files under a project root (and the include search paths).
+
+    The directories are walked once, afterwards resolving a file name is a dictionary lookup.
+    When track_mtime is set, refresh() re-scans the tree only if the mtime of one of the scanned directories changed.
+    """
+
+    def __init__(self, root: str, include_paths: List[str] = None, track_mtime: bool = False):
+        self.root = root
+        self.include_paths = list(include_paths or [])
+        self.track_mtime = track_mtime
+        self.paths_by_name = dict()
+        self.known_paths = dict()
+        self.dir_mtimes = dict()
+        self.scan()
+
+    def scan(self):
+        """Walk the project root and the include paths that are outside of it, and rebuild the index."""
+
+        self.paths_by_name = dict()
+        self.known_paths = dict()
+        self.dir_mtimes = dict()
+
+        roots = [self.root] + [path for path in self.include_paths if not self.is_under_root(path)]
+        for scan_root in roots:
+            for root, _, files in os.walk(scan_root):
+                if self.track_mtime:
+                    self.dir_mtimes[root] = os.stat(root).st_mtime_ns
+
+                for filename in files:
+                    full_path = os.path.join(root, filename)
+                    self.paths_by_name.setdefault(filename, []).append(full_path)
+                    self.known_paths[os.path.normpath(full_path)] = full_path
+
+    def refresh(self) -> bool:
+        """Re-scan the index if a scanned directory was changed since the last scan (only when tracking mtime).
+
+        Returns:
+            bool: True if the index was re-scanned, False otherwise
+        """
+
+        if not self.track_mtime:
+            return False
+
+        for directory, mtime in self.dir_mtimes.items():
+            try:
+                changed = os.stat(directory).st_mtime_ns != mtime
+            except OSError:
+                changed = True
+
+            if changed:
+                self.scan()
+                return True
+
+        return False
+
+    def is_under_root(self, path: str) -> bool:
+        """Checks whether a path is inside the project root.
+
+        Args:
+            path (str): the path to check
+
+        Returns:
+            bool: True if inside the root, False otherwise
+        """
+
+        root = os.path.abspath(self.root)
+        return os.path.commonpath([root, os.path.abspath(path)]) == root
+
+    def find_by_extension(self, extension: str) -> List[str]:
+        """Find all the indexed files with a given extension, in the order they were walked.
+
+        Args:
+            extension (str): the extension to search (for example ".c")
+
+        Returns:
+            List[str]: full paths of the files found
+        """
+
+        return [path for path in self.known_paths.values() if path.endswith(extension)]
+
+    def resolve(self, filename: str, including_file: str = None) -> str:
+        """find the full path of a filename.
+        The lookup order is similar to the one of the preprocessor for quoted includes:
+        the directory of the including file, the include paths, the path itself and finally any file with that name in the project.
+        If more than one file in the project has the same name, a file whose path ends with the given (relative) path is preferred.
+
+        Args:
+            filename (str): the name of the file (as written in the include)
+            including_file (str, optional): the file containing the include. Defaults to None.
+
+        Raises:
+            Exception: if file can't be found
+
+        Returns:
+            str: file full path
+        """
+
+        candidates = []
+        if including_file and not os.path.isabs(filename):
+            candidates.append(os.path.join(os.path.dirname(including_file), filename))
+        candidates.extend(os.path.join(include_path, filename) for include_path in self.include_paths)
+        candidates.append(filename)
+
+        for candidate in candidates:
+            found = self.known_paths.get(os.path.normpath(candidate))
+            if found is not None:
+                return found
+
+        basename = filename.split("/")[-1]
+        matches = self.paths_by_name.get(basename, [])
+        if len(matches) == 0:
+            raise Exception(f"{basename} not found")
+
+        suffix = os.sep + os.path.normpath(filename).lstrip(os.sep)
+        for match in matches:
+            if os.path.normpath(match).endswith(suffix):
+                return match
+
+        return matches[0]
@@ -0,0 +1,248 @@
+import sys
+import weakref
+from array import array
+from typing import List
+
+from pycparser import c_ast
+
+
+# every c_ast node class is a kind, sorted by name so the numbers are the same in every process (flat trees are pickled)
+KINDS = sorted((cls for cls in vars(c_ast).values() if isinstance(cls, type) and issubclass(cls, c_ast.Node) and cls is not c_ast.Node),
+               key=lambda cls: cls.__name__)
+KIND_OF = {cls: kind for kind, cls in enumerate(KINDS)}
+
+# the names of the attributes children hang from ("iftrue", "block_items"...), "" for the root
+SLOT_NAMES = [""] + sorted({slot for cls in KINDS for slot in cls.__slots__ if slot not in ("coord", "__weakref__")})
+SLOT_OF = {slot: index for index, slot in enumerate(SLOT_NAMES)}
+
+NO_NODE = -1
+NO_NAME = -1
+
+
+def render_lvalue(ast) -> str:
+    """Render an lvalue as a name, for example "a->b.c" for a->b.c, "a" for a[1] (a declared name is given as a str).
+
+    Args:
+        ast: the syntax tree of the lvalue (or a str)
+
+    Returns:
+        str: the name, None if the lvalue is not a name (for example *p or f().a)
+    """
+
+    suffix = ""
+    while True:
+        if type(ast) is c_ast.ID:
+            return ast.name + suffix
+        if type(ast) is str:
+            return ast + suffix
+        if type(ast) is c_ast.ArrayRef:
+            ast = ast.name
+        elif type(ast) is c_ast.StructRef:
+            field = render_lvalue(ast.field)
+            if field is None:
+                return None
+            suffix = ast.type + field + suffix
+            ast = ast.name
+        else:
+            return None
+
+
+def get_identifier(ast: c_ast.Node) -> str:
+    """Get the name the analysis knows a node by: the name of an ID, a declaration or a function definition,
+    the name of the function called (if it is called by name) and the rendered lvalue of a struct or array reference or of an assignment.
+
+    Args:
+        ast (c_ast.Node): the node
+
+    Returns:
+        str: the name, None if the node has none
+    """
+
+    node_type = type(ast)
+    if node_type is c_ast.ID or node_type is c_ast.Decl:
+        return ast.name
+    if node_type is c_ast.FuncDef:
+        return ast.decl.name
+    if node_type is c_ast.FuncCall:
+        return ast.name.name if type(ast.name) is c_ast.ID else None
+    if node_type is c_ast.StructRef or node_type is c_ast.ArrayRef:
+        return render_lvalue(ast)
+    if node_type is c_ast.Assignment:
+        return render_lvalue(ast.lvalue)
+
+    return None
+
+
+def get_params(ast: c_ast.FuncDef) -> List[str]:
+    """Get the names of the parameters of a function definition (None for a parameter with no name, like ...).
+
+    Args:
+        ast (c_ast.FuncDef): the function definition
+
+    Returns:
+        List[str]: the names of the parameters
+    """
+
+    if type(ast) is not c_ast.FuncDef or ast.decl.type.args is None:
+        return []
+
+    return [getattr(param, "name", None) for param in ast.decl.type.args.params]
+
+
+class FlatAst():
+    """A syntax tree lowered into parallel arrays (struct of arrays), with one entry per node in pre-order.
+
+    For node i: kinds[i] is its c_ast class (see KINDS), first_child[i] and next_sibling[i] link it to the rest of the tree (NO_NODE if none),
+    slots[i] is the attribute of its parent it hangs from (see SLOT_NAMES), names[i] is its identifier (see get_identifier) as an index
+    into identifiers (NO_NAME if none) and lines[i] is its line. Every identifier is kept once per tree, as an interned string.
+    The function definitions and their parameters are indexed when the tree is lowered.
+
+    The arrays take a fraction of the memory of the c_ast objects, and walking them allocates nothing.
+    Everything the analysis needs is in the arrays, so the c_ast tree is not kept.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.slots = array("B")
+        self.names = array("i")
+        self.lines = array("i")
+        self.identifiers = []
+        self.definitions = dict()
+        self.params = dict()
+
+    @staticmethod
+    def lower(ast: c_ast.Node) -> "FlatAst":
+        """Lower a syntax tree (without recursion, so deep trees can be lowered).
+
+        Args:
+            ast (c_ast.Node): the syntax tree, usually a FileAST
+
+        Returns:
+            FlatAst: the flat tree, the root is node 0
+        """
+
+        flat = FlatAst()
+        kinds, first_child, next_sibling = flat.kinds, flat.first_child, flat.next_sibling
+        slots, names, lines = flat.slots, flat.names, flat.lines
+        identifier_ids = dict()
+        last_child = array("i")
+
+        stack = [(ast, NO_NODE, 0)]
+        while stack:
+            node, parent, slot = stack.pop()
+            index = len(kinds)
+
+            kinds.append(KIND_OF[type(node)])
+            first_child.append(NO_NODE)
+            next_sibling.append(NO_NODE)
+            last_child.append(NO_NODE)
+            slots.append(slot)
+            lines.append((node.coord.line or 0) if node.coord is not None else 0)
+
+            identifier = get_identifier(node)
+            if identifier is None:
+                names.append(NO_NAME)
+            else:
+                identifier_id = identifier_ids.get(identifier)
+                if identifier_id is None:
+                    identifier_id = identifier_ids[identifier] = len(flat.identifiers)
+                    flat.identifiers.append(sys.intern(identifier))
+                names.append(identifier_id)
+
+            if parent != NO_NODE:
+                previous = last_child[parent]
+                if previous == NO_NODE:
+                    first_child[parent] = index
+                else:
+                    next_sibling[previous] = index
+                last_child[parent] = index
+
+            if type(node) is c_ast.FuncDef:
+                # if a name is defined more than once the first definition is kept
+                flat.definitions.setdefault(identifier, index)
+                flat.params[index] = get_params(node)
+
+            for child_name, child in reversed(node.children()):
+                stack.append((child, index, SLOT_OF[child_name.partition("[")[0]]))
+
+        return flat
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # identifiers of trees loaded from the disk cache (or from worker processes) are interned again
+        self.identifiers = [sys.intern(identifier) for identifier in self.identifiers]
+
+    def get_identifier(self, index: int) -> str:
+        """Get the identifier of a node (see get_identifier), None if it has none."""
+
+        name = self.names[index]
+        return None if name == NO_NAME else self.identifiers[name]
+
+    def children(self, index: int) -> List[int]:
+        """Get the children of a node, in order."""
+
+        children = []
+        child = self.first_child[index]
+        while child != NO_NODE:
+            children.append(child)
+            child = self.next_sibling[child]
+
+        return children
+
+    def find_child(self, index: int, slot: str) -> int:
+        """Get the (first) child of a node hanging from an attribute, for example the body of a FuncDef.
+
+        Args:
+            index (int): the node
+            slot (str): the attribute
+
+        Returns:
+            int: the child, NO_NODE if there is none
+        """
+
+        slot = SLOT_OF[slot]
+        child = self.first_child[index]
+        while child != NO_NODE and self.slots[child] != slot:
+            child = self.next_sibling[child]
+
+        return child
+
+    def get_call_args(self, index: int) -> List[int]:
+        """Get the arguments of a FuncCall node."""
+
+        args = self.find_child(index, "args")
+        return [] if args == NO_NODE else self.children(args)
+
+    def estimate_size(self) -> int:
+        """Estimate the memory used by the tree, in bytes."""
+
+        arrays = [self.kinds, self.first_child, self.next_sibling, self.slots, self.names, self.lines]
+        return (sum(part.itemsize * len(part) for part in arrays) + sys.getsizeof(self.identifiers)
+                + sum(sys.getsizeof(identifier) for identifier in self.identifiers)
+                + sys.getsizeof(self.definitions) + sys.getsizeof(self.params))
+
+
+# trees lowered by lower, held weakly so a flat tree goes away together with its tree
+lowered_trees = weakref.WeakKeyDictionary()
+
+
+def lower(ast: c_ast.Node) -> FlatAst:
+    """Lower a syntax tree, or return the flat tree it was already lowered into.
+
+    Args:
+        ast (c_ast.Node): the syntax tree
+
+    Returns:
+        FlatAst: the flat tree
+    """
+
+    flat = lowered_trees.get(ast)
+    if flat is None:
+        flat = lowered_trees[ast] = FlatAst.lower(ast)
+
+    return flat
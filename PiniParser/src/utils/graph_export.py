@@ -0,0 +1,96 @@
+import json
+import os
+from collections import deque
+from typing import List
+
+import networkx as nx
+
+
+EXPORT_FORMATS = (".dot", ".json", ".graphml")
+
+
+class GraphExporter():
+    """Writes an include graph (or a slice of it) to a file, for viewing it with other tools.
+
+    Nothing is rendered: the graph is written as DOT (render it with graphviz if you need a picture), JSON or GraphML.
+    Big graphs can be sliced to the nodes reachable from some files, optionally up to a depth.
+    """
+
+    def __init__(self, graph: nx.DiGraph):
+        self.graph = graph
+
+    def slice(self, sources: List[str] = None, depth: int = None) -> nx.DiGraph:
+        """Get the part of the graph reachable from some nodes.
+
+        Args:
+            sources (List[str], optional): the nodes to start from, None for the whole graph. Defaults to None.
+            depth (int, optional): the maximal number of edges from a source, None for no limit. Defaults to None.
+
+        Returns:
+            nx.DiGraph: the sliced graph
+        """
+
+        if sources is None and depth is None:
+            return self.graph
+
+        if sources is None:
+            sources = [node for node, in_degree in self.graph.in_degree() if in_degree == 0]
+
+        distances = {source: 0 for source in sources if source in self.graph}
+        queue = deque(distances)
+        while queue:
+            node = queue.popleft()
+            if depth is not None and distances[node] >= depth:
+                continue
+
+            for child in self.graph.successors(node):
+                if child not in distances:
+                    distances[child] = distances[node] + 1
+                    queue.append(child)
+
+        return self.graph.subgraph(distances)
+
+    def export(self, path: str, sources: List[str] = None, depth: int = None):
+        """Write the graph (or a slice of it) to a file, the format is chosen by the extension of the path.
+
+        Args:
+            path (str): the output file (.dot, .json or .graphml)
+            sources (List[str], optional): export only the nodes reachable from these nodes. Defaults to None.
+            depth (int, optional): export only nodes up to this number of edges from the sources. Defaults to None.
+
+        Raises:
+            Exception: if the extension is not one of the supported formats
+        """
+
+        extension = os.path.splitext(path)[1]
+        if extension not in EXPORT_FORMATS:
+            raise Exception(f"Can't export graph to {path}, supported formats are {', '.join(EXPORT_FORMATS)}")
+
+        graph = self.slice(sources, depth)
+        if extension == ".dot":
+            GraphExporter.write_dot(graph, path)
+        elif extension == ".json":
+            with open(path, "w") as fd:
+                json.dump(nx.node_link_data(graph), fd)
+        else:
+            nx.write_graphml(graph, path)
+
+    @staticmethod
+    def write_dot(graph: nx.DiGraph, path: str):
+        """Write a graph in the DOT language.
+
+        Args:
+            graph (nx.DiGraph): the graph
+            path (str): the output file
+        """
+
+        def quote(name: str) -> str:
+            return '"' + str(name).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+        with open(path, "w") as fd:
+            fd.write("digraph includes {\n")
+            for node in graph.nodes:
+                fd.write(f"    {quote(node)};\n")
+            for source, dest in graph.edges:
+                fd.write(f"    {quote(source)} -> {quote(dest)};\n")
+            fd.write("}\n")
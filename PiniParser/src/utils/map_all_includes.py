@@ -1,10 +1,16 @@
 from utils.include_finder import IncludeFinder
+from utils.file_index import FileIndex
+from utils.project_index import ProjectIndex
+from utils.source_scanner import read_and_scan, scan_source
+from utils.graph_export import GraphExporter
+from utils.reachability import ReachabilityIndex
+from utils.stats import stats
 import os
+from concurrent.futures import ProcessPoolExecutor
 from anytree import Node, RenderTree
-from anytree.exporter import DotExporter
 import networkx as nx
 import matplotlib.pyplot as plt
-from typing import Dict, List, Set, Callable
+from typing import Dict, List, Set, Callable, Tuple
 import re
 
 
@@ -15,33 +21,102 @@ FUNCTION_PREFIX = "FUNC@@@/"
 
 
 class ProjectGraph():
-    def __init__(self, main_path=MAIN_NAME, path_to_dir=PATH_TO_DIR):
+    def __init__(self, main_path=MAIN_NAME, path_to_dir=PATH_TO_DIR, include_paths: List[str] = None, jobs: int = 1, index_dir: str = None,
+                 track_changes: bool = False):
         self.function_counter = dict()
+        self.function_nodes = dict()
+        self.g = nx.DiGraph()
+        self.gca = None
+        self.reachability = None
         self.path_to_main = main_path
         self.path_to_dir = path_to_dir
-        self.g, self.gca = self.generate_graph()
+        self.file_index = FileIndex(path_to_dir, include_paths, track_mtime=track_changes)
+        self.jobs = jobs
+        self.file_records = dict()
+        self.file_stats = dict()
+        self.project_index = None
+
+        if index_dir is not None or track_changes:
+            # files that did not change since the last run (or the last refresh) are not scanned again
+            self.project_index = ProjectIndex(index_dir, main_path, path_to_dir, include_paths)
+
+        self.load()
+
+    def load(self) -> bool:
+        """Build the graph, or take it from the project index if it would be built the same.
+
+        Returns:
+            bool: True if the graph was built, False if it was taken from the index
+        """
+
+        if self.project_index is not None:
+            self.file_stats, self.file_records = self.project_index.get_unchanged_records()
+            self.scan_files(self.project_index.get_changed_files(self.file_records))
+            files = self.get_graph_files()
+            graph = self.project_index.get_graph(files, self.file_records)
+            if graph is not None:
+                self.g, self.gca, self.function_counter, self.function_nodes, self.reachability = graph
+                stats.count("graphs_loaded")
+                if self.file_stats != self.project_index.state["stats"]:
+                    # files were edited without changing their records
+                    self.project_index.save(files, self.file_stats, self.file_records, graph)
+                return False
+
+        self.g = nx.DiGraph()
+        self.function_counter = dict()
+        self.function_nodes = dict()
+        with stats.timer("generate_graph"):
+            self.g, self.gca = self.generate_graph()
+
+        if self.project_index is not None:
+            files = self.get_graph_files()
+            self.project_index.save(files, self.file_stats, self.file_records,
+                                    (self.g, self.gca, self.function_counter, self.function_nodes, self.reachability))
+        return True
+
+    def get_graph_files(self) -> List[str]:
+        """Get the files the graph depends on: the sources, and the other files an include could resolve to.
+        Other files (the output of a run for example) can be added or removed without building the graph again.
+
+        Returns:
+            List[str]: full paths of the files, in the order they were walked
+        """
+
+        included = {os.path.basename(name) for record in self.file_records.values() for name in record[0]}
+        return [path for path in self.file_index.known_paths.values()
+                if path.endswith((".c", ".h")) or os.path.basename(path) in included]
+
+    def refresh(self) -> bool:
+        """Build the graph again if files were added or removed, or if the includes or functions of a file changed since it was built.
+        Only the files that changed are scanned again (the graph has to be made with track_changes).
+
+        Returns:
+            bool: True if the graph was built again, False if it is kept
+        """
+
+        self.file_index.refresh()
+        return self.load()
 
     def find_all_c_files(self, c_files_found: List[str]):
         """
         finds all c_files from the given root specified in path_to_dir
         """
-        
-        for root, _, files in os.walk(self.path_to_dir):
-            for filename in files:
-                full_path = os.path.join(root, filename)
-                if filename.endswith(".c"):
-                    c_files_found.append(full_path)
+
+        c_files_found.extend(path for path in self.file_index.find_by_extension(".c")
+                             if self.file_index.is_under_root(path))
 
     def _get_all_parents(self, tree: Node, node_name: str, output_parents: List[str]):
         """
         Helper function, appends all parents of a given node into output_parents
         """
 
-        if node_name in [node.name for node in tree.children]:
-            output_parents.append(tree.name)
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if node_name in [child.name for child in node.children]:
+                output_parents.append(node.name)
 
-        for child in tree.children:
-            self._get_all_parents(child, node_name, output_parents)
+            stack.extend(reversed(node.children))
 
     def get_all_parents(self, tree: Node, node_name: str):
         """Returns all parent of a given node
@@ -77,7 +152,7 @@ class ProjectGraph():
         """
 
         declared_parents = [parent for parent in self.get_all_parents(tree, FUNCTION_PREFIX + function_name + "/" + str(
-            serial_number)) if ProjectGraph.is_function_declared_in_file(parent, function_name)]
+            serial_number)) if function_name in self.get_file_record(parent)[3]]
         if len(declared_parents) == 0:
             raise Exception(
                 f"Function [{function_name}] implementation not found")
@@ -90,6 +165,7 @@ class ProjectGraph():
     def get_function_node(self, gca: Node, function_name: str, file_name: str) -> Node:
         """get a function node using the name of the function only.
         This is done by finding a node that has the specified name and there is a path from the file node to it.
+        The path is found with the reachability index of the includes (see is_function_reachable).
 
         Args:
             gca (Node): the tree to search on
@@ -99,13 +175,9 @@ class ProjectGraph():
         Returns:
             [Node]: the node found
         """
-        matching_functions = ProjectGraph.find_all_nodes_with_matching_prefix(
-            gca, function_name)
-        # this is very slow and can be optimized
-        G = nx.DiGraph()
-        self.to_nx_graph(gca, G)
-        for matching_func in matching_functions:
-            if self.is_path_exists(file_name, matching_func, G):
+
+        for matching_func in self.function_nodes.get(function_name, []):
+            if self.is_function_reachable(file_name, matching_func):
                 return matching_func
 
         if function_name in self.function_counter:
@@ -113,9 +185,26 @@ class ProjectGraph():
         else:
             self.function_counter[function_name] = 1
 
-        return ProjectGraph.get_function_as_node_name(function_name, self.function_counter[function_name])
+        function_node = ProjectGraph.get_function_as_node_name(function_name, self.function_counter[function_name])
+        self.function_nodes.setdefault(function_name, []).append(function_node)
 
-    def find_children_and_add(self, tree: Node, found: List[Node], gca: Node):
+        return function_node
+
+    def add_node(self, name: str, parent: Node) -> Node:
+        """Add a node to the tree and its edge to the live nx graph.
+
+        Args:
+            name (str): the name of the new node
+            parent (Node): the parent of the new node
+
+        Returns:
+            Node: the new tree node
+        """
+
+        self.g.add_edge(parent.name, name)
+        return Node(name, parent=parent)
+
+    def find_children_and_add(self, tree: Node, found: List[Node], gca: Node, files: List[Node]):
         """This function is used to build the graph. find all children from the static includes
         and use them as children in the graph.
 
@@ -123,26 +212,34 @@ class ProjectGraph():
             tree (Node): the subtree to add to
             found (List[Node]): list of files there were already found by the algorithm (and their order)
             gca (Node): the root of the tree
+            files (List[Node]): output the file nodes added, every file after the files it includes (see add_functions)
         """
         found.add(tree.name)
-        static = self.find_all_includes(tree.name)
+        static, _, _, _ = self.get_file_record(tree.name)
 
         for child in static:
-            Node(self.find_full_path(child), parent=tree)
+            self.add_node(self.find_full_path(child, tree.name), tree)
 
         for child_node in tree.children:
             if child_node.name not in found and not child_node.name.startswith(FUNCTION_PREFIX):
-                self.find_children_and_add(child_node, found, gca)
+                self.find_children_and_add(child_node, found, gca, files)
 
         if tree.name != "START":
-            full_name = self.find_full_path(tree.name)
-            with open(full_name, "r") as fd:
-                data = fd.read()
-                functions = self.get_all_functions(data)
-                for function in functions:
-                    function_node = self.get_function_node(
-                        gca, function, full_name)
-                    Node(function_node, parent=tree)
+            files.append(tree)
+
+    def add_functions(self, tree: Node, gca: Node):
+        """Add the function nodes of a file to the graph, after all the includes are in the graph.
+
+        Args:
+            tree (Node): the node of the file
+            gca (Node): the root of the tree
+        """
+
+        full_name = self.find_full_path(tree.name)
+        _, _, functions, _ = self.get_file_record(tree.name)
+        for function in functions:
+            function_node = self.get_function_node(gca, function, full_name)
+            self.add_node(function_node, tree)
 
     def to_nx_graph(self, node: Node, G):
         """Covnert the graph to nx graph (to run complex tree algorithms already implemented in nx graph).
@@ -151,11 +248,13 @@ class ProjectGraph():
             node (Node): root to convert from
             G ([type]): output nx graph
         """
-        G.add_nodes_from([x.name for x in node.children])
-        G.add_edges_from([(node.name, child.name) for child in node.children])
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            G.add_nodes_from([x.name for x in node.children])
+            G.add_edges_from([(node.name, child.name) for child in node.children])
 
-        for child in node.children:
-            self.to_nx_graph(child, G)
+            stack.extend(reversed(node.children))
 
     def generate_graph(self):
         """generate the graph of includes from a given start file (self.path_to_main).
@@ -163,31 +262,107 @@ class ProjectGraph():
         Returns:
             [Tuple[Node, nx.DiGraph]]: [a graph representation of the includes, same graph as nx graph]
         """
+        # read every file of the project once (in parallel), building the graph is then a merge of the records
+        self.scan_files([path for extension in [".c", ".h"]
+                         for path in self.file_index.find_by_extension(extension)])
+
         gca = Node("START")
-        my_node = Node(self.path_to_main, gca)
+        my_node = self.add_node(self.path_to_main, gca)
         found = set()
-        self.find_children_and_add(my_node, found, gca)
+        files = []
+        self.find_children_and_add(my_node, found, gca, files)
 
         c_files = []
         self.find_all_c_files(c_files)
         c_files.remove(self.path_to_main)
 
         for filename in c_files:
-            c_node = Node(filename, gca)
-            self.find_children_and_add(c_node, found, gca)
+            c_node = self.add_node(filename, gca)
+            self.find_children_and_add(c_node, found, gca, files)
 
-        DotExporter(gca).to_picture("my_includes.png")
-        G = nx.DiGraph()
-        self.to_nx_graph(gca, G)
+        # the functions of a file are matched to the ones of the files it can reach, so the includes are indexed first.
+        # function nodes are only added below files, the same index is used to find them (see is_function_reachable)
+        self.reachability = ReachabilityIndex(self.g)
+        for file_node in files:
+            self.add_functions(file_node, gca)
+
+        return self.g, gca
+
+    def scan_files(self, filenames: List[str]):
+        """Scan files for their includes and functions, using self.jobs processes.
+        Every file is read once, its stat (for the project index) is taken from the same read.
+        Files that can't be read are skipped here, they fail only if the graph reaches them.
+
+        Args:
+            filenames (List[str]): full paths of the files to scan
+        """
+
+        filenames = [filename for filename in filenames if filename not in self.file_records]
+
+        with stats.timer("scan_files"):
+            if self.jobs > 1:
+                with ProcessPoolExecutor(self.jobs) as executor:
+                    chunksize = max(1, len(filenames) // (self.jobs * 4))
+                    results = list(executor.map(scan_file, filenames, chunksize=chunksize))
+            else:
+                results = [scan_file(filename) for filename in filenames]
+
+        for filename, result in zip(filenames, results):
+            if result is not None:
+                self.add_file_record(filename, *result)
+                stats.count("files_read")
+
+    def add_file_record(self, filename: str, stat: Tuple[int, int, str], record: tuple):
+        """Keep the record of a scanned file, and its stat if the project index is used.
+
+        Args:
+            filename (str): the full path of the file
+            stat (Tuple[int, int, str]): (size, mtime, sha) of the file when it was scanned
+            record (tuple): the record of the file (see get_file_record)
+        """
 
-        return G, gca
+        self.file_records[filename] = record
+        if self.project_index is not None:
+            self.file_stats[filename] = stat
 
-    def find_full_path(self, filename: str):
-        """find the full path of a filename.
-        This is not a great way to do it since it assumes the file names are uniqe.
+    def get_file_record(self, filename: str) -> Tuple[List[str], List[str], List[str], Dict[str, int]]:
+        """Get the includes and functions of a file, scan it if it wasn't scanned yet.
+
+        Args:
+            filename (str): the full path of the file
+
+        Returns:
+            Tuple[List[str], List[str], List[str], Dict[str, int]]: static includes, dynamic includes,
+                functions (declared or defined) and the line of every function defined in the file
+        """
+
+        if filename not in self.file_records:
+            self.add_file_record(filename, *read_and_scan(filename))
+            stats.count("files_read")
+
+        return self.file_records[filename]
+
+    def export(self, path: str, sources: List[str] = None, depth: int = None):
+        """Write the include graph to a file (.dot, .json or .graphml), see GraphExporter.
+
+        Args:
+            path (str): the output file
+            sources (List[str], optional): export only what is reachable from these files. Defaults to None.
+            depth (int, optional): export only nodes up to this number of edges from the sources. Defaults to None.
+        """
+
+        if sources is not None:
+            sources = [self.find_full_path(source) for source in sources]
+
+        GraphExporter(self.g).export(path, sources, depth)
+
+    def find_full_path(self, filename: str, including_file: str = None):
+        """find the full path of a filename using the project file index.
+        When a few files share the same name, the include is resolved relative to the including file and the include paths.
 
         Args:
             filename (str): The name of the file
+            including_file (str, optional): the file that includes filename. Defaults to None.
 
         Raises:
             Exception: if file can't be found
@@ -195,13 +370,7 @@ class ProjectGraph():
         Returns:
             [str]: file full path
         """
-        filename = filename.split("/")[-1]
-        for root, _, files in os.walk(self.path_to_dir):
-            for file_n in files:
-                if file_n == filename:
-                    return os.path.join(root, filename)
-
-        raise Exception(f"{filename} not found")
+        return self.file_index.resolve(filename, including_file)
 
     def is_path_exists_to_function(self, filename: str, dest_function: str):
         """is there a path from a file node specified to a function node specified.
@@ -214,12 +383,42 @@ class ProjectGraph():
             bool: True if such path exist and False otherwise
         """
 
-        for function_index in range(1, self.function_counter[dest_function] + 1):
-            if self.is_path_exists(filename, ProjectGraph.get_function_as_node_name(dest_function, function_index), self.g):
-                return True, function_index
+        reachable = self.get_reachable_functions(filename, dest_function)
+        if reachable:
+            return True, reachable[0]
 
         return False, 0
 
+    def get_reachable_functions(self, filename: str, function_name: str) -> List[int]:
+        """Get every definition of a function name that can be reached from a file (using the reachability index).
+
+        Args:
+            filename (str): the name of the file to search from
+            function_name (str): the name of the function
+
+        Returns:
+            List[int]: the serial numbers of all the reachable function nodes, ordered
+        """
+
+        return [serial_number for serial_number in range(1, self.function_counter.get(function_name, 0) + 1)
+                if self.is_function_reachable(filename, ProjectGraph.get_function_as_node_name(function_name, serial_number))]
+
+    def is_function_reachable(self, filename: str, function_node: str) -> bool:
+        """Checks whether there is a path from a file to a function node.
+        Function nodes have no children, so a function node is reachable if one of the files it is in is reachable
+        (the reachability index covers the includes only).
+
+        Args:
+            filename (str): the name of the file to search from
+            function_node (str): the name of the function node
+
+        Returns:
+            bool: True if such path exists, False otherwise
+        """
+
+        return function_node in self.g and any(self.reachability.is_reachable(filename, parent)
+                                               for parent in self.g.predecessors(function_node))
+
     @staticmethod
     def get_function_as_node_name(function_name: str, serial_number: int) -> str:
         """Given a function. it node name deffers from the function name.
@@ -264,30 +463,7 @@ class ProjectGraph():
             [List[str]]: names of functions found
         """
 
-        regex = r"(\w+\s)+(\w+)\(.*\)"
-        new_data = re.findall(regex, data)
-
-        return [tup[1] for tup in new_data]
-
-    @staticmethod
-    def is_function_declared_in_file(file_name: str, function_name: str) -> bool:
-        """Checks whether a funciton is declared (implemented) in a file.
-
-        Args:
-            file_name (str): name of the file to check
-            function_name (str): the name of the function
-
-        Returns:
-            [bool]: True if declared, False otherwise
-        """
-
-        with open(file_name, "r") as fd:
-            content = fd.read()
-
-        regex = function_name + "\(.*\)\s*\{"
-        matches = re.findall(regex, content)
-
-        return matches != []
+        return scan_source(data)[2]
 
     @staticmethod
     def remove_static_includes(data: str) -> str:
@@ -396,6 +572,22 @@ class ProjectGraph():
         """
 
         return nx.has_path(graph, source, dest)
+
+
+def scan_file(filename: str) -> Tuple[Tuple[int, int, str], tuple]:
+    """Scan a file for ProjectGraph.scan_files (this runs in the worker processes).
+
+    Args:
+        filename (str): the full path of the file
+
+    Returns:
+        Tuple[Tuple[int, int, str], tuple]: (size, mtime, sha) and the record of the file, None if it can't be read
+    """
+
+    try:
+        return read_and_scan(filename)
+    except (OSError, UnicodeDecodeError):
+        return None
     
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+import hashlib
+import os
+import pickle
+import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from utils.stats import stats
+
+
+# GNU extensions used by system headers that pycparser can't parse, they are defined away when no fake libc headers are given
+GNU_DEFINES = ["__attribute__(x)=", "__extension__=", "__restrict=", "__restrict__=", "__inline=", "__inline__=",
+               "__asm__(x)=", "__asm(x)=", "__builtin_va_list=int", "__volatile__="]
+
+# cpp line markers, for example: # 12 "libavcodec/h264dec.h" 2
+LINE_MARKER_REGEX = re.compile(r'^# \d+ "([^"<]+)"', re.MULTILINE)
+
+
+class Preprocessor():
+    """Runs the C preprocessor on translation units and caches its output.
+
+    The output of a file is cached by (file sha, include paths and defines), together with the sha of every header cpp read for it.
+    A cached output is used only if none of those headers changed. When cache_dir is given, the outputs are also kept in it between runs.
+    When fake_libc_dir is given, the system headers are replaced by the (pycparser friendly) headers in it.
+    """
+
+    def __init__(self, include_paths: List[str] = None, defines: List[str] = None, cache_dir: str = None,
+                 fake_libc_dir: str = None, cpp_path: str = "cpp"):
+        self.include_paths = list(include_paths or [])
+        self.defines = list(defines or [])
+        self.cache_dir = cache_dir
+        self.fake_libc_dir = fake_libc_dir
+        self.cpp_path = cpp_path
+        self.entries = dict()
+        self.digests = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # only the settings are sent to worker processes, not the outputs kept in memory
+        state = self.__dict__.copy()
+        state["entries"] = dict()
+        state["digests"] = dict()
+        return state
+
+    def get_args(self) -> List[str]:
+        """Get the arguments cpp is run with (without the file name).
+
+        Returns:
+            List[str]: the arguments
+        """
+
+        args = ["-E"]
+        if self.fake_libc_dir is not None:
+            args += ["-nostdinc", "-I" + self.fake_libc_dir]
+        else:
+            args += ["-D" + define for define in GNU_DEFINES]
+
+        args += ["-I" + path for path in self.include_paths]
+        args += ["-D" + define for define in self.defines]
+        return args
+
+    def get_sha(self, filename: str) -> str:
+        """Get the sha of a file. It is computed again only if the size or mtime of the file changed.
+
+        Args:
+            filename (str): path of the file
+
+        Returns:
+            str: the sha of the content of the file
+        """
+
+        stat = os.stat(filename)
+        stat_key = (filename, stat.st_size, stat.st_mtime_ns)
+
+        if stat_key not in self.digests:
+            with open(filename, "rb") as fd:
+                self.digests[stat_key] = hashlib.sha1(fd.read()).hexdigest()
+
+        return self.digests[stat_key]
+
+    def get_key(self, filename: str) -> str:
+        """Get the cache key of a file: its path, its sha and the arguments of cpp.
+
+        Args:
+            filename (str): path of the file
+
+        Returns:
+            str: the key
+        """
+
+        path = os.path.abspath(filename)
+        return hashlib.sha1(f"{path}:{self.get_sha(path)}:{self.cpp_path}:{' '.join(self.get_args())}".encode()).hexdigest()
+
+    def preprocess(self, filename: str) -> str:
+        """Preprocess a file, or return its cached output if the file and the headers it includes did not change.
+
+        Args:
+            filename (str): path of the file
+
+        Raises:
+            Exception: if cpp fails
+
+        Returns:
+            str: the preprocessed text
+        """
+
+        return self.get_entry(filename)[1][1]
+
+    def get_entry(self, filename: str) -> Tuple[str, Tuple[Dict[str, str], str]]:
+        """Get the cache entry of a file, preprocessing it if there is no valid one.
+
+        Args:
+            filename (str): path of the file
+
+        Raises:
+            Exception: if cpp fails
+
+        Returns:
+            Tuple[str, Tuple[Dict[str, str], str]]: the key, and the entry: (sha of every included header, preprocessed text)
+        """
+
+        key = self.get_key(filename)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.load_from_disk(key)
+
+        if entry is not None and self.is_valid(entry):
+            self.hits += 1
+            stats.count("cpp_cache_hits")
+            self.entries[key] = entry
+            return key, entry
+
+        self.misses += 1
+        path = os.path.abspath(filename)
+        with stats.timer("cpp"):
+            output = self.run_cpp(path)
+        headers = {os.path.abspath(header) for header in LINE_MARKER_REGEX.findall(output)} - {path}
+        entry = ({header: self.get_sha(header) for header in sorted(headers) if os.path.isfile(header)}, output)
+
+        self.entries[key] = entry
+        self.save_to_disk(key, entry)
+        return key, entry
+
+    def preprocess_files(self, filenames: List[str], jobs: int):
+        """Preprocess files in a pool of processes and keep their outputs, so preprocess finds them in the cache.
+        Files that cpp fails on are skipped (preprocess raises the error if one of them is needed).
+
+        Args:
+            filenames (List[str]): paths of the files
+            jobs (int): number of processes
+        """
+
+        with ProcessPoolExecutor(jobs) as executor:
+            chunksize = max(1, len(filenames) // (jobs * 4))
+            for result in executor.map(preprocess_in_worker, [self] * len(filenames), filenames, chunksize=chunksize):
+                if result is not None:
+                    key, entry = result
+                    self.entries[key] = entry
+
+    def is_valid(self, entry: Tuple[Dict[str, str], str]) -> bool:
+        """Check that none of the headers a cached output was made from changed.
+
+        Args:
+            entry (Tuple[Dict[str, str], str]): the cache entry
+
+        Returns:
+            bool: True if the output can be used
+        """
+
+        try:
+            return all(self.get_sha(header) == sha for header, sha in entry[0].items())
+        except OSError:
+            return False
+
+    def run_cpp(self, filename: str) -> str:
+        """Run cpp on a file.
+
+        Args:
+            filename (str): path of the file
+
+        Raises:
+            Exception: if cpp fails
+
+        Returns:
+            str: the preprocessed text
+        """
+
+        result = subprocess.run([self.cpp_path] + self.get_args() + [filename], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"cpp failed on {filename}: {result.stderr.strip()}")
+
+        return result.stdout
+
+    def get_disk_path(self, key: str) -> str:
+        """Get the path of the entry of a file in the on-disk cache."""
+
+        return os.path.join(self.cache_dir, key + ".cpp.pickle")
+
+    def load_from_disk(self, key: str) -> Tuple[Dict[str, str], str]:
+        """Load a cache entry from the on-disk cache.
+
+        Args:
+            key (str): the key of the file
+
+        Returns:
+            Tuple[Dict[str, str], str]: the entry if found, None otherwise
+        """
+
+        if self.cache_dir is None:
+            return None
+
+        try:
+            with open(self.get_disk_path(key), "rb") as fd:
+                return pickle.load(fd)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def save_to_disk(self, key: str, entry: Tuple[Dict[str, str], str]):
+        """Save a cache entry into the on-disk cache.
+
+        Args:
+            key (str): the key of the file
+            entry (Tuple[Dict[str, str], str]): the entry
+        """
+
+        if self.cache_dir is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        disk_path = self.get_disk_path(key)
+
+        # write and rename, so a concurrent run never reads half an entry
+        temp_path = f"{disk_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as fd:
+            pickle.dump(entry, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, disk_path)
+
+
+def preprocess_in_worker(preprocessor: Preprocessor, filename: str) -> Tuple[str, Tuple[Dict[str, str], str]]:
+    """Preprocess a file in a worker process of Preprocessor.preprocess_files.
+
+    Args:
+        preprocessor (Preprocessor): the preprocessor (its settings and on-disk cache)
+        filename (str): path of the file
+
+    Returns:
+        Tuple[str, Tuple[Dict[str, str], str]]: the key and the cache entry, None if cpp failed
+    """
+
+    try:
+        return preprocessor.get_entry(filename)
+    except Exception:
+        return None
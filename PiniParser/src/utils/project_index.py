@@ -0,0 +1,150 @@
+import hashlib
+import os
+import pickle
+from typing import Dict, List, Tuple
+
+
+# bump when the saved state changes, older indexes are then ignored
+INDEX_VERSION = 3
+
+
+class ProjectIndex():
+    """The include graph of a project and the records it was built from, saved on disk between runs.
+
+    Every file record (its includes and functions) is saved with the size, mtime and sha of the file.
+    A record is used again as long as the file did not change, a file whose mtime changed but its content didn't is not scanned again.
+    When no file was added or removed and the records are the same (the files that changed are scanned again,
+    an edit that changes no include or function keeps the record), the graph itself is loaded instead of being built.
+    Without index_dir the index is only kept in memory, to build the graph again when files change (see ProjectGraph.refresh).
+    """
+
+    def __init__(self, index_dir: str, main_path: str, path_to_dir: str, include_paths: List[str] = None):
+        self.index_dir = index_dir
+        self.path = None
+        if index_dir is not None:
+            name = hashlib.sha1(f"{main_path}:{path_to_dir}:{include_paths or []}".encode()).hexdigest()
+            self.path = os.path.join(index_dir, name + ".pickle")
+        self.state = self.load()
+
+    def load(self) -> dict:
+        """Load the saved index.
+
+        Returns:
+            dict: the saved state, an empty state if there is no index (or it can't be read)
+        """
+
+        if self.path is None:
+            return dict()
+
+        try:
+            with open(self.path, "rb") as fd:
+                state = pickle.load(fd)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return dict()
+
+        if state.get("version") != INDEX_VERSION:
+            return dict()
+
+        return state
+
+    def save(self, files: List[str], file_stats: Dict[str, Tuple[int, int, str]], file_records: Dict[str, tuple], graph: tuple):
+        """Save the index.
+
+        Args:
+            files (List[str]): all the files of the project, in the order they were walked
+            file_stats (Dict[str, Tuple[int, int, str]]): (size, mtime, sha) of every scanned file
+            file_records (Dict[str, tuple]): the record of every scanned file
+            graph (tuple): the built graph
+        """
+
+        self.state = {"version": INDEX_VERSION, "files": files, "stats": file_stats,
+                      "records": file_records, "graph": graph}
+        if self.path is None:
+            return
+
+        try:
+            data = pickle.dumps(self.state, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        # write and rename, so a concurrent run never reads half an index
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as fd:
+            fd.write(data)
+        os.replace(temp_path, self.path)
+
+    def get_unchanged_records(self) -> Tuple[Dict[str, Tuple[int, int, str]], Dict[str, tuple]]:
+        """Get the saved records of the files that did not change since the index was saved.
+
+        Returns:
+            Tuple[Dict[str, Tuple[int, int, str]], Dict[str, tuple]]: the stats and the records of the unchanged files
+        """
+
+        file_stats = dict()
+        file_records = dict()
+        for filename, saved_stat in self.state.get("stats", dict()).items():
+            if filename not in self.state["records"]:
+                # the file could not be read last time
+                continue
+
+            try:
+                stat = ProjectIndex.get_stat(filename, saved_stat)
+            except OSError:
+                continue
+
+            if stat[2] == saved_stat[2]:
+                file_stats[filename] = stat
+                file_records[filename] = self.state["records"][filename]
+
+        return file_stats, file_records
+
+    def get_changed_files(self, file_records: Dict[str, tuple]) -> List[str]:
+        """Get the files that have a saved record, but not an unchanged one.
+
+        Args:
+            file_records (Dict[str, tuple]): the records of the unchanged files
+
+        Returns:
+            List[str]: the files to scan again
+        """
+
+        return [filename for filename in self.state.get("records", dict()) if filename not in file_records]
+
+    def get_graph(self, files: List[str], file_records: Dict[str, tuple]) -> tuple:
+        """Get the saved graph, if it would be built the same now.
+
+        Args:
+            files (List[str]): all the files of the project, in the order they were walked
+            file_records (Dict[str, tuple]): the records of the files, the changed files scanned again
+
+        Returns:
+            tuple: the saved graph, None if a file was added or removed, or if the includes or functions of a file changed
+        """
+
+        if "graph" not in self.state or files != self.state["files"]:
+            return None
+
+        if file_records != self.state["records"]:
+            return None
+
+        return self.state["graph"]
+
+    @staticmethod
+    def get_stat(filename: str, saved_stat: Tuple[int, int, str] = None) -> Tuple[int, int, str]:
+        """Get the (size, mtime, sha) of a file. The sha is taken from the saved stat if the size and mtime didn't change.
+
+        Args:
+            filename (str): path of the file
+            saved_stat (Tuple[int, int, str], optional): the stat saved for the file. Defaults to None.
+
+        Returns:
+            Tuple[int, int, str]: (size, mtime, sha)
+        """
+
+        stat = os.stat(filename)
+        if saved_stat is not None and saved_stat[:2] == (stat.st_size, stat.st_mtime_ns):
+            return saved_stat
+
+        with open(filename, "rb") as fd:
+            return stat.st_size, stat.st_mtime_ns, hashlib.sha1(fd.read()).hexdigest()
@@ -0,0 +1,68 @@
+import networkx as nx
+from typing import Hashable, Iterable, List
+
+
+class ReachabilityIndex():
+    """Precomputed transitive closure of a directed graph.
+
+    The graph is condensed into a DAG of strongly connected components (so include cycles are handled),
+    and every component gets a bitset (a python int) of all the components reachable from it.
+    After the index is built, "is there a path from a to b" is a single bit test instead of a graph traversal.
+    """
+
+    def __init__(self, graph: nx.DiGraph):
+        self.component_of = dict()
+        self.reach = []
+        self.build(graph)
+
+    def build(self, graph: nx.DiGraph):
+        """Build the index over the given graph. Building again discards the previous index.
+
+        Args:
+            graph (nx.DiGraph): the graph to index
+        """
+
+        condensed = nx.condensation(graph)
+        self.component_of = condensed.graph["mapping"]
+        self.reach = [0] * condensed.number_of_nodes()
+
+        # successors are always done before their predecessors in reversed topological order
+        for component in reversed(list(nx.topological_sort(condensed))):
+            bits = 1 << component
+            for successor in condensed.successors(component):
+                bits |= self.reach[successor]
+            self.reach[component] = bits
+
+    def is_reachable(self, source: Hashable, dest: Hashable) -> bool:
+        """Checks whether there exist a path from source to dest.
+
+        Args:
+            source (Hashable): source node
+            dest (Hashable): destination node
+
+        Returns:
+            bool: True if such path exists, False otherwise (or if one of the nodes is not in the graph)
+        """
+
+        if source not in self.component_of or dest not in self.component_of:
+            return False
+
+        return (self.reach[self.component_of[source]] >> self.component_of[dest]) & 1 == 1
+
+    def reachable_from(self, source: Hashable, candidates: Iterable[Hashable]) -> List[Hashable]:
+        """Filter the candidates that can be reached from source (bulk version of is_reachable).
+
+        Args:
+            source (Hashable): source node
+            candidates (Iterable[Hashable]): nodes to check
+
+        Returns:
+            List[Hashable]: the candidates reachable from source, in the order they were given
+        """
+
+        if source not in self.component_of:
+            return []
+
+        bits = self.reach[self.component_of[source]]
+        return [candidate for candidate in candidates
+                if candidate in self.component_of and (bits >> self.component_of[candidate]) & 1]
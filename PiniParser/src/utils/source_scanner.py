@@ -0,0 +1,150 @@
+import hashlib
+import os
+import re
+from typing import Dict, Iterator, List, Tuple
+
+
+INCLUDE = "include"
+SYSTEM_INCLUDE = "system_include"
+DECLARATION = "declaration"
+DEFINITION = "definition"
+# a definition that is not one of the functions of the file (the include graph has no node for it there)
+BODY_ONLY_DEFINITION = "body_only_definition"
+
+# the file is split into tokens by one pattern, none of its alternatives can backtrack so tokenizing is linear in the size of the file.
+# comments and strings are single tokens, so nothing inside them is taken for an include or a function.
+TOKEN_REGEX = re.compile(r'(?P<comment>/\*.*?(?:\*/|\Z)|//[^\n]*)'
+                         r'|(?P<string>"[^"\\\n]*(?:\\.[^"\\\n]*)*"?|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\'?)'
+                         r'|#include[ \t]*(?:"(?P<include>[^"\n]*)"|<(?P<system_include>[^>\n]*)>)'
+                         r'|(?P<word>\w+)'
+                         r'|(?P<punctuation>[(){]|[^\w\s(){"\'/#]+|[^\w\s])', re.DOTALL)
+
+
+def tokenize(data: str) -> Tuple[List[Tuple[str, str, int, int, int]], Dict[int, int], Dict[int, int]]:
+    """Split a file into tokens (comments are dropped).
+
+    Args:
+        data (str): content of the file
+
+    Returns:
+        Tuple[List[Tuple[str, str, int, int, int]], Dict[int, int], Dict[int, int]]: the tokens as (kind, text, start, end, line),
+            and by line, the offset of the last ) and the offset of the last ) that is followed by {
+    """
+
+    tokens = []
+    last_close = dict()
+    last_body_close = dict()
+    previous_close = None
+    line = 1
+    position = 0
+    for match in TOKEN_REGEX.finditer(data):
+        kind = match.lastgroup
+        start = match.start()
+        line += data.count("\n", position, start)
+        position = start
+        if kind == "comment":
+            continue
+
+        text = match.group(kind)
+        if previous_close is not None and text == "{":
+            last_body_close[previous_close[0]] = previous_close[1]
+
+        previous_close = None
+        if text == ")":
+            last_close[line] = start
+            previous_close = (line, start)
+
+        tokens.append((kind, text, start, match.end(), line))
+
+    return tokens, last_close, last_body_close
+
+
+def scan_tokens(data: str) -> Iterator[Tuple[str, str, int]]:
+    """Find the includes and the functions of a file, in the order they appear. This is linear in the size of the file.
+
+    A function is a name right after another word (with a single whitespace between them), followed by ( and with a ) later on the line.
+    It is a definition if one of the ) later on its line is followed by {, the rest of the line is then part of the signature.
+    Any other name followed by ( that is a definition by the same rule (for example a function returning a pointer) is a definition only.
+
+    Args:
+        data (str): content of the file
+
+    Yields:
+        Tuple[str, str, int]: (kind, name, line), kind is one of INCLUDE, SYSTEM_INCLUDE, DECLARATION, DEFINITION or BODY_ONLY_DEFINITION
+    """
+
+    tokens, last_close, last_body_close = tokenize(data)
+
+    signature_line = 0
+    for index, (kind, text, start, end, line) in enumerate(tokens):
+        if kind == INCLUDE or kind == SYSTEM_INCLUDE:
+            yield kind, text, line
+            continue
+
+        if kind != "word" or line == signature_line or index + 1 == len(tokens):
+            continue
+
+        _, next_text, next_start, _, _ = tokens[index + 1]
+        if next_text != "(" or next_start != end:
+            continue
+
+        has_close = last_close.get(line, -1) > next_start
+        has_body = last_body_close.get(line, -1) > next_start
+
+        previous_kind, _, _, previous_end, _ = tokens[index - 1] if index > 0 else (None, None, 0, 0, 0)
+        after_word = previous_kind == "word" and start - previous_end == 1 and data[previous_end].isspace()
+
+        if after_word and has_close:
+            yield DEFINITION if has_body else DECLARATION, text, line
+            signature_line = line
+        elif has_body:
+            yield BODY_ONLY_DEFINITION, text, line
+
+
+def scan_source(data: str) -> Tuple[List[str], List[str], List[str], Dict[str, int]]:
+    """Get the record of a file: its includes, the functions it mentions and the functions it defines.
+
+    Args:
+        data (str): content of the file
+
+    Returns:
+        Tuple[List[str], List[str], List[str], Dict[str, int]]: static includes, dynamic includes,
+            functions (declared or defined) and the line of every function defined in the file
+    """
+
+    static, dynamic, functions, definitions = [], [], [], dict()
+    for kind, name, line in scan_tokens(data):
+        if kind == INCLUDE:
+            static.append(name)
+        elif kind == SYSTEM_INCLUDE:
+            dynamic.append(name)
+        elif kind == BODY_ONLY_DEFINITION:
+            definitions.setdefault(name, line)
+        else:
+            functions.append(name)
+            if kind == DEFINITION:
+                definitions.setdefault(name, line)
+
+    return static, dynamic, functions, definitions
+
+
+def read_and_scan(filename: str) -> Tuple[Tuple[int, int, str], Tuple[List[str], List[str], List[str], Dict[str, int]]]:
+    """Read a file once, and get both its stat and its record.
+
+    Args:
+        filename (str): path of the file
+
+    Raises:
+        OSError: if the file can't be read
+        UnicodeDecodeError: if the file is not text
+
+    Returns:
+        Tuple[Tuple[int, int, str], tuple]: (size, mtime, sha) of the file, and its record (see scan_source)
+    """
+
+    with open(filename, "rb") as fd:
+        stat = os.fstat(fd.fileno())
+        data = fd.read()
+
+    stat = (stat.st_size, stat.st_mtime_ns, hashlib.sha1(data).hexdigest())
+    return stat, scan_source(data.decode().replace("\r\n", "\n"))
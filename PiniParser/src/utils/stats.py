@@ -0,0 +1,127 @@
+import contextlib
+import cProfile
+import json
+import time
+from typing import ContextManager, Dict, Iterator
+
+
+class PhaseTimer():
+    """Adds the time spent inside a with block to a timer of Stats."""
+
+    def __init__(self, timers: Dict[str, list], name: str):
+        self.timers = timers
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timer = self.timers.get(self.name)
+        if timer is None:
+            timer = self.timers[self.name] = [0.0, 0]
+        timer[0] += time.perf_counter() - self.start
+        timer[1] += 1
+        return False
+
+
+# the timer returned while disabled, it does nothing (and can be entered any number of times)
+NULL_TIMER = contextlib.nullcontext()
+
+
+class Stats():
+    """Timers and counters of a run, for finding where the time of a run over a big project goes.
+
+    Nothing is recorded unless enabled. Callers on hot paths check stats.enabled before counting,
+    so a disabled Stats costs one attribute lookup per call.
+    A timer adds up the time of all the blocks it timed, timers can be nested (the time of a nested block is in both).
+    Timers and counters of worker processes (jobs > 1) are not recorded.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = dict()
+        self.timers = dict()
+
+    def reset(self):
+        """Drop everything recorded so far."""
+
+        self.counters = dict()
+        self.timers = dict()
+
+    def count(self, name: str, amount: int = 1):
+        """Add to a counter.
+
+        Args:
+            name (str): the counter
+            amount (int, optional): the amount to add. Defaults to 1.
+        """
+
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timer(self, name: str) -> ContextManager:
+        """Get a timer for a with block.
+
+        Args:
+            name (str): the timer
+
+        Returns:
+            ContextManager: adds the time spent in the block to the timer
+        """
+
+        if not self.enabled:
+            return NULL_TIMER
+
+        return PhaseTimer(self.timers, name)
+
+    def to_dict(self) -> dict:
+        """Get the timers (seconds and number of blocks timed) and the counters.
+
+        Returns:
+            dict: {"timers": {name: {"seconds": float, "calls": int}}, "counters": {name: int}}
+        """
+
+        return {"timers": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in sorted(self.timers.items())},
+                "counters": dict(sorted(self.counters.items()))}
+
+    def dump(self, path: str):
+        """Write the timers and counters to a json file.
+
+        Args:
+            path (str): path of the file
+        """
+
+        with open(path, "w") as fd:
+            json.dump(self.to_dict(), fd, indent=4)
+
+
+@contextlib.contextmanager
+def collect(stats_path: str = None, profile_path: str = None) -> Iterator[None]:
+    """Record a run (the body of the with block) and write what was recorded when it ends, even if it fails or is interrupted.
+
+    Args:
+        stats_path (str, optional): enable stats and write them to this json file. Defaults to None.
+        profile_path (str, optional): run cProfile and write its output to this file (read it with pstats). Defaults to None.
+    """
+
+    profiler = None
+    if stats_path is not None:
+        stats.enabled = True
+    if profile_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with stats.timer("total"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if stats_path is not None:
+            stats.dump(stats_path)
+
+
+stats = Stats()
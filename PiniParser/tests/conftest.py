@@ -0,0 +1,54 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+from pycparser import c_parser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from function_summary import FunctionSummaries
+from pini_parser import PiniParser
+
+
+def parse_source(source, marked=None, parser_type: type = PiniParser, summaries: FunctionSummaries = None) -> PiniParser:
+    """Parse a source of test.c (or its already parsed tree), starting from main's x unless other marks are given.
+
+    Args:
+        source (str | c_ast.Node | FlatAst): the source, or its syntax tree
+        marked (optional): the marks to start from. Defaults to {"test.c@main@x"}.
+        parser_type (type, optional): the parser class. Defaults to PiniParser.
+        summaries (FunctionSummaries, optional): the summaries to use. Defaults to new ones.
+
+    Returns:
+        PiniParser: the parser, after the parse
+    """
+
+    tree = c_parser.CParser().parse(source, "test.c") if isinstance(source, str) else source
+    with tempfile.TemporaryDirectory() as log_dir:
+        parser = parser_type(marked or {"test.c@main@x"}, filename="test.c", summaries=summaries,
+                             debug_file=os.path.join(log_dir, "functions_not_found.log"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser.parse(tree, "")
+
+    return parser
+
+
+@contextlib.contextmanager
+def project_dir():
+    """Work in a new project directory with an output directory, without printing.
+
+    Yields:
+        str: the project directory
+    """
+
+    with tempfile.TemporaryDirectory() as root:
+        cwd = os.getcwd()
+        os.makedirs(os.path.join(root, "output"))
+        os.chdir(root)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield root
+        finally:
+            os.chdir(cwd)
@@ -0,0 +1,106 @@
+import random
+
+from typing import List, Tuple
+
+
+class SourceGenerator():
+    """Generate random (but deterministic for a seed) C programs, to compare analyses on more than a few hand written sources.
+
+    The programs have globals, functions calling the functions defined after them (or any function, when recursive),
+    nested calls in arguments, conditions, loops and returns. main declares x and y, so they can be used as seeds.
+    """
+
+    def __init__(self, seed: int, recursive: bool = False):
+        self.random = random.Random(seed)
+        self.recursive = recursive
+        self.counter = 0
+
+    def generate(self) -> str:
+        """Generate a program.
+
+        Returns:
+            str: the source of the program
+        """
+
+        globals_names = [f"g{index}" for index in range(self.random.randint(0, 3))]
+        functions = [(f"f{index}", self.random.randint(0, 3)) for index in range(self.random.randint(2, 5))]
+        lines = [f"int {name};" for name in globals_names]
+
+        for index, (function_name, params_count) in enumerate(functions):
+            params = [f"p{param_index}" for param_index in range(params_count)]
+            lines.append(f"int {function_name}({', '.join('int ' + param for param in params)})")
+            lines.append("{")
+            self.block(params + globals_names, functions if self.recursive else functions[index + 1:], 0, lines)
+            lines.append(f"    return {self.expression(params + globals_names, [])};")
+            lines.append("}")
+
+        lines += ["int main()", "{", "    int x = 1;", "    int y = 2;"]
+        self.block(["x", "y"] + globals_names, functions, 0, lines)
+        lines += ["    return 0;", "}"]
+
+        return "\n".join(lines) + "\n"
+
+    def expression(self, variables: List[str], functions: List[Tuple[str, int]], depth: int = 0) -> str:
+        choice = self.random.random()
+        if depth < 2 and functions and choice < 0.25:
+            function_name, params_count = self.random.choice(functions)
+            args = ", ".join(self.expression(variables, functions, depth + 1) for _ in range(params_count))
+            return f"{function_name}({args})"
+        if depth < 2 and choice < 0.55:
+            return f"{self.expression(variables, functions, depth + 1)} {self.random.choice('+-*<')} " \
+                   f"{self.expression(variables, functions, depth + 1)}"
+        if variables and choice < 0.9:
+            return self.random.choice(variables)
+        return str(self.random.randint(0, 9))
+
+    def block(self, variables: List[str], functions: List[Tuple[str, int]], depth: int, lines: List[str]):
+        variables = list(variables)
+        indent = "    " * (depth + 1)
+        for _ in range(self.random.randint(1, 5)):
+            choice = self.random.random()
+            if choice < 0.3:
+                name = self.new_name("v")
+                lines.append(f"{indent}int {name} = {self.expression(variables, functions)};")
+                variables.append(name)
+            elif choice < 0.5 and variables:
+                lines.append(f"{indent}{self.random.choice(variables)} = {self.expression(variables, functions)};")
+            elif choice < 0.6 and functions:
+                function_name, params_count = self.random.choice(functions)
+                args = ", ".join(self.expression(variables, functions) for _ in range(params_count))
+                lines.append(f"{indent}{function_name}({args});")
+            elif choice < 0.75 and depth < 3:
+                lines.append(f"{indent}if ({self.expression(variables, functions)}) {{")
+                self.block(variables, functions, depth + 1, lines)
+                if self.random.random() < 0.5:
+                    lines.append(f"{indent}}} else {{")
+                    self.block(variables, functions, depth + 1, lines)
+                lines.append(f"{indent}}}")
+            elif choice < 0.85 and depth < 3:
+                name = self.new_name("i")
+                lines.append(f"{indent}for (int {name} = 0; {name} < {self.expression(variables, functions)}; {name}++) {{")
+                self.block(variables + [name], functions, depth + 1, lines)
+                lines.append(f"{indent}}}")
+            elif choice < 0.92 and depth < 3:
+                lines.append(f"{indent}while ({self.expression(variables, functions)}) {{")
+                self.block(variables, functions, depth + 1, lines)
+                lines.append(f"{indent}}}")
+            else:
+                lines.append(f"{indent}return {self.expression(variables, functions)};")
+
+    def new_name(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+
+def generate_source(seed: int, recursive: bool = False) -> str:
+    """Generate a random C program (see SourceGenerator).
+
+    Args:
+        seed (int): the seed of the program
+        recursive (bool, optional): let functions call any function, and not only the ones defined after them. Defaults to False.
+
+    Returns:
+        str: the source of the program
+    """
+
+    return SourceGenerator(seed, recursive).generate()
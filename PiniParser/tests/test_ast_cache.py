@@ -0,0 +1,155 @@
+from unittest import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from conftest import project_dir
+from pini_parser import mark_project
+from utils.ast_cache import AstCache, ast_cache
+from utils.flat_ast import FlatAst
+from utils.preprocessor import Preprocessor
+
+PATH_TO_TEST_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "c_files")
+
+
+class TestAstCache(TestCase):
+    def test_parse_once(self):
+        cache = AstCache()
+        first = cache.parse_file(os.path.join(PATH_TO_TEST_FILES, "Test_if_1.c"))
+        second = cache.parse_file(os.path.join(PATH_TO_TEST_FILES, "Test_if_1.c"))
+
+        assert first is second
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_changed_file_is_parsed_again(self):
+        with tempfile.TemporaryDirectory() as root:
+            filename = os.path.join(root, "a.c")
+            with open(filename, "w") as fd:
+                fd.write("int a;\n")
+
+            cache = AstCache()
+            first = cache.parse_file(filename)
+            with open(filename, "w") as fd:
+                fd.write("int a;\nint b;\n")
+
+            assert len(cache.parse_file(filename).ext) == 2
+            assert len(first.ext) == 1
+
+    def test_includes_stripped_in_memory(self):
+        with tempfile.TemporaryDirectory() as root:
+            filename = os.path.join(root, "a.c")
+            text = '#include "a.h"\nint a;\n'
+            with open(filename, "w") as fd:
+                fd.write(text)
+
+            assert len(AstCache().parse_file(filename).ext) == 1
+            with open(filename) as fd:
+                assert fd.read() == text
+
+    def test_memory_budget(self):
+        cache = AstCache(memory_budget=1)
+        for filename in ["Test_if_1.c", "Test_if_2.c", "Test_for_1.c"]:
+            cache.parse_file(os.path.join(PATH_TO_TEST_FILES, filename))
+
+        assert len(cache.entries) == 1
+
+    def test_disk_cache(self):
+        filename = os.path.join(PATH_TO_TEST_FILES, "Test_for_2.c")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            AstCache(cache_dir=cache_dir).parse_file(filename)
+
+            cache = AstCache(cache_dir=cache_dir)
+            from_disk = cache.load_from_disk(cache.get_key(filename))
+
+            assert len(os.listdir(cache_dir)) == 1
+            assert [func.decl.name for func in from_disk.ext] == ["included_func", "main"]
+
+    def test_parse_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            broken = os.path.join(root, "broken.c")
+            with open(broken, "w") as fd:
+                fd.write("int a = ;\n")
+
+            filenames = [os.path.join(PATH_TO_TEST_FILES, filename) for filename in ["Test_if_1.c", "Test_for_1.c"]]
+            cache = AstCache(cache_dir=os.path.join(root, "cache"))
+            cache.parse_files(filenames + [broken], 2)
+
+            assert len(cache.entries) == 2
+            assert len(os.listdir(os.path.join(root, "cache"))) == 2
+            cache.parse_file(filenames[0])
+            assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_parse_files_in_parallel(self):
+        filenames = [os.path.join(PATH_TO_TEST_FILES, filename) for filename in sorted(os.listdir(PATH_TO_TEST_FILES))
+                     if filename.endswith(".c")]
+
+        for lowered in [False, True]:
+            trees = []
+            for jobs in [1, 2]:
+                cache = AstCache()
+                cache.parse_files(filenames, jobs, lowered)
+                assert cache.misses == len(filenames)
+                hits = cache.hits
+                trees.append([cache.lower_file(filename) if lowered else FlatAst.lower(cache.parse_file(filename))
+                              for filename in filenames])
+                # every tree was taken from the cache
+                assert cache.hits == hits + len(filenames)
+
+            for single, parallel in zip(*trees):
+                assert (single.kinds, single.first_child, single.next_sibling, single.slots, single.names) == \
+                    (parallel.kinds, parallel.first_child, parallel.next_sibling, parallel.slots, parallel.names)
+                assert single.identifiers == parallel.identifiers and single.definitions == parallel.definitions
+
+
+class TestProjectCache(TestCase):
+    def test_options_kept_per_project(self):
+        with project_dir() as root:
+            main_path = os.path.join(root, "main.c")
+            shutil.copy(os.path.join(PATH_TO_TEST_FILES, "Test_if_1.c"), main_path)
+            cache_dir = os.path.join(root, "cache")
+
+            marked = mark_project(main_path, [main_path + "@main@x"], ast_cache_dir=cache_dir)
+
+            assert any(name.endswith(".flat.pickle") for name in os.listdir(cache_dir))
+
+        # the shared cache is not set up for the project
+        assert main_path + "@main@x" in marked
+        assert ast_cache.cache_dir is None and ast_cache.preprocessor is None
+
+
+@unittest.skipUnless(shutil.which("cpp"), "cpp is not installed")
+class TestPreprocessor(TestCase):
+    def test_cached_output(self):
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, "a.c")
+            header = os.path.join(root, "a.h")
+            with open(source, "w") as fd:
+                fd.write('#include "a.h"\nint main() { int x = N; }\n')
+            with open(header, "w") as fd:
+                fd.write("#define N 1\nint f();\n")
+
+            cache_dir = os.path.join(root, "cpp")
+            cache = AstCache(preprocessor=Preprocessor(defines=["M=2"], cache_dir=cache_dir))
+            ast = cache.parse_file(source)
+            assert [type(ext).__name__ for ext in ast.ext] == ["Decl", "FuncDef"]
+            assert cache.parse_file(source) is ast
+            assert (cache.preprocessor.hits, cache.preprocessor.misses) == (1, 1)
+
+            # a new run reuses the output on disk, until a header changes
+            preprocessor = Preprocessor(defines=["M=2"], cache_dir=cache_dir)
+            assert "f()" in preprocessor.preprocess(source)
+            assert (preprocessor.hits, preprocessor.misses) == (1, 0)
+
+            with open(header, "w") as fd:
+                fd.write("#define N 1\nint g();\n")
+            assert "g()" in preprocessor.preprocess(source)
+            assert preprocessor.misses == 1
+
+            # other defines are another entry
+            assert "f()" not in Preprocessor(cache_dir=cache_dir).preprocess(source)
+            assert len(os.listdir(cache_dir)) == 2
+
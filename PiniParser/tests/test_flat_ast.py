@@ -0,0 +1,132 @@
+from unittest import TestCase
+import os
+import pickle
+import sys
+import tempfile
+
+from pycparser import c_ast, c_parser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from conftest import parse_source
+from utils.ast_cache import AstCache
+from utils.flat_ast import KINDS, NO_NODE, SLOT_NAMES, FlatAst
+
+PATH_TO_TEST_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "c_files")
+
+SOURCE = """
+struct s { int a; int b[2]; };
+
+int helper(int a, int b)
+{
+    return a + b;
+}
+
+int main()
+{
+    int x;
+    struct s v;
+    v.b[1] = helper(x, 2);
+    return v.a;
+}
+"""
+
+
+def count_nodes(ast: c_ast.Node) -> int:
+    return 1 + sum(count_nodes(child) for _, child in ast.children())
+
+
+class TestFlatAst(TestCase):
+    def setUp(self):
+        self.ast = c_parser.CParser().parse(SOURCE, "test.c")
+        self.flat = FlatAst.lower(self.ast)
+
+    def test_same_tree(self):
+        assert len(self.flat) == count_nodes(self.ast)
+
+        # walk both trees together
+        stack = [(self.ast, 0)]
+        while stack:
+            node, index = stack.pop()
+            assert KINDS[self.flat.kinds[index]] is type(node)
+            children = self.flat.children(index)
+            assert len(children) == len(node.children())
+            for (name, child), child_index in zip(node.children(), children):
+                assert SLOT_NAMES[self.flat.slots[child_index]] == name.partition("[")[0]
+                stack.append((child, child_index))
+
+    def test_identifiers(self):
+        names = {self.flat.get_identifier(index) for index in range(len(self.flat))} - {None}
+
+        assert {"helper", "main", "x", "v", "v.b", "v.a", "a", "b"} <= names
+        # every identifier is kept once
+        assert len(self.flat.identifiers) == len(set(self.flat.identifiers))
+
+    def test_functions(self):
+        assert set(self.flat.definitions) == {"helper", "main"}
+        helper = self.flat.definitions["helper"]
+        assert self.flat.params[helper] == ["a", "b"]
+        assert KINDS[self.flat.kinds[self.flat.find_child(helper, "body")]] is c_ast.Compound
+        assert self.flat.find_child(helper, "param_decls") == NO_NODE
+
+        call = next(index for index in range(len(self.flat)) if KINDS[self.flat.kinds[index]] is c_ast.FuncCall)
+        assert self.flat.get_identifier(call) == "helper"
+        assert [self.flat.get_identifier(arg) for arg in self.flat.get_call_args(call)] == ["x", None]
+
+    def test_unnamed_lvalue(self):
+        flat = FlatAst.lower(c_parser.CParser().parse("int main() { int *p; *p = 1; f().a = 2; (*g)(p); }", "test.c"))
+        kinds = [KINDS[kind] for kind in flat.kinds]
+
+        for index, kind in enumerate(kinds):
+            if kind in (c_ast.Assignment, c_ast.FuncCall, c_ast.StructRef):
+                assert flat.get_identifier(index) in (None, "f")
+
+    def test_pickle(self):
+        loaded = pickle.loads(pickle.dumps(self.flat))
+
+        assert loaded.kinds == self.flat.kinds and loaded.first_child == self.flat.first_child
+        assert loaded.definitions == self.flat.definitions
+        assert loaded.identifiers[0] is sys.intern(self.flat.identifiers[0])
+
+    def test_deep_tree(self):
+        depth = 10000
+        ast = c_parser.CParser().parse("int main() {" + "{" * depth + "}" * depth + "}", "test.c")
+        flat = FlatAst.lower(ast)
+
+        # FileAST, FuncDef, Decl, FuncDecl, TypeDecl, IdentifierType and the body, then the blocks
+        assert len(flat) == 7 + depth
+
+    def test_parse_flat_or_c_ast(self):
+        marked = [sorted(parse_source(tree).get_marked()) for tree in [self.ast, self.flat]]
+
+        assert marked[0] == marked[1]
+        assert "test.c@helper@a" in marked[0] and "test.c@main@v.b" in marked[0]
+
+
+class TestLowerFile(TestCase):
+    def test_lower_once(self):
+        cache = AstCache()
+        filename = os.path.join(PATH_TO_TEST_FILES, "Test_if_1.c")
+        first = cache.lower_file(filename)
+
+        assert cache.lower_file(filename) is first
+        # the syntax tree is not kept
+        assert len(cache.entries) == 1
+
+    def test_reuses_syntax_tree(self):
+        cache = AstCache()
+        filename = os.path.join(PATH_TO_TEST_FILES, "Test_if_1.c")
+        ast = cache.parse_file(filename)
+
+        assert len(cache.lower_file(filename)) == count_nodes(ast)
+        # the lowered tree is a miss, the syntax tree it is lowered from a hit
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            filename = os.path.join(PATH_TO_TEST_FILES, "Test_if_1.c")
+            first = AstCache(cache_dir=cache_dir).lower_file(filename)
+            assert any(name.endswith(".flat.pickle") for name in os.listdir(cache_dir))
+
+            second = AstCache(cache_dir=cache_dir).lower_file(filename)
+            assert second is not first and second.kinds == first.kinds
@@ -0,0 +1,420 @@
+from unittest import TestCase
+import os
+import shutil
+import sys
+import unittest
+
+from pycparser import c_parser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from conftest import parse_source, project_dir
+from function_summary import FunctionSummaries
+from generated_sources import generate_source
+from pini_parser import BatchAnalysis, IncrementalAnalysis, PiniParser, mark_project
+from scope_tree import Scope, ScopedNames
+from utils.stats import stats
+
+
+SOURCE = """
+int helper(int a, int b)
+{
+    int c = a;
+    return c;
+}
+
+int main()
+{
+    int x;
+    int k = helper(x, 1);
+    int m = helper(k, 2);
+    int n = helper(3, 4);
+    return 0;
+}
+"""
+
+
+class NoSummaries(FunctionSummaries):
+    """Analyses every call again."""
+
+    def find(self, key, marked, decl_history):
+        return None
+
+
+class TestFunctionSummaries(TestCase):
+    def test_summary_reused(self):
+        parser = parse_source(SOURCE)
+
+        # parameters are marked per function and not per call, so n is marked too
+        assert sorted(parser.get_marked()) == ["test.c@helper@a", "test.c@helper@c", "test.c@main@k",
+                                               "test.c@main@m", "test.c@main@n", "test.c@main@x"]
+        # the later calls are analysed with the same marked parameters, so the first summary is applied
+        assert parser.summaries.hits > 0
+
+    def test_recursive_function(self):
+        parser = parse_source("""
+int count(int a)
+{
+    int b = count(a);
+    return b;
+}
+
+int main()
+{
+    int x;
+    int y = count(x);
+    return 0;
+}
+""")
+
+        assert "test.c@count@a" in parser.get_marked()
+        assert "test.c@main@y" not in parser.get_marked()
+
+    def test_mutual_recursion(self):
+        source = """
+int f(int a, int b)
+{
+    int t = g(b);
+    return a;
+}
+
+int g(int q)
+{
+    int s = f(q, q);
+    return s;
+}
+
+int main()
+{
+    int x, y;
+    int r1 = f(y, y);
+    int r2 = f(x, y);
+    int r3 = g(y);
+    return 0;
+}
+"""
+
+        expected = sorted(parse_source(source, summaries=NoSummaries()).get_marked())
+
+        # the summary of g made while f was analysed can't be applied once f ended
+        assert "test.c@g@s" in expected and "test.c@main@r3" in expected
+        assert sorted(parse_source(source).get_marked()) == expected
+
+    def test_recursive_sources(self):
+        for seed in range(16):
+            ast = c_parser.CParser().parse(generate_source(seed, recursive=True), "test.c")
+            for seeds in [["test.c@main@x"], ["test.c@main@y"], ["test.c@main@x", "test.c@main@y"]]:
+                expected = sorted(parse_source(ast, set(seeds), summaries=NoSummaries()).get_marked())
+
+                # applying a summary marks what analysing the function again would
+                assert sorted(parse_source(ast, set(seeds)).get_marked()) == expected, (seed, seeds)
+
+    def test_callee_marks_itself(self):
+        source = """
+int delayed(int a)
+{
+    int b;
+    int c;
+    while (1) {
+        c = b;
+        b = a;
+    }
+    return c;
+}
+
+int main()
+{
+    int x;
+    int k = delayed(x);
+    int m = delayed(x);
+    return 0;
+}
+"""
+
+        expected = sorted(parse_source(source, summaries=NoSummaries()).get_marked())
+        parser = parse_source(source)
+
+        # c is marked only by the second pass over delayed, the summary of the first pass can't be applied
+        assert "test.c@delayed@c" in expected and "test.c@main@m" in expected
+        assert sorted(parser.get_marked()) == expected
+
+    def test_next_run(self):
+        root = Scope()
+        summaries = FunctionSummaries(track_inputs=True)
+        first = sorted(parse_source(SOURCE, ScopedNames(root, ["test.c@main@x"]), summaries=summaries).get_marked())
+
+        misses = summaries.misses
+        summaries.start_run(set())
+        second = parse_source(SOURCE, ScopedNames(root, ["test.c@main@x"]), summaries=summaries)
+        assert sorted(second.get_marked()) == first
+        # helper was not analysed again, the summaries of the first run were applied
+        assert summaries.misses == misses
+
+        summaries.start_run({"test.c"})
+        assert summaries.previous == dict()
+
+
+class FullRescanParser(PiniParser):
+    """Checks every argument of a call again until no more of them are pini (what get_pini_param_map does, without skipping)."""
+
+    def get_pini_param_map(self, flat, index, context, def_context, def_params):
+        params_indices = flat.get_call_args(index)
+        result = [False] * len(params_indices)
+        trues_count = -1
+        while trues_count != sum(result):
+            trues_count = sum(result)
+            for param_index, param_node in enumerate(params_indices):
+                is_pini_exists = self.is_pini_var_exists(flat, param_node, context) or (
+                    param_index < len(def_params) and self.marked.has_name(def_context, def_params[param_index]))
+                if is_pini_exists:
+                    self.mark_subtree(flat, param_node, context)
+                result[param_index] = is_pini_exists
+
+        return result
+
+
+class TestParamMap(TestCase):
+    def test_same_as_full_rescan(self):
+        for seed in range(60):
+            ast = c_parser.CParser().parse(generate_source(seed), "test.c")
+            for seeds in [["test.c@main@x"], ["test.c@main@y"], ["test.c@main@x", "test.c@main@y"]]:
+                journals = []
+                for parser_type in [FullRescanParser, PiniParser]:
+                    parser = parse_source(ast, set(seeds), parser_type)
+                    journals.append([parser.marked.table.render(symbol) for symbol in parser.marked.journal])
+
+                # the same marks, found in the same order
+                assert journals[0] == journals[1], (seed, seeds)
+
+    def test_pini_argument_with_call(self):
+        source = """
+int g(int a, int b)
+{
+    int c = b;
+    return a;
+}
+
+int f(int p, int q)
+{
+    return p;
+}
+
+int main()
+{
+    int x;
+    int z;
+    int r = f(g(x, z), z + x);
+    return r;
+}
+"""
+        expected = [sorted(parse_source(source, parser_type=parser_type).get_marked()) for parser_type in [FullRescanParser, PiniParser]]
+
+        # g(x, z) is pini from the start, it is checked again (and g analysed again) once z + x marks z
+        assert "test.c@g@c" in expected[0]
+        assert expected[1] == expected[0]
+
+    def test_chained_arguments(self):
+        class CountingParser(PiniParser):
+            checks = 0
+
+            def is_pini_var_exists(self, flat, index, context):
+                CountingParser.checks += 1
+                return super().is_pini_var_exists(flat, index, context)
+
+        count = 200
+        # every argument is marked by the one after it
+        source = "int f({}) {{ return 0; }}\nint main() {{ int x; {} f({}, v{} + x); return 0; }}\n".format(
+            ", ".join(f"int p{index}" for index in range(count)), " ".join(f"int v{index};" for index in range(count)),
+            ", ".join(f"v{index} + v{index + 1}" for index in range(count - 1)), count - 1)
+        parser = parse_source(source, parser_type=CountingParser)
+
+        assert sorted(parser.get_marked()) == sorted(parse_source(source, parser_type=FullRescanParser).get_marked())
+        # the full rescan checks count * count / 2 arguments, only the argument whose names got marked is checked again
+        assert len(parser.get_marked()) == 2 * count + 1
+        assert CountingParser.checks < 4 * count
+
+
+BATCH_SOURCE = """
+int g;
+
+int helper(int a, int b)
+{
+    int c = a + g;
+    return c;
+}
+
+int main()
+{
+    int x;
+    int y;
+    int k = helper(x, y);
+    int m = helper(y, 2);
+    return 0;
+}
+"""
+
+
+class TestBatchAnalysis(TestCase):
+    def test_queries_match_single_runs(self):
+        seed_sets = [["@main@x"], ["@main@y"], ["@g"], ["@main@x", "@main@y"], ["@main@x"]]
+
+        with project_dir() as root:
+            main_path = os.path.join(root, "main.c")
+            with open(main_path, "w") as fd:
+                fd.write(BATCH_SOURCE)
+            seed_sets = [[main_path + seed for seed in seeds] for seeds in seed_sets]
+
+            expected = [BatchAnalysis(main_path).mark(seeds) for seeds in seed_sets]
+            analysis = BatchAnalysis(main_path)
+            batch = analysis.mark_all(seed_sets)
+            parallel = analysis.mark_all(seed_sets, 2)
+
+        assert batch == expected
+        assert parallel == expected
+        assert main_path + "@main@k" in expected[0] and main_path + "@main@k" not in expected[1]
+        # helper is analysed again only for the queries that start it from other marks
+        assert analysis.summaries.hits > 0
+
+    def test_generated_sources(self):
+        seed_sets = [["@main@y"], ["@g0"], ["@main@x", "@main@y"], ["@main@x"], ["@g1"]]
+
+        with project_dir() as root:
+            for seed in range(12):
+                for recursive in [False, True]:
+                    main_path = os.path.join(root, f"main_{seed}_{int(recursive)}.c")
+                    with open(main_path, "w") as fd:
+                        fd.write(generate_source(seed, recursive))
+                    queries = [[main_path + seed_name for seed_name in seeds] for seeds in seed_sets]
+
+                    expected = [mark_project(main_path, seeds) for seeds in queries]
+                    batch = BatchAnalysis(main_path).mark_all(queries)
+
+                    # a query finds the same marks as a fresh run, whatever the queries before it
+                    assert batch == expected, (seed, recursive)
+
+
+INCREMENTAL_FILES = {
+    "main.c": """#include "lib.h"
+
+int main()
+{
+    int x;
+    int y;
+    int k = helper(x, y);
+    int m = scale(k);
+    return 0;
+}
+""",
+    "lib.h": """int helper(int a, int b);
+int scale(int v);
+""",
+    "lib.c": """#include "lib.h"
+
+int helper(int a, int b)
+{
+    int c = a;
+    return c;
+}
+
+int scale(int v)
+{
+    int w = v * 2;
+    return w;
+}
+""",
+}
+
+# (file, text replaced, new text), one run after every edit
+INCREMENTAL_EDITS = [
+    ("lib.c", "int c = a;", "int c = b;"),
+    ("lib.c", "int c = b;", "int c = a + b;"),
+    ("main.c", "int m = scale(k);", "int m = scale(y);"),
+    ("lib.c", "int w = v * 2;", "int w = 2;"),
+]
+
+
+class TestIncrementalAnalysis(TestCase):
+    def check_edits(self, use_cpp: bool):
+        with project_dir() as root:
+            for name, text in INCREMENTAL_FILES.items():
+                with open(os.path.join(root, name), "w") as fd:
+                    fd.write(text)
+            main_path = os.path.join(root, "main.c")
+            seeds = [main_path + "@main@x"]
+
+            analysis = IncrementalAnalysis(main_path, seeds, use_cpp=use_cpp)
+            added, removed = analysis.run()
+            assert added == mark_project(main_path, seeds, use_cpp=use_cpp) and removed == []
+
+            for mtime, (name, old, new) in enumerate(INCREMENTAL_EDITS, 1):
+                path = os.path.join(root, name)
+                with open(path) as fd:
+                    text = fd.read()
+                with open(path, "w") as fd:
+                    fd.write(text.replace(old, new))
+                # edits in the same tick of the clock are still seen as edits
+                os.utime(path, ns=(mtime * 10 ** 9, mtime * 10 ** 9))
+
+                previous = analysis.marked
+                added, removed = analysis.run()
+                expected = mark_project(main_path, seeds, use_cpp=use_cpp)
+                assert analysis.marked == expected, (name, new)
+                assert added == sorted(set(expected) - set(previous)) and removed == sorted(set(previous) - set(expected))
+
+            # nothing changed since the last run
+            assert analysis.run() == ([], [])
+
+        return analysis
+
+    def test_edits_match_fresh_runs(self):
+        analysis = self.check_edits(False)
+
+        assert analysis.summaries.hits > 0
+
+    @unittest.skipUnless(shutil.which("cpp"), "cpp is not installed")
+    def test_edits_with_cpp(self):
+        analysis = self.check_edits(True)
+
+        assert analysis.cache.preprocessor is not None
+
+    def test_graph_kept_between_runs(self):
+        with project_dir() as root:
+            for name, text in INCREMENTAL_FILES.items():
+                with open(os.path.join(root, name), "w") as fd:
+                    fd.write(text)
+            main_path = os.path.join(root, "main.c")
+            seeds = [main_path + "@main@x"]
+
+            analysis = IncrementalAnalysis(main_path, seeds)
+            analysis.run()
+            graph = analysis.graph_manager.g
+
+            # (edit, whether the functions of a file change), one run after every edit
+            edits = [
+                ("lib.c", "int c = a;", "int c = b;", False),
+                ("lib.h", "int scale(int v);", "int scale(int v);\nint extra(int v);", True),
+            ]
+            stats.enabled = True
+            try:
+                for mtime, (name, old, new, rebuilt) in enumerate(edits, 1):
+                    path = os.path.join(root, name)
+                    with open(path) as fd:
+                        text = fd.read()
+                    with open(path, "w") as fd:
+                        fd.write(text.replace(old, new))
+                    os.utime(path, ns=(mtime * 10 ** 9, mtime * 10 ** 9))
+
+                    stats.reset()
+                    analysis.run()
+                    # only the edited file is read again
+                    assert stats.counters["files_read"] == 1
+                    assert (analysis.graph_manager.g is not graph) == rebuilt, name
+                    assert analysis.marked == mark_project(main_path, seeds)
+                    graph = analysis.graph_manager.g
+
+                stats.reset()
+                assert analysis.run() == ([], [])
+                assert analysis.graph_manager.g is graph and "files_read" not in stats.counters
+            finally:
+                stats.enabled = False
+                stats.reset()
@@ -0,0 +1,231 @@
+from unittest import TestCase
+import os
+import sys
+import tempfile
+
+import networkx as nx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.file_index import FileIndex
+from utils.map_all_includes import ProjectGraph
+from utils.graph_export import GraphExporter
+from utils.project_index import ProjectIndex
+from utils.reachability import ReachabilityIndex
+from utils.source_scanner import scan_source, scan_tokens
+
+
+class TestReachabilityIndex(TestCase):
+    def test_matches_has_path(self):
+        g = nx.DiGraph([("main.c", "a.h"), ("a.h", "b.h"), ("b.h", "a.h"), ("b.h", "FUNC@@@/f/1"),
+                        ("other.c", "c.h"), ("c.h", "FUNC@@@/f/2")])
+        index = ReachabilityIndex(g)
+
+        for source in g.nodes:
+            for dest in g.nodes:
+                assert index.is_reachable(source, dest) == nx.has_path(g, source, dest)
+
+    def test_reachable_from(self):
+        g = nx.DiGraph([("main.c", "a.h"), ("a.h", "FUNC@@@/f/2"), ("other.c", "FUNC@@@/f/1")])
+        index = ReachabilityIndex(g)
+
+        assert index.reachable_from("main.c", ["FUNC@@@/f/1", "FUNC@@@/f/2", "missing"]) == ["FUNC@@@/f/2"]
+        assert index.reachable_from("missing", ["FUNC@@@/f/1"]) == []
+        assert not index.is_reachable("missing", "a.h")
+
+
+class TestProjectGraph(TestCase):
+    def build(self, files: dict) -> ProjectGraph:
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        for name, text in files.items():
+            with open(os.path.join(self.root.name, name), "w") as fd:
+                fd.write(text)
+
+        return ProjectGraph(self.path("main.c"), self.root.name)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root.name, name)
+
+    def test_diamond(self):
+        graph = self.build({
+            "main.c": '#include "a.h"\n#include "b.h"\nint main() { return f(1); }\n',
+            "a.h": '#include "c.h"\nint f(int x);\n',
+            "b.h": '#include "c.h"\n',
+            "c.h": 'int f(int x);\n',
+            "lib.c": '#include "c.h"\nint f(int x) { return x; }\n',
+            "other.c": 'static int f(int x) { return 0; }\n',
+        })
+
+        # every file reaching c.h shares its node, other.c can't reach it and gets a node of its own
+        shared, other = "FUNC@@@/f/1", "FUNC@@@/f/2"
+        assert graph.function_counter["f"] == 2
+        assert set(graph.g.predecessors(shared)) == {self.path("c.h"), self.path("a.h"), self.path("lib.c")}
+        assert set(graph.g.predecessors(other)) == {self.path("other.c")}
+
+        assert graph.get_function_node(graph.gca, "f", self.path("b.h")) == shared
+        assert graph.get_function_node(graph.gca, "f", self.path("other.c")) == other
+        assert graph.is_path_exists_to_function(self.path("main.c"), "f") == (True, 1)
+        assert graph.get_reachable_functions(self.path("other.c"), "f") == [2]
+        # the index is built once over the includes, function nodes are found through the files they are in
+        assert shared not in graph.reachability.component_of
+        assert graph.get_function_declaring_parent(graph.gca, "f", 1) == self.path("lib.c")
+
+    def test_include_cycle(self):
+        graph = self.build({
+            "main.c": '#include "a.h"\nint main() { return g(1); }\n',
+            "a.h": '#include "b.h"\nint g(int x);\n',
+            "b.h": '#include "a.h"\nint h(int x);\n',
+            "lib.c": '#include "b.h"\nint g(int x) { return h(x); }\n',
+        })
+
+        # the headers of the cycle reach each other, so a function declared in both is one node
+        assert graph.function_counter == {"main": 1, "g": 1, "h": 1}
+        for name in ["a.h", "b.h", "main.c", "lib.c"]:
+            assert graph.get_function_node(graph.gca, "g", self.path(name)) == "FUNC@@@/g/1"
+            assert graph.get_function_node(graph.gca, "h", self.path(name)) == "FUNC@@@/h/1"
+
+    def test_refresh(self):
+        self.build({
+            "main.c": '#include "a.h"\n#include "table.inc"\nint main() { return f(1); }\n',
+            "a.h": 'int f(int x);\n',
+            "table.inc": 'int g(int x);\n',
+        })
+        graph = ProjectGraph(self.path("main.c"), self.root.name, track_changes=True)
+        g = graph.g
+
+        # (file added or edited, text, whether the graph is built again)
+        changes = [
+            ("notes.txt", "not a source\n", False),
+            ("a.h", "/* same functions */\nint f(int x);\n", False),
+            ("a.h", "int f(int x);\nint h(int x);\n", True),
+            ("b.h", "int f(int x);\n", True),
+            # a file with the name of an include could be included instead
+            (os.path.join("sub", "table.inc"), "int g(int x);\n", True),
+        ]
+        for mtime, (name, text, rebuilt) in enumerate(changes, 1):
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            with open(self.path(name), "w") as fd:
+                fd.write(text)
+            for path in [self.path(name), self.root.name]:
+                os.utime(path, ns=(mtime * 10 ** 9, mtime * 10 ** 9))
+
+            assert graph.refresh() == rebuilt, name
+            assert (graph.g is not g) == rebuilt, name
+            g = graph.g
+
+        assert graph.function_counter["h"] == 1
+
+    def test_scan_in_parallel(self):
+        main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "include_tests", "main.c")
+        graphs = [ProjectGraph(main_path, os.path.dirname(main_path), jobs=jobs) for jobs in [1, 2]]
+
+        assert graphs[0].file_records == graphs[1].file_records
+        assert sorted(graphs[0].g.edges) == sorted(graphs[1].g.edges)
+        assert graphs[0].function_counter == graphs[1].function_counter
+
+
+class TestGraphExporter(TestCase):
+    def test_slice(self):
+        g = nx.DiGraph([("main.c", "a.h"), ("a.h", "b.h"), ("b.h", "c.h"), ("other.c", "d.h")])
+        exporter = GraphExporter(g)
+
+        assert exporter.slice() is g
+        assert set(exporter.slice(["main.c"]).nodes) == {"main.c", "a.h", "b.h", "c.h"}
+        assert set(exporter.slice(["main.c"], 1).nodes) == {"main.c", "a.h"}
+        assert set(exporter.slice(depth=0).nodes) == {"main.c", "other.c"}
+
+    def test_export(self):
+        g = nx.DiGraph([("main.c", "a.h"), ("a.h", "FUNC@@@/f/1")])
+        exporter = GraphExporter(g)
+
+        with tempfile.TemporaryDirectory() as root:
+            exporter.export(os.path.join(root, "g.dot"))
+            with open(os.path.join(root, "g.dot")) as fd:
+                assert '"main.c" -> "a.h";' in fd.read()
+
+            exporter.export(os.path.join(root, "g.graphml"), ["a.h"])
+            assert set(nx.read_graphml(os.path.join(root, "g.graphml")).nodes) == {"a.h", "FUNC@@@/f/1"}
+
+            exporter.export(os.path.join(root, "g.json"))
+            assert os.path.exists(os.path.join(root, "g.json"))
+
+            with self.assertRaises(Exception):
+                exporter.export(os.path.join(root, "g.png"))
+
+
+class TestSourceScanner(TestCase):
+    DATA = ('#include "a.h"\n#include <stdio.h>\nint f(void);\nstatic int\ng(int a) {\n    return h(a);\n}\n'
+            'void *alloc(int size)\n{\n    return 0;\n}\n')
+
+    def test_tokens(self):
+        assert list(scan_tokens(self.DATA)) == [("include", "a.h", 1), ("system_include", "stdio.h", 2), ("declaration", "f", 3),
+                                               ("definition", "g", 5), ("declaration", "h", 6), ("body_only_definition", "alloc", 8)]
+
+    def test_record(self):
+        assert scan_source(self.DATA) == (["a.h"], ["stdio.h"], ["f", "g", "h"], {"g": 5, "alloc": 8})
+
+    def test_comments_and_strings(self):
+        data = '/* #include "a.h"\nint f(void); */\n// int g(void);\nchar *s = "int h(void) {";\nint k(void);\n'
+        assert list(scan_tokens(data)) == [("declaration", "k", 5)]
+
+
+class TestFileIndex(TestCase):
+    def test_resolve_collisions(self):
+        with tempfile.TemporaryDirectory() as root:
+            for directory in ["liba", "libb", "include"]:
+                os.makedirs(os.path.join(root, directory))
+            for path in ["liba/utils.h", "libb/utils.h", "libb/x.c", "include/config.h", "include/utils.h"]:
+                open(os.path.join(root, path), "w").close()
+
+            index = FileIndex(root)
+            assert index.resolve("utils.h", os.path.join(root, "libb/x.c")) == os.path.join(root, "libb/utils.h")
+            assert index.resolve("liba/utils.h", os.path.join(root, "libb/x.c")) == os.path.join(root, "liba/utils.h")
+            assert index.resolve("config.h", os.path.join(root, "libb/x.c")) == os.path.join(root, "include/config.h")
+
+            index = FileIndex(root, [os.path.join(root, "include")])
+            assert index.resolve("utils.h") == os.path.join(root, "include/utils.h")
+            with self.assertRaises(Exception):
+                index.resolve("missing.h")
+
+    def test_refresh(self):
+        with tempfile.TemporaryDirectory() as root:
+            index = FileIndex(root, track_mtime=True)
+            assert not index.refresh()
+
+            open(os.path.join(root, "new.h"), "w").close()
+            os.utime(root, ns=(0, 0))
+            assert index.refresh()
+            assert index.resolve("new.h") == os.path.join(root, "new.h")
+
+
+class TestProjectIndex(TestCase):
+    def test_unchanged_records(self):
+        with tempfile.TemporaryDirectory() as root:
+            files = [os.path.join(root, name) for name in ["main.c", "a.h"]]
+            for filename in files:
+                with open(filename, "w") as fd:
+                    fd.write("int f();\n")
+
+            index_dir = os.path.join(root, "index")
+            stats = {filename: ProjectIndex.get_stat(filename) for filename in files}
+            records = {filename: ([], [], ["f"], dict()) for filename in files}
+            ProjectIndex(index_dir, files[0], root).save(files, stats, records, ("graph",))
+
+            # touching a file keeps its record, changing it doesn't
+            os.utime(files[0], ns=(0, 0))
+            index = ProjectIndex(index_dir, files[0], root)
+            _, unchanged_records = index.get_unchanged_records()
+            assert index.get_changed_files(unchanged_records) == []
+            assert index.get_graph(files, unchanged_records) == ("graph",)
+
+            with open(files[1], "a") as fd:
+                fd.write("int g();\n")
+            _, unchanged_records = index.get_unchanged_records()
+            assert list(unchanged_records) == [files[0]]
+            assert index.get_changed_files(unchanged_records) == [files[1]]
+            assert index.get_graph(files, unchanged_records) is None
+            # the graph is kept if the changed file, scanned again, has the same record
+            assert index.get_graph(files, dict(unchanged_records, **{files[1]: ([], [], ["f"], dict())})) == ("graph",)
+            assert index.get_graph(files, dict(unchanged_records, **{files[1]: ([], [], ["f", "g"], dict())})) is None
+            assert ProjectIndex(index_dir, files[1], root).state == dict()
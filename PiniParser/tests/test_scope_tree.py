@@ -0,0 +1,70 @@
+from unittest import TestCase
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from scope_record import ScopesList
+from scope_tree import Scope, ScopedNames
+
+
+class TestScopeTree(TestCase):
+    def test_interned_scopes(self):
+        root = Scope()
+        scope = root.child("main").child("for[1]")
+
+        assert scope is root.descend(["main", "for[1]"])
+        assert str(scope) == "main@for[1]@"
+        assert root.find(["main", "if[1]"]) is None
+
+    def test_upper_scope_lookup(self):
+        marked = ScopedNames(names=["main@x", "g"])
+        loop = marked.root.descend(["main", "for[1]", "if[2]"])
+
+        assert marked.is_in_upper_scope(loop, "x")
+        assert marked.is_in_upper_scope(loop, "g")
+        assert not marked.is_in_upper_scope(marked.root.child("other"), "x")
+        assert "main@x" in marked and "main@for[1]@x" not in marked
+
+    def test_outermost_scope(self):
+        declared = ScopedNames(names=["main@a", "main@for[1]@a", "a", "b"])
+        loop = declared.root.descend(["main", "for[1]"])
+
+        assert declared.find_outermost_scope(loop, "a") is declared.root.child("main")
+        assert declared.find_outermost_scope(loop, "b") is declared.root
+        assert declared.find_outermost_scope(loop, "c") is None
+
+    def test_render(self):
+        names = ["main@for[1]@i", "main@x", "file.c@main@if[1]@a"]
+        marked = ScopedNames(names=names)
+        marked.add("main@x")
+
+        assert sorted(marked) == sorted(names)
+        assert len(marked) == 3
+
+    def test_symbols(self):
+        marked = ScopedNames(names=["main@x"])
+        declared = ScopedNames(marked.root, ["main@x", "main@if[1]@y"])
+        main = marked.root.child("main")
+
+        # the names of a scope tree share their symbols
+        symbol = marked.table.get_symbol(main, "x")
+        assert declared.journal[0] == symbol == marked.journal[0]
+        assert marked.table.render(symbol) == "main@x"
+        assert declared.has_symbol(declared.journal[1]) and not marked.has_symbol(declared.journal[1])
+
+        marked.add_symbol(declared.journal[1])
+        assert "main@if[1]@y" in marked and marked.is_in_upper_scope(main.descend(["if[1]", "for[1]"]), "y")
+        assert marked.get_unit_symbols([main, main.child("if[1]")]) == set(declared.journal)
+
+
+class TestScopesList(TestCase):
+    def test_immutable_counters(self):
+        scopes = ScopesList()
+        nested = scopes.enter("if").increment("if")
+        counted = scopes.increment("for").increment("for")
+
+        assert str(scopes["if"]) == "1" and str(scopes["for"]) == "1"
+        assert str(nested["if"]) == "1-2"
+        assert str(counted["for"]) == "3"
+        assert nested["for"] is scopes["for"]
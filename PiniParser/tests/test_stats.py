@@ -0,0 +1,73 @@
+from unittest import TestCase
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from conftest import project_dir
+from pini_parser import mark_project
+from utils.stats import Stats, collect, stats
+
+
+SOURCE = """
+int helper(int a)
+{
+    return a;
+}
+
+int main()
+{
+    int x;
+    int k = helper(x);
+    int m = helper(k);
+    return 0;
+}
+"""
+
+
+class TestStats(TestCase):
+    def tearDown(self):
+        stats.enabled = False
+        stats.reset()
+
+    def test_disabled(self):
+        disabled = Stats()
+        disabled.count("calls")
+        with disabled.timer("phase"):
+            pass
+
+        assert disabled.to_dict() == {"timers": {}, "counters": {}}
+
+    def test_timers_add_up(self):
+        enabled = Stats()
+        enabled.enabled = True
+        for _ in range(3):
+            with enabled.timer("phase"):
+                enabled.count("calls", 2)
+
+        assert enabled.timers["phase"][1] == 3
+        assert enabled.counters == {"calls": 6}
+
+    def test_collect(self):
+        with project_dir() as root:
+            main_path = os.path.join(root, "main.c")
+            with open(main_path, "w") as fd:
+                fd.write(SOURCE)
+            stats_path = os.path.join(root, "stats.json")
+            profile_path = os.path.join(root, "profile.out")
+
+            with collect(stats_path, profile_path):
+                mark_project(main_path, [main_path + "@main@x"])
+
+            with open(stats_path, "r") as fd:
+                recorded = json.load(fd)
+            assert os.path.getsize(profile_path) > 0
+
+        for timer in ["total", "generate_graph", "parse_file", "mark"]:
+            assert recorded["timers"][timer]["calls"] >= 1
+        assert recorded["counters"]["files_read"] == 1
+        assert recorded["counters"]["asts_parsed"] == 1
+        assert recorded["counters"]["functions_analysed"] == 1
+        assert recorded["counters"]["summaries_applied"] == 1
+        assert recorded["counters"]["upper_scope_lookups"] > 0
@@ -0,0 +1,82 @@
+from unittest import TestCase
+import os
+import sys
+
+from anytree import Node
+from pycparser import c_ast
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from conftest import parse_source
+from pini_parser import PiniParser
+from utils.flat_ast import KIND_OF, KINDS
+import utils.map_all_includes as mai
+
+
+# deeper than the default recursion limit, by far
+DEPTH = 10000
+
+
+class TestTraversal(TestCase):
+    def test_else_if_chain(self):
+        parser = parse_source("int main() {\n    int x;\n    int y;\n    int z;\n    if (x == 0) { z = 1; }\n"
+                            + "".join(f"    else if (z == {i}) {{ z = {i}; }}\n" for i in range(1, DEPTH))
+                            + "    else { y = x; }\n    return y;\n}\n")
+
+        # y is declared in main, so it is marked there
+        assert sorted(parser.get_marked()) == ["test.c@main@x", "test.c@main@y"]
+
+    def test_nested_expression(self):
+        parser = parse_source("int main() {\n    int x;\n    int y = " + "(1 + " * DEPTH + "x" + ")" * DEPTH + ";\n"
+                            + "    int z = " + "(1 + " * DEPTH + "2" + ")" * DEPTH + ";\n    return y;\n}\n")
+
+        assert sorted(parser.get_marked()) == ["test.c@main@x", "test.c@main@y"]
+
+    def test_nested_blocks(self):
+        parser = parse_source("int main() {\n    int x;\n    int y;\n" + "{" * DEPTH + "y = x;" + "}" * DEPTH + "\n    int z = y;\n    return z;\n}\n")
+
+        assert sorted(parser.get_marked()) == ["test.c@main@x", "test.c@main@y", "test.c@main@z"]
+
+    def test_nested_ifs(self):
+        depth = 200
+        parser = parse_source("int main() {\n    int x;\n    int y;\n" + "if (x) {" * depth + "int w = x; y = w;" + "}" * depth + "\n    return y;\n}\n")
+
+        # every if opens a scope, so w is marked in the innermost one
+        marked = [name for name in parser.get_marked() if name.endswith("@w")]
+        assert len(marked) == 1 and marked[0].count("@if[") == depth
+
+    def test_deep_include_tree(self):
+        # anytree checks for loops on every new node, so a deeper tree takes long to build
+        depth = 2000
+        graph = mai.ProjectGraph.__new__(mai.ProjectGraph)
+        root = Node("START")
+        node = root
+        for index in range(depth):
+            node = Node(f"{index}.h", parent=node)
+
+        assert graph.get_all_parents(root, f"{depth - 1}.h") == [f"{depth - 2}.h"]
+
+    def test_register_handler(self):
+        source = "int main() {\n    int x;\n    int y;\n    if (x) { y = x; }\n    return y;\n}\n"
+        returns = []
+
+        def visit_return(parser, name, index, context, scopes):
+            returns.append((name, KINDS[parser.flat.kinds[index]], str(context)))
+            return scopes
+
+        class ReturnParser(PiniParser):
+            pass
+
+        ReturnParser.register_handler(c_ast.Return, visit_return)
+        ReturnParser.register_handler(c_ast.If, None)
+        parser = parse_source(source, parser_type=ReturnParser)
+
+        # the new kind is dispatched to its handler, and the code under the removed one is skipped
+        assert returns == [("block_items", c_ast.Return, "test.c@main@")]
+        assert sorted(parser.get_marked()) == ["test.c@main@x"]
+        assert ReturnParser.kind_handlers[KIND_OF[c_ast.Return]] is visit_return
+
+        # the handlers of PiniParser are not changed
+        assert PiniParser.kind_handlers[KIND_OF[c_ast.Return]] is None
+        assert c_ast.Return not in PiniParser.handlers and c_ast.If in PiniParser.handlers
+        assert sorted(parse_source(source).get_marked()) == ["test.c@main@x", "test.c@main@y"]